@@ -9,9 +9,56 @@ LATITUDE = float(os.getenv("ADVISORY_LATITUDE", "22.7196"))
 LONGITUDE = float(os.getenv("ADVISORY_LONGITUDE", "75.8577"))
 CITY = os.getenv("ADVISORY_CITY", "Indore")
 WEATHER_API_KEY = os.getenv("WEATHER_API_KEY", "")
+WEATHER_API_URL = os.getenv("WEATHER_API_URL", "https://api.openweathermap.org/data/2.5/forecast")
+
+# Forecast cache shared through Redis: fresh for WEATHER_CACHE_TTL seconds, then
+# served stale (while one worker refreshes it) for up to WEATHER_CACHE_MAX_STALE.
+WEATHER_CACHE_TTL = int(os.getenv("WEATHER_CACHE_TTL", "1800"))
+WEATHER_CACHE_MAX_STALE = int(os.getenv("WEATHER_CACHE_MAX_STALE", "10800"))
+# After a failed fetch, callers answer from the fallback without calling the
+# API again for this long.
+WEATHER_FAILURE_TTL = int(os.getenv("WEATHER_FAILURE_TTL", "60"))
 
 HF_TOKEN = os.getenv("HF_TOKEN", "")
 HF_MODEL = os.getenv("HF_MODEL", "meta-llama/Llama-3.3-70B-Instruct")
 
+# Shared LLM client (llm_pool.py): OpenAI-compatible chat completions endpoint,
+# kept-alive connection pool and a cap on concurrent requests per process.
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://router.huggingface.co/v1")
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "16"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "30"))
+
+# Advisory response cache: readings are bucketed with these step sizes
+# ("field=step,..."), so nearby readings share one LLM answer.
+LLM_CACHE_BUCKETS = {
+    field: float(step)
+    for field, step in (
+        item.split("=") for item in os.getenv(
+            "LLM_CACHE_BUCKETS", "soil_moisture=2,humidity=5,tds=25,temperature=1,rain_mm=1"
+        ).split(",")
+    )
+}
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1024"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "900"))
+LLM_CACHE_REDIS = os.getenv("LLM_CACHE_REDIS", "false").lower() in ("true", "1", "yes")
+
+# End-to-end advisory deadline. Weather + retrieval (run concurrently) may use
+# ADVISORY_PREP_SHARE of it; the LLM call gets whatever is left.
+ADVISORY_BUDGET_S = float(os.getenv("ADVISORY_BUDGET_S", "8"))
+ADVISORY_PREP_SHARE = float(os.getenv("ADVISORY_PREP_SHARE", "0.3"))
+ADVISORY_CONCURRENCY = int(os.getenv("ADVISORY_CONCURRENCY", "16"))
+# Threads for the blocking stages (weather, retrieval, LLM) of all pipelines in a process.
+ADVISORY_STAGE_THREADS = int(os.getenv("ADVISORY_STAGE_THREADS", str(ADVISORY_CONCURRENCY * 2)))
+
 BASE_DIR = Path(__file__).resolve().parent
 PDF_PATH = str(BASE_DIR / "wheat_guide.pdf")
+RAG_INDEX_DIR = os.getenv("RAG_INDEX_DIR", str(BASE_DIR / "rag_index"))
+# Incremental ingestion (rag_ingest.py): every PDF / .txt / .md under
+# RAG_DOCS_DIR is indexed; per-document extraction results are cached in
+# RAG_SEGMENT_DIR, keyed by content hash.
+RAG_DOCS_DIR = os.getenv("RAG_DOCS_DIR", str(BASE_DIR / "docs"))
+RAG_SEGMENT_DIR = os.getenv("RAG_SEGMENT_DIR", RAG_INDEX_DIR.rstrip(os.sep) + ".segments")
+RAG_INGEST_WORKERS = int(os.getenv("RAG_INGEST_WORKERS", str(os.cpu_count() or 1)))
+# Serving processes pick up a rebuilt index within this many seconds.
+RAG_RELOAD_CHECK_S = float(os.getenv("RAG_RELOAD_CHECK_S", "30"))
@@ -0,0 +1,170 @@
+import hashlib
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+
+from config import HF_MODEL, LLM_CACHE_BUCKETS, LLM_CACHE_SIZE, LLM_CACHE_TTL, LLM_CACHE_REDIS
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import redis_pool  # noqa: E402
+
+REDIS_PREFIX = "llm:advisory:"
+
+
+def _bucket(value, step):
+    try:
+        return math.floor(float(value) / step)
+    except (TypeError, ValueError):
+        return None
+
+
+def advisory_key(sensor, rain_data, notes, irrigation=None):
+    # Quantized field state + crop stage and irrigation model version + hash
+    # of the retrieved notes + model name.
+    state = dict(sensor, rain_mm=rain_data.get("today_rain_mm", 0))
+    buckets = {field: _bucket(state.get(field, 0), step) for field, step in sorted(LLM_CACHE_BUCKETS.items())}
+    stage = (irrigation or {}).get("crop_stage")
+    irrigation_model = (irrigation or {}).get("model_version")
+    notes_hash = hashlib.sha1(notes.encode("utf-8")).hexdigest()[:16]
+    raw = json.dumps([HF_MODEL, buckets, stage, irrigation_model, notes_hash], sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResponseCache:
+    # In-process LRU + TTL, optional shared Redis tier, and coalescing of
+    # identical in-flight requests onto one compute() call.
+
+    def __init__(self, max_entries=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL, use_redis=LLM_CACHE_REDIS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.use_redis = use_redis
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.redis_hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.compute_time_s = 0.0
+
+    def _get_local(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _put_local(self, key, value):
+        self._entries[key] = (time.time() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _redis_client(self):
+        if not self.use_redis or not redis_pool.available():
+            return None
+        return redis_pool.get_client()
+
+    def _redis_get(self, key):
+        client = self._redis_client()
+        if client is None:
+            return None
+        try:
+            return client.get(REDIS_PREFIX + key)
+        except redis.RedisError:
+            redis_pool.mark_down()
+            return None
+
+    def _redis_set(self, key, value):
+        client = self._redis_client()
+        if client is None:
+            return
+        try:
+            client.set(REDIS_PREFIX + key, value, ex=self.ttl)
+        except redis.RedisError:
+            redis_pool.mark_down()
+
+    def get_or_compute(self, key, compute, timeout=None):
+        # timeout bounds how long a coalesced caller waits for the leader's
+        # compute(); past it the caller gets TimeoutError instead of hanging
+        # with a stuck leader (its own budget is spent by then).
+        with self._lock:
+            value = self._get_local(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _InFlight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            if not flight.done.wait(timeout):
+                raise TimeoutError(f"LLM answer for {key[:12]} not ready after {timeout}s")
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            value = self._redis_get(key)
+            if value is not None:
+                with self._lock:
+                    self.redis_hits += 1
+            else:
+                started = time.perf_counter()
+                value = compute()
+                elapsed = time.perf_counter() - started
+                self._redis_set(key, value)
+                with self._lock:
+                    self.misses += 1
+                    self.compute_time_s += elapsed
+            with self._lock:
+                self._put_local(key, value)
+            flight.value = value
+            return value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def stats(self):
+        with self._lock:
+            served = self.hits + self.redis_hits + self.coalesced
+            total = served + self.misses
+            avg_compute = self.compute_time_s / self.misses if self.misses else 0.0
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "redis_hits": self.redis_hits,
+                "coalesced": self.coalesced,
+                "misses": self.misses,
+                "hit_rate": round(served / total, 4) if total else 0.0,
+                "avg_llm_s": round(avg_compute, 4),
+                # Every answer not computed here would have cost one more LLM call.
+                "saved_llm_s": round(served * avg_compute, 3),
+            }
+
+
+advisory_cache = ResponseCache()
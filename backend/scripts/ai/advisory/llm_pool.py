@@ -0,0 +1,110 @@
+# llm_pool.py
+# One LLM client per process for the advisory and chatbot paths: a requests
+# Session with a kept-alive connection pool, a semaphore bounding concurrent
+# calls, and token streaming over the OpenAI-compatible chat completions API.
+# A call's timeout (default LLM_TIMEOUT_S) covers waiting for a slot too, so a
+# caller with a deadline never holds one past it.
+
+import json
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import (
+    HF_TOKEN, HF_MODEL, LLM_BASE_URL, LLM_POOL_SIZE, LLM_MAX_CONCURRENCY, LLM_TIMEOUT_S,
+)
+
+
+class LLMError(Exception):
+    pass
+
+
+class LLMClient:
+    def __init__(self, base_url=LLM_BASE_URL, token=HF_TOKEN, model=HF_MODEL,
+                 pool_size=LLM_POOL_SIZE, max_concurrency=LLM_MAX_CONCURRENCY, timeout=LLM_TIMEOUT_S):
+        self.url = base_url.rstrip("/") + "/chat/completions"
+        self.model = model
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Authorization": f"Bearer {token}"})
+
+    def _acquire(self, timeout):
+        # Seconds left of the call's timeout once a slot is held.
+        timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        started = time.monotonic()
+        if timeout <= 0 or not self._slots.acquire(timeout=timeout):
+            raise LLMError("No LLM slot free within the timeout")
+        left = timeout - (time.monotonic() - started)
+        if left <= 0:
+            self._slots.release()
+            raise LLMError("No LLM slot free within the timeout")
+        return left
+
+    def _post(self, messages, max_tokens, temperature, stream, timeout):
+        body = {
+            "model": self.model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "stream": stream,
+        }
+        response = self.session.post(self.url, json=body, timeout=timeout, stream=stream)
+        if response.status_code >= 400:
+            raise LLMError(f"LLM request failed ({response.status_code}): {response.text[:200]}")
+        return response
+
+    def chat(self, messages, max_tokens=280, temperature=0.2, timeout=None):
+        left = self._acquire(timeout)
+        try:
+            data = self._post(messages, max_tokens, temperature, False, left).json()
+        finally:
+            self._slots.release()
+        try:
+            return data["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            raise LLMError(f"Unexpected LLM response: {str(data)[:200]}")
+
+    def stream_chat(self, messages, max_tokens=280, temperature=0.2, timeout=None):
+        # Yields text deltas as they arrive (server-sent events).
+        left = self._acquire(timeout)
+        try:
+            response = self._post(messages, max_tokens, temperature, True, left)
+            with response:
+                for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    payload = line[len("data:"):].strip()
+                    if payload == "[DONE]":
+                        break
+                    try:
+                        delta = json.loads(payload)["choices"][0].get("delta", {}).get("content")
+                    except (ValueError, KeyError, IndexError):
+                        continue
+                    if delta:
+                        yield delta
+        finally:
+            self._slots.release()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def is_configured():
+    return bool(HF_TOKEN)
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient()
+    return _client
@@ -1,19 +1,21 @@
-from config import HF_TOKEN, HF_MODEL
+from llm_cache import advisory_cache, advisory_key
+from llm_pool import get_client, is_configured
 
-try:
-    from huggingface_hub import InferenceClient
-except Exception:
-    InferenceClient = None
 
-
-def _local_fallback(sensor, rain_data):
+def _local_fallback(sensor, rain_data, irrigation=None):
     moisture = sensor.get("soil_moisture", 0)
     humidity = sensor.get("humidity", 0)
     temp = sensor.get("temperature", 0)
     rain_mm = rain_data.get("today_rain_mm", 0)
+    minutes = (irrigation or {}).get("minutes")
 
     lines = []
-    if moisture < 35:
+    if minutes is not None:
+        if minutes >= 1:
+            lines.append(f"Soil moisture {moisture}% hai, model ke hisaab se {minutes:g} minute irrigation karo.")
+        else:
+            lines.append(f"Soil moisture {moisture}% hai, model ke hisaab se abhi irrigation ki zarurat nahi.")
+    elif moisture < 35:
         lines.append(f"Soil moisture {moisture}% hai, controlled irrigation start karo.")
     else:
         lines.append(f"Soil moisture {moisture}% stable hai, immediate irrigation avoid karo.")
@@ -23,13 +25,29 @@ def _local_fallback(sensor, rain_data):
     return "\n".join(f"- {line}" for line in lines)
 
 
-def generate_advisory(sensor, rain_data, retrieved_docs):
-    if not InferenceClient or not HF_TOKEN:
-        return _local_fallback(sensor, rain_data)
+def generate_advisory(sensor, rain_data, retrieved_docs, irrigation=None, timeout=None):
+    if not is_configured():
+        return _local_fallback(sensor, rain_data, irrigation)
 
-    client = InferenceClient(model=HF_MODEL, token=HF_TOKEN)
     notes = "\n".join(retrieved_docs[:3]) if retrieved_docs else "N/A"
+    # Nearby readings with the same notes share one answer; concurrent
+    # duplicates wait on a single LLM call.
+    key = advisory_key(sensor, rain_data, notes, irrigation)
+    return advisory_cache.get_or_compute(
+        key, lambda: _request_advisory(sensor, rain_data, notes, irrigation, timeout), timeout=timeout
+    )
 
+
+def _irrigation_line(irrigation):
+    if not irrigation or irrigation.get("minutes") is None:
+        return ""
+    return (
+        f"- Model recommended irrigation: {irrigation['minutes']:g} min "
+        f"(crop stage: {irrigation.get('crop_stage')})\n"
+    )
+
+
+def _request_advisory(sensor, rain_data, notes, irrigation=None, timeout=None):
     system_message = (
         "Aap ek practical irrigation advisor ho. "
         "Sirf concise bullet points me actionable advisory do."
@@ -42,18 +60,18 @@ Live Field Data:
 - TDS Level: {sensor.get('tds', 0)} ppm
 - Field Temperature: {sensor.get('temperature', 0)} C
 - Aaj ka total rainfall: {rain_data.get('today_rain_mm', 0)} mm
-
+{_irrigation_line(irrigation)}
 Reference Notes:
 {notes}
 """
 
-    response = client.chat_completion(
+    return get_client().chat(
         messages=[
             {"role": "system", "content": system_message},
             {"role": "user", "content": user_message},
         ],
         max_tokens=280,
         temperature=0.2,
+        timeout=timeout,
     )
-    return response.choices[0].message.content
 
@@ -1,7 +1,23 @@
+import asyncio
 import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import ADVISORY_BUDGET_S, ADVISORY_PREP_SHARE, ADVISORY_CONCURRENCY, ADVISORY_STAGE_THREADS
 from rag_service import retrieve
-from llm_service import generate_advisory
-from weather_service import get_rain_forecast
+from llm_service import generate_advisory, _local_fallback
+from weather_service import get_rain_forecast, NO_RAIN
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import irrigation_service  # noqa: E402
+import tracing  # noqa: E402
+
+# Blocking stages share one bounded pool. Each is given the time left in its
+# budget as its own timeout, so a stage abandoned at the deadline also ends
+# there and frees its thread (and LLM slot) instead of piling up.
+_stages = ThreadPoolExecutor(max_workers=ADVISORY_STAGE_THREADS, thread_name_prefix="advisory-stage")
 
 
 def _normalize_sensor(sensor):
@@ -13,29 +29,116 @@ def _normalize_sensor(sensor):
     }
 
 
-def run_pipeline(sensor):
-    normalized = _normalize_sensor(sensor)
-    rain_data = get_rain_forecast()
-
-    query = (
+def _build_query(normalized):
+    # Rain is left out so retrieval does not have to wait for the forecast.
+    return (
         f"Soil Moisture: {normalized['soil_moisture']}%, "
         f"TDS: {normalized['tds']} ppm, "
-        f"Temperature: {normalized['temperature']}C, "
-        f"Today Rain: {rain_data['today_rain_mm']}mm"
+        f"Temperature: {normalized['temperature']}C"
     )
 
-    retrieved_docs = retrieve(query)
-    advice_text = generate_advisory(normalized, rain_data, retrieved_docs)
+
+def _run_stage(name, fn, *args, **kwargs):
+    # Runs in a copy of the caller's context, so its span joins the caller's trace.
+    def target():
+        with tracing.span(name):
+            return fn(*args, **kwargs)
+
+    return asyncio.get_running_loop().run_in_executor(_stages, tracing.run_in_context(target))
+
+
+def _irrigation_plan(sensor, degraded):
+    # Model minutes for this farm; sub-millisecond once loaded, so it runs inline.
+    try:
+        with tracing.span("irrigation"):
+            return irrigation_service.plan(sensor)
+    except Exception:
+        degraded.append("irrigation:error")
+        return {"minutes": None, "crop_stage": None}
+
+
+def _result_or(task, default, stage, degraded, started):
+    if not task.done():
+        task.cancel()
+        degraded.append(f"{stage}:timeout")
+        # The stage's own span only ends when its thread does; record the wait.
+        tracing.record(stage, started, time.time() - started, "timeout")
+        return default
+    if task.exception() is not None:
+        degraded.append(f"{stage}:error")
+        return default
+    return task.result()
+
+
+async def run_pipeline_async(sensor, budget_s=ADVISORY_BUDGET_S):
+    with tracing.trace() as trace:
+        result = await _pipeline(sensor, budget_s)
+    # Copy: a stage abandoned at the deadline may still append to the trace.
+    result["spans"] = list(trace.spans)
+    return result
+
+
+async def _pipeline(sensor, budget_s):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + budget_s
+    normalized = _normalize_sensor(sensor)
+    degraded = []
+
+    prep_started = time.time()
+    prep_s = budget_s * ADVISORY_PREP_SHARE
+    prep_deadline = loop.time() + prep_s
+    weather_task = asyncio.ensure_future(_run_stage("weather", get_rain_forecast, timeout=prep_s))
+    docs_task = asyncio.ensure_future(_run_stage("retrieve", retrieve, _build_query(normalized)))
+    irrigation = _irrigation_plan(sensor, degraded)
+    await asyncio.wait({weather_task, docs_task}, timeout=max(prep_deadline - loop.time(), 0))
+    rain_data = _result_or(weather_task, dict(NO_RAIN), "weather", degraded, prep_started)
+    retrieved_docs = _result_or(docs_task, [], "retrieve", degraded, prep_started)
+
+    llm_started = time.time()
+    llm_s = max(deadline - loop.time(), 0)
+    try:
+        advice_text = await asyncio.wait_for(
+            _run_stage("llm", generate_advisory, normalized, rain_data, retrieved_docs, irrigation, timeout=llm_s),
+            timeout=llm_s,
+        )
+    except asyncio.TimeoutError:
+        degraded.append("llm:timeout")
+        tracing.record("llm", llm_started, time.time() - llm_started, "timeout")
+        advice_text = _local_fallback(normalized, rain_data, irrigation)
+    except Exception:
+        degraded.append("llm:error")
+        advice_text = _local_fallback(normalized, rain_data, irrigation)
 
     return {
         "sensor_data": normalized,
         "rain_forecast": rain_data,
+        "irrigation": irrigation,
         "advisory": advice_text,
+        "degraded": degraded,
     }
 
 
+async def run_many_async(payloads, budget_s=ADVISORY_BUDGET_S, concurrency=ADVISORY_CONCURRENCY):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(payload):
+        async with semaphore:
+            return await run_pipeline_async(payload, budget_s)
+
+    return await asyncio.gather(*(run_one(p) for p in payloads))
+
+
+def run_pipeline(sensor, budget_s=ADVISORY_BUDGET_S):
+    return asyncio.run(run_pipeline_async(sensor, budget_s))
+
+
+def run_many(payloads, budget_s=ADVISORY_BUDGET_S, concurrency=ADVISORY_CONCURRENCY):
+    return asyncio.run(run_many_async(payloads, budget_s, concurrency))
+
+
 if __name__ == "__main__":
-    import sys
     payload = json.loads(sys.argv[1]) if len(sys.argv) > 1 else {}
-    print(json.dumps(run_pipeline(payload)))
-
+    if isinstance(payload, list):
+        print(json.dumps(run_many(payload)))
+    else:
+        print(json.dumps(run_pipeline(payload)))
@@ -0,0 +1,227 @@
+# rag_index.py
+# On-disk BM25 index for rag_service.retrieve.
+#
+# Build (once, or whenever the guide changes):
+#   python rag_index.py [PDF ...]          (defaults to config.PDF_PATH)
+#
+# Layout of RAG_INDEX_DIR:
+#   meta.json          chunk count, BM25 params, sources
+#   vocab.json         term -> term id
+#   offsets.npy        int64[V + 1]  postings range of each term
+#   postings.npy       int32[P]      chunk ids, grouped by term
+#   weights.npy        float32[P]    precomputed BM25 weight of (term, chunk)
+#   chunk_offsets.npy  int64[C + 1]  byte range of each chunk in chunks.bin
+#   chunks.bin         utf-8 chunk text
+# Every array is loaded with mmap, so a query only touches the postings of its terms.
+
+import json
+import os
+import re
+import sys
+from collections import Counter
+
+import numpy as np
+
+from config import PDF_PATH, RAG_INDEX_DIR
+
+CHUNK_WORDS = 60
+CHUNK_OVERLAP = 15
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to "
+    "was were will with can should may also than then there these those which".split()
+)
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def extract_pages(pdf_path):
+    from pypdf import PdfReader
+
+    reader = PdfReader(pdf_path)
+    return [(page.extract_text() or "").replace("\n", " ").strip() for page in reader.pages]
+
+
+def chunk_pages(pages, source):
+    chunks = []
+    step = CHUNK_WORDS - CHUNK_OVERLAP
+    for page_no, text in enumerate(pages, start=1):
+        words = text.split()
+        for start in range(0, max(len(words) - CHUNK_OVERLAP, 1), step):
+            piece = " ".join(words[start:start + CHUNK_WORDS])
+            if piece:
+                chunks.append({"text": piece, "source": source, "page": page_no})
+    return chunks
+
+
+def chunk_pdf(pdf_path):
+    return chunk_pages(extract_pages(pdf_path), os.path.basename(pdf_path))
+
+
+def build_arrays(chunks, term_counts=None):
+    # term_counts lets callers pass cached Counter(tokenize(text)) per chunk.
+    if term_counts is None:
+        term_counts = [Counter(tokenize(c["text"])) for c in chunks]
+
+    vocab = {}
+    chunk_ids, term_ids, tfs = [], [], []
+    for chunk_id, counts in enumerate(term_counts):
+        chunk_ids.extend([chunk_id] * len(counts))
+        term_ids.extend(vocab.setdefault(term, len(vocab)) for term in counts)
+        tfs.extend(counts.values())
+    return build_from_postings(chunks, chunk_ids, term_ids, tfs, list(vocab))
+
+
+def build_from_postings(chunks, chunk_ids, term_ids, tfs, terms):
+    # chunk_ids / term_ids / tfs hold one entry per (chunk, term) pair, in any
+    # order, and terms[term_id] is the term. Everything below is vectorized, so
+    # merging many documents' cached postings (rag_ingest.py) costs a few
+    # sorts rather than a Python loop per posting.
+    n_chunks = len(chunks)
+    chunk_ids = np.asarray(chunk_ids, dtype=np.int64)
+    tfs = np.asarray(tfs, dtype=np.float64)
+
+    # Renumber terms in sorted order (only the distinct terms are sorted).
+    sorted_ids = sorted(range(len(terms)), key=terms.__getitem__)
+    rank = np.empty(len(terms), dtype=np.int64)
+    rank[sorted_ids] = np.arange(len(terms))
+    term_ids = rank[np.asarray(term_ids, dtype=np.int64)]
+    vocab_terms = [terms[i] for i in sorted_ids]
+
+    lengths = np.bincount(chunk_ids, weights=tfs, minlength=n_chunks)
+    avg_len = lengths.mean() if n_chunks and lengths.mean() > 0 else 1.0
+    df = np.bincount(term_ids, minlength=len(vocab_terms))
+    idf = np.log(1 + (n_chunks - df + 0.5) / (df + 0.5))
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[chunk_ids] / avg_len)
+    weights = idf[term_ids] * tfs * (BM25_K1 + 1) / (tfs + norm)
+
+    # Postings grouped by term (vocab order), chunk ids ascending within a term.
+    order = np.lexsort((chunk_ids, term_ids))
+    offsets = np.zeros(len(vocab_terms) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(df)
+
+    encoded = [c["text"].encode("utf-8") for c in chunks]
+    chunk_offsets = np.zeros(n_chunks + 1, dtype=np.int64)
+    chunk_offsets[1:] = np.cumsum([len(b) for b in encoded])
+
+    return {
+        "vocab": {term: i for i, term in enumerate(vocab_terms)},
+        "offsets": offsets,
+        "postings": chunk_ids[order].astype(np.int32),
+        "weights": weights[order].astype(np.float32),
+        "chunk_offsets": chunk_offsets,
+        "chunks_bin": b"".join(encoded),
+        "meta": {
+            "chunks": n_chunks,
+            "terms": len(vocab_terms),
+            "avg_chunk_tokens": float(avg_len),
+            "k1": BM25_K1,
+            "b": BM25_B,
+            "sources": [[c["source"], c["page"]] for c in chunks],
+        },
+    }
+
+
+def write_index(arrays, out_dir=RAG_INDEX_DIR):
+    # Write into a sibling temp dir and swap it in, so readers never see a partial index.
+    tmp_dir = out_dir.rstrip(os.sep) + ".tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    for name in ("offsets", "postings", "weights", "chunk_offsets"):
+        np.save(os.path.join(tmp_dir, name + ".npy"), arrays[name])
+    with open(os.path.join(tmp_dir, "chunks.bin"), "wb") as f:
+        f.write(arrays["chunks_bin"])
+    with open(os.path.join(tmp_dir, "vocab.json"), "w") as f:
+        json.dump(arrays["vocab"], f)
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump(arrays["meta"], f)
+
+    old_dir = out_dir.rstrip(os.sep) + ".old"
+    if os.path.exists(out_dir):
+        os.replace(out_dir, old_dir)
+    os.replace(tmp_dir, out_dir)
+    if os.path.exists(old_dir):
+        for name in os.listdir(old_dir):
+            os.unlink(os.path.join(old_dir, name))
+        os.rmdir(old_dir)
+
+
+class RagIndex:
+    def __init__(self, vocab, offsets, postings, weights, chunk_offsets, chunks_bin, meta):
+        self.vocab = vocab
+        self.offsets = offsets
+        self.postings = postings
+        self.weights = weights
+        self.chunk_offsets = chunk_offsets
+        self.chunks_bin = chunks_bin
+        self.meta = meta
+        self.n_chunks = len(chunk_offsets) - 1
+
+    def chunk_text(self, chunk_id):
+        start, end = self.chunk_offsets[chunk_id], self.chunk_offsets[chunk_id + 1]
+        return bytes(self.chunks_bin[start:end]).decode("utf-8")
+
+    def search(self, query, k=3):
+        term_ids = {self.vocab[t] for t in tokenize(query) if t in self.vocab}
+        if not term_ids or not self.n_chunks:
+            return []
+
+        # Only the postings of the query's terms are touched, so the cost
+        # follows those lists rather than the number of chunks.
+        ranges = [(self.offsets[t], self.offsets[t + 1]) for t in sorted(term_ids)]
+        ids = np.concatenate([self.postings[start:end] for start, end in ranges])
+        weights = np.concatenate([self.weights[start:end] for start, end in ranges])
+        chunk_ids, inverse = np.unique(ids, return_inverse=True)
+        scores = np.bincount(inverse.reshape(-1), weights=weights).astype(np.float32)
+
+        top = np.flatnonzero(scores)
+        if len(top) > k:
+            top = top[np.argpartition(scores[top], -k)[-k:]]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(chunk_ids[i]), float(scores[i])) for i in top]
+
+
+def load_index(index_dir=RAG_INDEX_DIR):
+    if not os.path.exists(os.path.join(index_dir, "meta.json")):
+        return None
+    with open(os.path.join(index_dir, "meta.json")) as f:
+        meta = json.load(f)
+    with open(os.path.join(index_dir, "vocab.json")) as f:
+        vocab = json.load(f)
+    arrays = {
+        name: np.load(os.path.join(index_dir, name + ".npy"), mmap_mode="r")
+        for name in ("offsets", "postings", "weights", "chunk_offsets")
+    }
+    bin_path = os.path.join(index_dir, "chunks.bin")
+    chunks_bin = np.memmap(bin_path, dtype=np.uint8, mode="r") if os.path.getsize(bin_path) else b""
+    return RagIndex(vocab, chunks_bin=chunks_bin, meta=meta, **arrays)
+
+
+def index_from_arrays(arrays):
+    # In-memory index, used when no prebuilt index exists on disk.
+    return RagIndex(
+        arrays["vocab"], arrays["offsets"], arrays["postings"], arrays["weights"],
+        arrays["chunk_offsets"], arrays["chunks_bin"], arrays["meta"],
+    )
+
+
+def main():
+    pdf_paths = sys.argv[1:] or [PDF_PATH]
+    chunks = []
+    for path in pdf_paths:
+        chunks.extend(chunk_pdf(path))
+    arrays = build_arrays(chunks)
+    write_index(arrays)
+    print(json.dumps({
+        "index_dir": RAG_INDEX_DIR,
+        "chunks": arrays["meta"]["chunks"],
+        "terms": arrays["meta"]["terms"],
+    }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+# rag_ingest.py
+# Incremental ingestion of a documents directory into the rag_index.py index.
+#
+#   python rag_ingest.py [--docs DIR] [--workers N] [--watch SECONDS]
+#
+# - Every PDF / .txt / .md under RAG_DOCS_DIR (plus config.PDF_PATH, if it
+#   exists) is a document. Files whose size and mtime match the manifest are
+#   taken as unchanged; the rest are content-hashed (sha1).
+# - New or changed documents are extracted, chunked and tokenized in a process
+#   pool. Each result is cached as a segment, RAG_SEGMENT_DIR/<sha1>.npz: the
+#   chunk texts and pages, the document's own term list, and its
+#   (chunk, term, tf) postings.
+# - The index is then merged from the segments. No document is re-read, and
+#   the merge is a handful of numpy operations (BM25 idf and average chunk
+#   length are corpus-wide, so all weights are recomputed, which is cheap).
+# - The manifest (path -> size, mtime, sha1) is stored in the index's
+#   meta.json, so the index and its manifest are swapped in together.
+#   Segments of removed documents are deleted afterwards.
+# --watch re-scans every SECONDS and only rebuilds when something changed.
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from config import PDF_PATH, RAG_DOCS_DIR, RAG_INDEX_DIR, RAG_INGEST_WORKERS, RAG_SEGMENT_DIR
+from rag_index import build_from_postings, chunk_pages, extract_pages, tokenize, write_index
+
+DOC_EXTENSIONS = (".pdf", ".txt", ".md")
+HASH_BLOCK = 1 << 20
+
+
+def file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def list_documents(docs_dir=RAG_DOCS_DIR):
+    # {source name: path}; sources are paths relative to docs_dir.
+    documents = {}
+    if os.path.isdir(docs_dir):
+        for root, _, files in os.walk(docs_dir):
+            for name in files:
+                if name.lower().endswith(DOC_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    documents[os.path.relpath(path, docs_dir).replace(os.sep, "/")] = path
+    if os.path.exists(PDF_PATH):
+        documents.setdefault(os.path.basename(PDF_PATH), PDF_PATH)
+    return documents
+
+
+def load_manifest(index_dir=RAG_INDEX_DIR):
+    try:
+        with open(os.path.join(index_dir, "meta.json")) as f:
+            return json.load(f).get("documents", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def scan(documents, manifest):
+    # New manifest for the current files; only files whose size or mtime
+    # changed are hashed again.
+    current = {}
+    for source, path in documents.items():
+        stat = os.stat(path)
+        known = manifest.get(source)
+        if known and known["size"] == stat.st_size and known["mtime"] == stat.st_mtime:
+            current[source] = known
+        else:
+            current[source] = {"size": stat.st_size, "mtime": stat.st_mtime, "sha1": file_sha1(path)}
+    return current
+
+
+def segment_path(sha1, segment_dir=RAG_SEGMENT_DIR):
+    return os.path.join(segment_dir, sha1 + ".npz")
+
+
+def read_pages(path):
+    if path.lower().endswith(".pdf"):
+        return extract_pages(path)
+    with open(path, encoding="utf-8", errors="replace") as f:
+        # Form feeds separate pages in text exports.
+        return [page.replace("\n", " ").strip() for page in f.read().split("\f")]
+
+
+def ingest_document(path, source, sha1, segment_dir=RAG_SEGMENT_DIR):
+    # Runs in a pool process: extract, chunk, tokenize and cache one document.
+    chunks = chunk_pages(read_pages(path), source)
+    terms = {}
+    chunk_ids, term_ids, tfs = [], [], []
+    for chunk_id, chunk in enumerate(chunks):
+        counts = Counter(tokenize(chunk["text"]))
+        chunk_ids.extend([chunk_id] * len(counts))
+        term_ids.extend(terms.setdefault(term, len(terms)) for term in counts)
+        tfs.extend(counts.values())
+
+    encoded = [c["text"].encode("utf-8") for c in chunks]
+    text_offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+    text_offsets[1:] = np.cumsum([len(b) for b in encoded])
+
+    os.makedirs(segment_dir, exist_ok=True)
+    final = segment_path(sha1, segment_dir)
+    tmp = f"{final}.{os.getpid()}.tmp.npz"
+    np.savez(
+        tmp,
+        text=np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        text_offsets=text_offsets,
+        pages=np.array([c["page"] for c in chunks], dtype=np.int32),
+        terms=np.frombuffer("\n".join(terms).encode("utf-8"), dtype=np.uint8),
+        chunk_ids=np.array(chunk_ids, dtype=np.int32),
+        term_ids=np.array(term_ids, dtype=np.int32),
+        tfs=np.array(tfs, dtype=np.int32),
+    )
+    os.replace(tmp, final)
+    return source, len(chunks)
+
+
+def merge_segments(manifest, segment_dir=RAG_SEGMENT_DIR):
+    # Index arrays for the documents in manifest, from their cached segments.
+    chunks = []
+    vocab = {}
+    chunk_ids, term_ids, tfs = [], [], []
+    for source in sorted(manifest):
+        with np.load(segment_path(manifest[source]["sha1"], segment_dir)) as segment:
+            text = segment["text"].tobytes()
+            offsets = segment["text_offsets"]
+            local_terms = segment["terms"].tobytes().decode("utf-8").split("\n") if segment["terms"].size else []
+            to_global = np.array([vocab.setdefault(t, len(vocab)) for t in local_terms], dtype=np.int64)
+            base = len(chunks)
+            for i, page in enumerate(segment["pages"].tolist()):
+                chunks.append({
+                    "text": text[offsets[i]:offsets[i + 1]].decode("utf-8"),
+                    "source": source,
+                    "page": page,
+                })
+            chunk_ids.append(segment["chunk_ids"].astype(np.int64) + base)
+            term_ids.append(to_global[segment["term_ids"]] if len(to_global) else segment["term_ids"].astype(np.int64))
+            tfs.append(segment["tfs"])
+
+    concat = lambda parts, dtype: np.concatenate(parts) if parts else np.zeros(0, dtype=dtype)  # noqa: E731
+    return build_from_postings(
+        chunks, concat(chunk_ids, np.int64), concat(term_ids, np.int64), concat(tfs, np.int32), list(vocab)
+    )
+
+
+def ingest(docs_dir=RAG_DOCS_DIR, index_dir=RAG_INDEX_DIR, segment_dir=RAG_SEGMENT_DIR,
+           workers=RAG_INGEST_WORKERS, force=False):
+    started = time.perf_counter()
+    documents = list_documents(docs_dir)
+    previous = load_manifest(index_dir)
+    manifest = scan(documents, previous)
+
+    pending = [
+        source for source, entry in manifest.items()
+        if force or not os.path.exists(segment_path(entry["sha1"], segment_dir))
+    ]
+    changed = manifest != previous or bool(pending) or not os.path.exists(os.path.join(index_dir, "meta.json"))
+    report = {
+        "documents": len(manifest),
+        "ingested": len(pending),
+        "removed": len(set(previous) - set(manifest)),
+        "rebuilt": changed,
+    }
+    if not changed:
+        report["elapsed_s"] = round(time.perf_counter() - started, 3)
+        return report
+
+    failed = []
+    if pending:
+        with ProcessPoolExecutor(max_workers=max(1, min(workers, len(pending)))) as pool:
+            futures = {
+                source: pool.submit(ingest_document, documents[source], source, manifest[source]["sha1"], segment_dir)
+                for source in pending
+            }
+            for source, future in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"rag_ingest: skipping {source}: {e}", file=sys.stderr)
+                    failed.append(source)
+    for source in failed:
+        # Left out of the manifest, so the next run tries it again.
+        del manifest[source]
+
+    merge_started = time.perf_counter()
+    arrays = merge_segments(manifest, segment_dir)
+    arrays["meta"]["documents"] = manifest
+    arrays["meta"]["built_at"] = time.time()
+    write_index(arrays, index_dir)
+
+    live = {entry["sha1"] + ".npz" for entry in manifest.values()}
+    for name in os.listdir(segment_dir) if os.path.isdir(segment_dir) else []:
+        if name.endswith(".npz") and name not in live:
+            os.unlink(os.path.join(segment_dir, name))
+
+    report.update({
+        "failed": failed,
+        "chunks": arrays["meta"]["chunks"],
+        "terms": arrays["meta"]["terms"],
+        "merge_s": round(time.perf_counter() - merge_started, 3),
+        "elapsed_s": round(time.perf_counter() - started, 3),
+    })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally index a documents directory for RAG")
+    parser.add_argument("--docs", default=RAG_DOCS_DIR)
+    parser.add_argument("--workers", type=int, default=RAG_INGEST_WORKERS)
+    parser.add_argument("--force", action="store_true", help="re-extract every document")
+    parser.add_argument("--watch", type=float, help="re-scan every N seconds")
+    args = parser.parse_args()
+
+    while True:
+        report = ingest(args.docs, workers=args.workers, force=args.force)
+        if report["rebuilt"] or not args.watch:
+            print(json.dumps(report), flush=True)
+        if not args.watch:
+            return
+        args.force = False
+        time.sleep(args.watch)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,60 @@
-from config import PDF_PATH
+import os
+import threading
+import time
+
+from config import PDF_PATH, RAG_INDEX_DIR, RAG_RELOAD_CHECK_S
+
+_index = None
+_index_loaded = False
+_index_mtime = None
+_index_checked_at = 0.0
+_index_lock = threading.Lock()
+
+
+def _meta_mtime():
+    try:
+        return os.stat(os.path.join(RAG_INDEX_DIR, "meta.json")).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _get_index():
+    # The prebuilt mmap index from rag_index.py / rag_ingest.py, or, if none
+    # was built, an in-memory index from a one-time parse of the PDF. Every
+    # RAG_RELOAD_CHECK_S the index's meta.json is stat'ed, and a rebuilt index
+    # is swapped in without restarting the process.
+    global _index, _index_loaded, _index_mtime, _index_checked_at
+    now = time.monotonic()
+    if _index_loaded and now - _index_checked_at < RAG_RELOAD_CHECK_S:
+        return _index
+    with _index_lock:
+        if _index_loaded and now - _index_checked_at < RAG_RELOAD_CHECK_S:
+            return _index
+        _index_checked_at = now
+        mtime = _meta_mtime()
+        if _index_loaded and (mtime is None or mtime == _index_mtime):
+            return _index
+        try:
+            import rag_index
+            index = rag_index.load_index()
+            if index is None:
+                index = rag_index.index_from_arrays(
+                    rag_index.build_arrays(rag_index.chunk_pdf(PDF_PATH))
+                )
+        except Exception:
+            # Keep serving the previous index (a swap may have been in
+            # progress); the next check tries again.
+            index, mtime = _index, _index_mtime
+        _index, _index_mtime, _index_loaded = index, mtime, True
+    return _index
 
 
 def retrieve(query, k=3):
     # Lightweight fallback if heavy RAG deps are unavailable.
+    index = _get_index()
+    if index is None:
+        return []
     try:
-        from pypdf import PdfReader
-        reader = PdfReader(PDF_PATH)
-        pages = [p.extract_text() or "" for p in reader.pages[:k]]
-        return [t.strip().replace("\n", " ")[:400] for t in pages if t.strip()]
+        return [index.chunk_text(chunk_id) for chunk_id, _ in index.search(query, k)]
     except Exception:
         return []
-
@@ -1,12 +1,24 @@
-import redis
-import json
-from config import REDIS_HOST, REDIS_PORT, REDIS_KEY
+import os
+import sys
+
+from config import REDIS_KEY
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import redis_pool  # noqa: E402
+
+# Per-farm sensor state, e.g. sensor_data:<farm_id>
+SENSOR_PREFIX = REDIS_KEY + ":"
+
 
 def get_sensor_data():
-    r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
-    data = r.get(REDIS_KEY)
+    data = redis_pool.get_value(REDIS_KEY)
 
     if not data:
         raise Exception("No sensor data found in Redis")
 
-    return json.loads(data)
\ No newline at end of file
+    return data
+
+
+def get_sensor_data_batch(farm_ids):
+    # {farm_id: sensor_state} for every farm with data, in one MGET.
+    return redis_pool.get_farms(SENSOR_PREFIX, farm_ids)
@@ -0,0 +1,149 @@
+# stub_server.py
+# Local stand-in for the external HTTP APIs used by the advisory and chatbot
+# paths, for tests and benchmarks. Point the services at it with e.g.
+#   WEATHER_API_URL=http://127.0.0.1:8765/data/2.5/forecast WEATHER_API_KEY=stub
+#   LLM_BASE_URL=http://127.0.0.1:8765/v1 HF_TOKEN=stub
+#
+#   python stub_server.py [--port 8765] [--delay 0.2] [--rain-mm 1.5] [--pop 0.4]
+#                         [--llm-delay 0.5] [--token-delay 0.02]
+
+import argparse
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+
+class StubState:
+    def __init__(self, delay=0.0, rain_mm=0.0, pop=0.0, llm_delay=0.0, token_delay=0.0, answer=None):
+        self.delay = delay
+        self.rain_mm = rain_mm
+        self.pop = pop
+        self.llm_delay = llm_delay
+        self.token_delay = token_delay
+        self.answer = answer or (
+            "- Soil moisture theek hai, aaj irrigation ki zarurat nahi.\n"
+            "- Shaam ko moisture dobara check karo."
+        )
+        self.hits = {}
+        self._lock = threading.Lock()
+
+    def count(self, route):
+        with self._lock:
+            self.hits[route] = self.hits.get(route, 0) + 1
+
+    def forecast(self):
+        # OpenWeatherMap /forecast shape: 3-hour samples under "list".
+        return {
+            "cod": "200",
+            "list": [
+                {"dt": int(time.time()) + i * 10800, "pop": self.pop, "rain": {"3h": self.rain_mm}}
+                for i in range(8)
+            ],
+        }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep connections alive between requests.
+    protocol_version = "HTTP/1.1"
+    state = None
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; don't let Nagle delay them.
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _completion(self, body):
+        self.state.count("chat_completions")
+        time.sleep(self.state.llm_delay)
+        if not body.get("stream"):
+            return self._send_json(200, {
+                "object": "chat.completion",
+                "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": self.state.answer}}],
+            })
+
+        # Server-sent events over chunked transfer encoding, like the real endpoint.
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for token in self.state.answer.split(" "):
+            event = {"choices": [{"index": 0, "delta": {"content": token + " "}}]}
+            self._write_chunk(f"data: {json.dumps(event)}\n\n".encode())
+            time.sleep(self.state.token_delay)
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if path.endswith("/chat/completions"):
+            return self._completion(body)
+        self._send_json(404, {"error": "not found"})
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path.endswith("/forecast"):
+            self.state.count("forecast")
+            time.sleep(self.state.delay)
+            return self._send_json(200, self.state.forecast())
+        if path == "/stats":
+            return self._send_json(200, self.state.hits)
+        self._send_json(404, {"error": "not found"})
+
+
+def start_stub_server(port=0, host="127.0.0.1", **state_kwargs):
+    # Runs in a daemon thread; server.state holds counters, server.base_url the address.
+    state = StubState(**state_kwargs)
+    handler = type("BoundStubHandler", (StubHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.state = state
+    server.base_url = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub weather / LLM APIs for local runs")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds added to every forecast response")
+    parser.add_argument("--rain-mm", type=float, default=0.0)
+    parser.add_argument("--pop", type=float, default=0.0)
+    parser.add_argument("--llm-delay", type=float, default=0.0, help="seconds before an LLM answer starts")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="seconds between streamed tokens")
+    args = parser.parse_args()
+
+    server = start_stub_server(
+        args.port, delay=args.delay, rain_mm=args.rain_mm, pop=args.pop,
+        llm_delay=args.llm_delay, token_delay=args.token_delay,
+    )
+    print(json.dumps({"base_url": server.base_url}), flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,227 @@
+import os
+import sys
+import threading
+import time
+import uuid
+
+import redis
 import requests
-from config import WEATHER_API_KEY, CITY
+from config import (
+    WEATHER_API_KEY, WEATHER_API_URL, CITY, LATITUDE, LONGITUDE,
+    WEATHER_CACHE_TTL, WEATHER_CACHE_MAX_STALE, WEATHER_FAILURE_TTL,
+)
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import redis_pool  # noqa: E402
 
-def get_rain_forecast():
-    # Fallback for local runs when weather API key is not configured.
-    if not WEATHER_API_KEY:
-        return {"today_rain_mm": 0.0, "rain_prob": 0.0}
+NO_RAIN = {"today_rain_mm": 0.0, "rain_prob": 0.0}
+REFRESH_LOCK_TTL = 30
+FETCH_TIMEOUT_S = 6
+
+_local_cache = {}
+_refreshing = {}  # key -> Redis lock token, or None without Redis
+_failed_until = {}  # key -> time until which fetches are skipped
+_refresh_lock = threading.Lock()
+
+
+def _get_redis():
+    # None while Redis is marked down, so callers use the in-process cache
+    # without paying a connect timeout on every advisory. Only a real Redis
+    # error marks it down again; the retry window is not pushed forward here.
+    if not redis_pool.available():
+        return None
+    return redis_pool.get_client(decode_responses=False)
+
+
+def cache_key(city=CITY, lat=LATITUDE, lon=LONGITUDE):
+    # Same forecast for every farm in a city / ~1 km grid cell.
+    if city:
+        return f"weather:forecast:{city.strip().lower()}"
+    return f"weather:forecast:{round(lat, 2)}:{round(lon, 2)}"
+
+
+def _read_cache(key):
+    client = _get_redis()
+    if client is not None:
+        try:
+            return redis_pool.get_value(key, client=client)
+        except redis.RedisError:
+            redis_pool.mark_down()
+        except (ValueError, RuntimeError):
+            pass  # undecodable entry: Redis itself is fine
+    return _local_cache.get(key)
+
+
+def _write_cache(key, data):
+    entry = {"data": data, "fetched_at": time.time()}
+    _local_cache[key] = entry
+    client = _get_redis()
+    if client is not None:
+        try:
+            redis_pool.set_value(key, entry, ttl=WEATHER_CACHE_TTL + WEATHER_CACHE_MAX_STALE, client=client)
+        except redis.RedisError:
+            redis_pool.mark_down()
+
+
+def _mark_failed(key):
+    # Negative cache, in-process and (so other workers skip the call too) in Redis.
+    _failed_until[key] = time.time() + WEATHER_FAILURE_TTL
+    client = _get_redis()
+    if client is not None:
+        try:
+            client.set(key + ":failed", b"1", ex=WEATHER_FAILURE_TTL)
+        except redis.RedisError:
+            redis_pool.mark_down()
+
+
+def _recently_failed(key):
+    if _failed_until.get(key, 0) > time.time():
+        return True
+    client = _get_redis()
+    if client is not None:
+        try:
+            return bool(client.exists(key + ":failed"))
+        except redis.RedisError:
+            redis_pool.mark_down()
+    return False
+
+
+def fetch_rain_forecast(city=CITY, lat=LATITUDE, lon=LONGITUDE, timeout=FETCH_TIMEOUT_S):
+    # Raises on HTTP / parse errors so a failed refresh never overwrites the cache.
+    params = {"appid": WEATHER_API_KEY, "units": "metric"}
+    if city:
+        params["q"] = city
+    else:
+        params.update({"lat": lat, "lon": lon})
+
+    response = requests.get(WEATHER_API_URL, params=params, timeout=timeout)
+    response.raise_for_status()
+    data = response.json()
+    samples = data.get("list", [])[:8]
+    if not samples:
+        return dict(NO_RAIN)
+
+    today_rain = sum(item.get("rain", {}).get("3h", 0.0) for item in samples)
+    rain_prob = max(item.get("pop", 0.0) * 100 for item in samples)
+    return {
+        "today_rain_mm": round(float(today_rain), 2),
+        "rain_prob": round(float(rain_prob), 1),
+    }
 
-    url = (
-        f"https://api.openweathermap.org/data/2.5/forecast?"
-        f"q={CITY}&appid={WEATHER_API_KEY}&units=metric"
-    )
 
+def _try_acquire(key):
+    # Single flight: one refresh per key in this process, and across workers
+    # via a short-lived Redis lock holding a token of its owner.
+    with _refresh_lock:
+        if key in _refreshing:
+            return False
+        _refreshing[key] = None
+    client = _get_redis()
+    if client is None:
+        return True
+    token = uuid.uuid4().hex.encode()
     try:
-        data = requests.get(url, timeout=6).json()
-        samples = data.get("list", [])[:8]
-        if not samples:
-            return {"today_rain_mm": 0.0, "rain_prob": 0.0}
-
-        today_rain = sum(item.get("rain", {}).get("3h", 0.0) for item in samples)
-        rain_prob = max(item.get("pop", 0.0) * 100 for item in samples)
-        return {
-            "today_rain_mm": round(float(today_rain), 2),
-            "rain_prob": round(float(rain_prob), 1),
-        }
+        acquired = client.set(key + ":lock", token, nx=True, ex=REFRESH_LOCK_TTL)
+    except redis.RedisError:
+        redis_pool.mark_down()
+        return True
+    if not acquired:
+        _release(key)
+        return False
+    with _refresh_lock:
+        _refreshing[key] = token
+    return True
+
+
+def _release(key):
+    with _refresh_lock:
+        token = _refreshing.pop(key, None)
+    client = _get_redis() if token else None
+    if client is None:
+        return
+    lock = key + ":lock"
+
+    # Compare-and-delete: a lock that expired and was taken by another
+    # worker is left alone.
+    def delete_own(pipe):
+        if pipe.get(lock) == token:
+            pipe.multi()
+            pipe.delete(lock)
+
+    try:
+        client.transaction(delete_own, lock)
+    except redis.RedisError:
+        redis_pool.mark_down()
+
+
+def _fetch_and_release(key, city, lat, lon, timeout=FETCH_TIMEOUT_S):
+    # The caller holds the refresh lock for key; a failure is negatively cached.
+    try:
+        data = fetch_rain_forecast(city, lat, lon, timeout)
+        _write_cache(key, data)
+        return data
     except Exception:
-        return {"today_rain_mm": 0.0, "rain_prob": 0.0}
+        _mark_failed(key)
+        return None
+    finally:
+        _release(key)
+
+
+def refresh(city=CITY, lat=LATITUDE, lon=LONGITUDE):
+    # Returns the new forecast, or None if another refresh is running or the call failed.
+    key = cache_key(city, lat, lon)
+    if not _try_acquire(key):
+        return None
+    return _fetch_and_release(key, city, lat, lon)
+
+
+def _refresh_in_background(key, city, lat, lon):
+    # The lock is taken before the thread starts, so stale reads start at most
+    # one refresh per key, and none while the API is known to be failing.
+    with _refresh_lock:
+        if key in _refreshing:
+            return
+    if _recently_failed(key) or not _try_acquire(key):
+        return
+    threading.Thread(target=_fetch_and_release, args=(key, city, lat, lon), daemon=True).start()
+
+
+def _wait_for_entry(key, timeout):
+    # Until another caller's fetch lands in the cache, or fails.
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        entry = _read_cache(key)
+        if entry:
+            return entry
+        if _recently_failed(key):
+            return None
+        time.sleep(0.05)
+    return None
+
+
+def get_rain_forecast(city=CITY, lat=LATITUDE, lon=LONGITUDE, timeout=FETCH_TIMEOUT_S):
+    # timeout bounds a cold-cache fetch, or the wait for another caller's.
+    # Fallback for local runs when weather API key is not configured.
+    if not WEATHER_API_KEY:
+        return dict(NO_RAIN)
+
+    key = cache_key(city, lat, lon)
+    entry = _read_cache(key)
+    if entry:
+        age = time.time() - entry.get("fetched_at", 0)
+        if age < WEATHER_CACHE_TTL:
+            return entry["data"]
+        if age < WEATHER_CACHE_TTL + WEATHER_CACHE_MAX_STALE:
+            # Stale-while-revalidate: answer now, refresh off the critical path.
+            _refresh_in_background(key, city, lat, lon)
+            return entry["data"]
 
+    # Cold cache: one caller fetches, the others wait for its result. While a
+    # recent fetch failed, everyone answers with the fallback right away.
+    if _recently_failed(key):
+        return dict(NO_RAIN)
+    if _try_acquire(key):
+        data = _fetch_and_release(key, city, lat, lon, timeout)
+        return data if data is not None else dict(NO_RAIN)
+    entry = _wait_for_entry(key, timeout)
+    return entry["data"] if entry else dict(NO_RAIN)
@@ -2,6 +2,10 @@ import json
 import sys
 from pathlib import Path
 
+import tracing
+
+ADVISORY_DIR = Path(__file__).resolve().parent / "advisory"
+
 
 def _to_reasons(text):
     lines = []
@@ -12,29 +16,53 @@ def _to_reasons(text):
     return lines[:6] if lines else ["Advisory generated from current telemetry."]
 
 
-def main():
-    input_data = json.loads(sys.argv[1]) if len(sys.argv) > 1 else {}
+def _load_pipeline():
+    if str(ADVISORY_DIR) not in sys.path:
+        sys.path.insert(0, str(ADVISORY_DIR))
 
-    advisory_dir = Path(__file__).resolve().parent / "advisory"
-    sys.path.insert(0, str(advisory_dir))
+    import orchestrator  # noqa
+    from llm_cache import advisory_cache  # noqa
+    return orchestrator, advisory_cache
 
-    from orchestrator import run_pipeline  # noqa
 
-    result = run_pipeline(input_data)
+def _format(result, advisory_cache, spans=()):
     advisory_text = result.get("advisory", "").strip()
     reasons = _to_reasons(advisory_text)
 
-    output = {
+    return {
         "recommendation": reasons[0],
         "reasons": reasons,
         "source": "advisory_model_v2",
         "meta": {
             "rain_forecast": result.get("rain_forecast", {}),
+            "irrigation": result.get("irrigation", {}),
+            "llm_cache": advisory_cache.stats(),
+            "degraded": result.get("degraded", []),
+            # Per-stage timings (tracing.py); empty when AI_TRACE is off.
+            "spans": list(spans) + result.get("spans", []),
         },
     }
-    print(json.dumps(output))
+
+
+def build_advisory(input_data, spans=()):
+    with tracing.trace() as trace:
+        with tracing.span("import"):
+            orchestrator, advisory_cache = _load_pipeline()
+    return _format(orchestrator.run_pipeline(input_data), advisory_cache, list(spans) + trace.spans)
+
+
+def build_advisories(payloads):
+    # Many farms on one event loop, bounded by ADVISORY_CONCURRENCY.
+    orchestrator, advisory_cache = _load_pipeline()
+    return [_format(result, advisory_cache) for result in orchestrator.run_many(payloads)]
+
+
+def main():
+    input_data = json.loads(sys.argv[1]) if len(sys.argv) > 1 else {}
+    with tracing.trace() as trace:
+        tracing.record_startup()  # interpreter start + imports up to here
+    print(json.dumps(build_advisory(input_data, trace.spans)))
 
 
 if __name__ == "__main__":
     main()
-
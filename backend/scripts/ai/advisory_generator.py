@@ -1,11 +1,31 @@
 import sys
 import json
 
+import irrigation_service
+
+
 def generate():
     input_data = json.loads(sys.argv[1])
     moisture = input_data.get('moisture', 50)
-    
-    if moisture < 40:
+
+    try:
+        plan = irrigation_service.plan(input_data)
+    except Exception:
+        plan = {"minutes": None}
+    minutes = plan["minutes"]
+
+    if minutes is not None:
+        # Duration from the irrigation model (Randomforest.py)
+        if minutes >= 1:
+            recommendation = "Enable Irrigation"
+            reasons = [
+                "Model recommends {:g} minutes of irrigation".format(minutes),
+                "Soil moisture {}% at {} stage".format(moisture, plan["crop_stage"]),
+            ]
+        else:
+            recommendation = "No Irrigation Needed"
+            reasons = ["Soil moisture is sufficient for {} stage".format(plan["crop_stage"])]
+    elif moisture < 40:
         recommendation = "Enable Irrigation"
         reasons = ["Low soil moisture ({}%)".format(moisture), "Forecast indicates dry weather"]
     else:
@@ -14,7 +34,8 @@ def generate():
 
     print(json.dumps({
         "recommendation": recommendation,
-        "reasons": reasons
+        "reasons": reasons,
+        "irrigation_minutes": minutes
     }))
 
 if __name__ == "__main__":
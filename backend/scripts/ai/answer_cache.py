@@ -0,0 +1,221 @@
+# answer_cache.py
+# Near-duplicate question cache for chatbot answers.
+#
+# Questions are canonicalized first (intent_matcher: lowercase, repeated
+# letters squeezed, known terms mapped to one name, so "paani" / "sinchai" /
+# "irrigation" all read "irrigation"), negations ("na", "nahi", "don't", ...)
+# all read "not", then stopwords are dropped. What's left is cut into
+# character shingles and summarised as a MinHash signature; an LSH index
+# (signature bands -> entries) turns a lookup into a few dict hits instead of
+# a scan. Candidates are confirmed with the exact shingle Jaccard, and an
+# answer is only reused when the question's meaning key matches exactly
+# (intent, negated or not, and the crop / pest / fertilizer names it
+# mentions, so "urea" never answers "dap") and the sensor readings fall in
+# the same buckets as the ones it was generated for.
+#
+# In-process, bounded to ANSWER_CACHE_SIZE entries (LRU) and ANSWER_CACHE_TTL
+# seconds; stats() reports hit rate and lookup time.
+
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from intent_matcher import get_matcher, normalize
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "5000"))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "86400"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.7"))
+# Sensor readings are compared in buckets of these sizes ("field=step,...").
+ANSWER_CACHE_BUCKETS = {
+    field: float(step)
+    for field, step in (
+        item.split("=") for item in os.getenv(
+            "ANSWER_CACHE_BUCKETS", "moisture=10,temperature=5,humidity=20"
+        ).split(",")
+    )
+}
+
+SHINGLE_SIZE = 4
+# 16 bands x 4 rows: pairs above ~0.5 Jaccard almost always share a band.
+BANDS = 16
+ROWS = 4
+NUM_PERM = BANDS * ROWS
+
+# Multiply-shift hash family, h(x) = (a * x + b) mod 2^64 >> 32 with odd a:
+# uint64 arithmetic wraps, so no modulo is needed.
+_rng = np.random.RandomState(7)
+_PERM_A = (_rng.randint(0, 2 ** 62, size=NUM_PERM, dtype=np.int64).astype(np.uint64) << np.uint64(1)) | np.uint64(1)
+_PERM_B = _rng.randint(0, 2 ** 62, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+_SHIFT = np.uint64(32)
+
+STOPWORDS = {
+    normalize(word) for word in (
+        "hai hain ho hoga hogi ka ki ke ko me mein main mai se par pe aur ya kya karu karun karna karni kare "
+        "karen du dun de dena do ji bhai please plz abhi ab mujhe mera meri hum ham "
+        "the a an is are am to for of in on at my i me we should can could you tell please"
+    ).split()
+}
+
+# "don't" normalizes to "don t"; the lone "t" is dropped with the stopwords.
+NEGATIONS = {
+    normalize(word) for word in (
+        "na nahi nahin nai nhi mat bina not no never without dont don didnt didn doesnt doesn "
+        "isnt isn cant cannot wont"
+    ).split()
+}
+STOPWORDS.add("t")
+
+
+def canonical_question(question):
+    # (canonical text, meaning key). Entries are only reused for a question
+    # with the same meaning key; the text is what Jaccard compares.
+    matcher = get_matcher()
+    words = ["not" if w in NEGATIONS else w for w in matcher.canonicalize(question).split()]
+    words = [w for w in words if w not in STOPWORDS]
+    matched = matcher.match(question)
+    entities = tuple(sorted((kind, name) for kind, names in matched["entities"].items() for name in names))
+    return " ".join(words), (matched["intent"], "not" in words, entities)
+
+
+def shingles(text):
+    padded = f" {text} "
+    if len(padded) <= SHINGLE_SIZE:
+        return {padded}
+    return {padded[i:i + SHINGLE_SIZE] for i in range(len(padded) - SHINGLE_SIZE + 1)}
+
+
+def signature(shingle_set):
+    hashes = np.array([zlib.crc32(s.encode("utf-8")) for s in shingle_set], dtype=np.uint64)[:, None]
+    return ((hashes * _PERM_A + _PERM_B) >> _SHIFT).min(axis=0)
+
+
+def band_keys(sig):
+    raw = sig.tobytes()
+    width = ROWS * sig.itemsize
+    return [(band, raw[band * width:(band + 1) * width]) for band in range(BANDS)]
+
+
+def sensor_buckets(sensor):
+    buckets = {}
+    for field, step in ANSWER_CACHE_BUCKETS.items():
+        try:
+            buckets[field] = int(float(sensor[field]) // step)
+        except (KeyError, TypeError, ValueError):
+            pass
+    return buckets
+
+
+class _Entry:
+    __slots__ = ("shingles", "bands", "meaning", "buckets", "answer", "expires_at")
+
+    def __init__(self, shingle_set, bands, meaning, buckets, answer, expires_at):
+        self.shingles = shingle_set
+        self.bands = bands
+        self.meaning = meaning
+        self.buckets = buckets
+        self.answer = answer
+        self.expires_at = expires_at
+
+
+class AnswerCache:
+    def __init__(self, max_entries=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL, threshold=ANSWER_CACHE_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        # (canonical question, meaning key, sensor buckets) -> _Entry, in LRU order
+        self._entries = OrderedDict()
+        self._index = {}  # (band, band hash) -> set of entry keys
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lookup_time_s = 0.0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        for band in entry.bands:
+            bucket = self._index.get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._index[band]
+
+    def _find(self, key, shingle_set, bands, meaning, buckets):
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at >= now:
+            return key
+
+        best, best_score = None, self.threshold
+        candidates = set()
+        for band in bands:
+            candidates.update(self._index.get(band, ()))
+        for candidate in candidates:
+            entry = self._entries[candidate]
+            if entry.expires_at < now or entry.meaning != meaning or entry.buckets != buckets:
+                continue
+            score = len(shingle_set & entry.shingles) / len(shingle_set | entry.shingles)
+            if score >= best_score:
+                best, best_score = candidate, score
+        return best
+
+    def lookup(self, question, sensor):
+        # The cached answer for a near-duplicate question, or None.
+        started = time.perf_counter()
+        text, meaning = canonical_question(question)
+        found = None
+        if text:
+            shingle_set = shingles(text)
+            bands = band_keys(signature(shingle_set))
+            buckets = sensor_buckets(sensor)
+            key = (text, meaning, tuple(sorted(buckets.items())))
+            with self._lock:
+                match = self._find(key, shingle_set, bands, meaning, buckets)
+                if match is not None:
+                    self._entries.move_to_end(match)
+                    found = self._entries[match].answer
+        with self._lock:
+            if found is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            self.lookup_time_s += time.perf_counter() - started
+        return found
+
+    def store(self, question, sensor, answer):
+        text, meaning = canonical_question(question)
+        if not text or not answer:
+            return
+        shingle_set = shingles(text)
+        bands = band_keys(signature(shingle_set))
+        buckets = sensor_buckets(sensor)
+        key = (text, meaning, tuple(sorted(buckets.items())))
+        entry = _Entry(shingle_set, bands, meaning, buckets, answer, time.time() + self.ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            for band in bands:
+                self._index.setdefault(band, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "avg_lookup_us": round(self.lookup_time_s / total * 1e6, 2) if total else 0.0,
+            }
+
+
+answer_cache = AnswerCache()
@@ -0,0 +1,478 @@
+# benchmark.py
+# Latency / throughput benchmark for the Python AI scripts. Everything external
+# is replaced by local stand-ins (redis_stub.py for Redis, advisory/stub_server.py
+# for the weather and LLM APIs), so runs are repeatable and comparable between
+# commits.
+#
+# For every target it measures:
+#   import      time to import the script's module in a fresh interpreter
+#   cold_start  one full `python script.py ...` run, as AiService spawns it
+#   call        in-process call latency after warmup (models already loaded)
+#   worker      round trip through worker.py's JSON-lines protocol
+#
+#   python benchmark.py [--only dryness_prediction,health_index] [--calls 200]
+#                       [--concurrency 1] [--llm-delay 0.0] [--out results.json]
+#   python benchmark.py --compare baseline.json [--threshold 10]
+#
+# Results are written as JSON (default: benchmark-<git sha>.json next to this
+# script, where .gitignore covers it). --compare
+# prints the change against a previous run and exits 1 on a regression.
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ADVISORY_DIR = os.path.join(BASE_DIR, "advisory")
+YEILD_DIR = os.path.join(BASE_DIR, "yeild")
+
+for path in (BASE_DIR, ADVISORY_DIR, YEILD_DIR):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from redis_stub import start_redis_stub  # noqa: E402
+from stub_server import start_stub_server  # noqa: E402
+
+QUESTIONS = [
+    "Gehu mein pani kab dena chahiye?",
+    "Patte peele ho rahe hain, kya karu?",
+    "Urea kitna dalna hai tillering stage par?",
+    "Aaj baarish hogi kya, irrigation rokna chahiye?",
+    "Keet lag gaye hain fasal mein",
+]
+
+# (section, metric, higher_is_better) pairs checked by --compare
+COMPARED_METRICS = [
+    ("import", "p50_ms", False),
+    ("cold_start", "p50_ms", False),
+    ("call", "p50_ms", False),
+    ("call", "p95_ms", False),
+    ("call", "p99_ms", False),
+    ("call", "throughput_rps", True),
+    ("worker", "p50_ms", False),
+    ("worker", "p95_ms", False),
+    ("worker", "throughput_rps", True),
+]
+
+
+def sensor_payload(rng):
+    return {
+        "moisture": round(rng.uniform(8, 90), 1),
+        "temperature": round(rng.uniform(12, 42), 1),
+        "humidity": round(rng.uniform(20, 95), 1),
+        "tds": round(rng.uniform(100, 900)),
+        "rainfall": round(rng.uniform(0, 400), 1),
+        "wind_speed": round(rng.uniform(0, 25), 1),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def chat_payload(rng):
+    return {"question": rng.choice(QUESTIONS), "sensor": sensor_payload(rng)}
+
+
+def summarize(samples_s, wall_s=None):
+    ms = np.asarray(samples_s, dtype=np.float64) * 1000
+    if not len(ms):
+        return {"n": 0}
+    summary = {
+        "n": int(len(ms)),
+        "mean_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+        "max_ms": round(float(ms.max()), 4),
+    }
+    if wall_s:
+        summary["throughput_rps"] = round(len(ms) / wall_s, 2)
+    return summary
+
+
+class Target:
+    # script: path relative to BASE_DIR, argv(rng) its CLI arguments.
+    # setup() returns call(payload) for the in-process measurement.
+    def __init__(self, name, script, module, argv, payload, setup, worker_op=None, worker_data=None):
+        self.name = name
+        self.script = script
+        self.module = module
+        self.argv = argv
+        self.payload = payload
+        self.setup = setup
+        self.worker_op = worker_op
+        self.worker_data = worker_data or payload
+
+
+def _setup_dryness():
+    import dryness_prediction
+    return dryness_prediction.days_remaining
+
+
+def _setup_health():
+    import health_index
+    return health_index.score
+
+
+def _setup_yield():
+    import yield_prediction
+    from model_service import load_model, predict_yield
+    model, feature_columns = load_model()
+    return lambda payload: predict_yield(model, feature_columns, yield_prediction.to_farm_data(payload))
+
+
+def _load_yeild_main():
+    # yeild/main.py under its own name, so it can't shadow another "main".
+    spec = importlib.util.spec_from_file_location("yeild_main", os.path.join(YEILD_DIR, "main.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _setup_yeild_batch():
+    from model_service import load_model
+    from redis_service import connect
+    yeild_main = _load_yeild_main()
+    redis_conn = connect()
+    model, feature_columns = load_model()
+
+    def call(farm_ids):
+        with contextlib.redirect_stdout(io.StringIO()):
+            yeild_main.run_batch(redis_conn, model, feature_columns, farm_ids)
+    return call
+
+
+def _setup_irrigation():
+    import irrigation_service
+    return irrigation_service.plan
+
+
+def _setup_advisory():
+    import advisory_adapter
+    return advisory_adapter.build_advisory
+
+
+def _setup_chatbot():
+    import chatbot_adapter
+    return chatbot_adapter.answer
+
+
+def build_targets(farm_ids):
+    sensor_argv = lambda rng: [json.dumps(sensor_payload(rng))]  # noqa: E731
+    batch_records = lambda rng: {  # noqa: E731
+        "records": [sensor_payload(rng) for _ in farm_ids]
+    }
+    return [
+        Target("dryness_prediction", "dryness_prediction.py", "dryness_prediction",
+               sensor_argv, sensor_payload, _setup_dryness, "dryness_prediction"),
+        Target("health_index", "health_index.py", "health_index",
+               sensor_argv, sensor_payload, _setup_health, "health_index"),
+        Target("yield_prediction", "yield_prediction.py", "yield_prediction",
+               sensor_argv, sensor_payload, _setup_yield, "yield_prediction"),
+        Target("yeild_main", os.path.join("yeild", "main.py"), "main",
+               lambda rng: list(farm_ids), lambda rng: list(farm_ids), _setup_yeild_batch,
+               "yield_batch", batch_records),
+        Target("irrigation_service", "irrigation_service.py", "irrigation_service",
+               sensor_argv, sensor_payload, _setup_irrigation, "irrigation_service"),
+        Target("advisory_adapter", "advisory_adapter.py", "advisory_adapter",
+               sensor_argv, sensor_payload, _setup_advisory, "advisory_adapter"),
+        Target("chatbot_adapter", "chatbot_adapter.py", "chatbot_adapter",
+               lambda rng: [json.dumps(chat_payload(rng))], chat_payload, _setup_chatbot,
+               "chatbot_adapter"),
+    ]
+
+
+def start_local_services(weather_delay=0.0, llm_delay=0.0, with_redis=True):
+    # The stand-ins are configured through the same env vars the scripts read,
+    # so in-process calls, spawned scripts and the worker all hit them.
+    # with_redis=False keeps the Redis the environment points at.
+    redis_server = start_redis_stub() if with_redis else None
+    http_server = start_stub_server(delay=weather_delay, llm_delay=llm_delay)
+    if redis_server is not None:
+        os.environ.update({"REDIS_HOST": redis_server.host, "REDIS_PORT": str(redis_server.port)})
+    os.environ.update({
+        "WEATHER_API_URL": http_server.base_url + "/data/2.5/forecast",
+        "WEATHER_API_KEY": "benchmark",
+        "LLM_BASE_URL": http_server.base_url + "/v1",
+        "HF_TOKEN": "benchmark",
+    })
+    return redis_server, http_server
+
+
+def start_stubs(args, farm_ids, rng):
+    redis_server, http_server = start_local_services(args.weather_delay, args.llm_delay)
+
+    from redis_service import INPUT_PREFIX
+    import yield_prediction
+    for farm_id in farm_ids:
+        farm_data = yield_prediction.to_farm_data(sensor_payload(rng))
+        redis_server.state.set((INPUT_PREFIX + farm_id).encode(), json.dumps(farm_data).encode())
+    return redis_server, http_server
+
+
+def measure_import(target, runs):
+    module_dir = os.path.dirname(os.path.join(BASE_DIR, target.script))
+    code = (
+        "import sys, time\n"
+        f"sys.path[:0] = [{module_dir!r}, {BASE_DIR!r}]\n"
+        "t = time.perf_counter()\n"
+        f"import {target.module}\n"
+        "print(time.perf_counter() - t)\n"
+    )
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", code], cwd=module_dir, capture_output=True, text=True, timeout=120,
+        )
+        if out.returncode != 0:
+            return {"n": 0, "error": out.stderr.strip().splitlines()[-1:]}
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return summarize(samples)
+
+
+def measure_cold_start(target, runs, rng):
+    script = os.path.join(BASE_DIR, target.script)
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        out = subprocess.run(
+            [sys.executable, script] + target.argv(rng),
+            cwd=os.path.dirname(script), capture_output=True, text=True, timeout=120,
+        )
+        elapsed = time.perf_counter() - started
+        if out.returncode != 0:
+            return {"n": 0, "error": out.stderr.strip().splitlines()[-1:]}
+        samples.append(elapsed)
+    return summarize(samples)
+
+
+def measure_calls(target, args, rng):
+    call = target.setup()
+    payloads = [target.payload(rng) for _ in range(args.warmup + args.calls)]
+    for payload in payloads[:args.warmup]:
+        call(payload)
+
+    def timed(payload):
+        started = time.perf_counter()
+        call(payload)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    if args.concurrency > 1:
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            samples = list(pool.map(timed, payloads[args.warmup:]))
+    else:
+        samples = [timed(payload) for payload in payloads[args.warmup:]]
+    return summarize(samples, time.perf_counter() - started)
+
+
+class WorkerClient:
+    def __init__(self):
+        started = time.perf_counter()
+        self.proc = subprocess.Popen(
+            [sys.executable, os.path.join(BASE_DIR, "worker.py")],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True, bufsize=1,
+        )
+        self.next_id = 0
+        self.send("healthcheck", {})
+        self.receive()
+        self.ready_s = time.perf_counter() - started
+
+    def send(self, op, data):
+        self.next_id += 1
+        self.proc.stdin.write(json.dumps({"id": self.next_id, "op": op, "data": data}) + "\n")
+        self.proc.stdin.flush()
+        return self.next_id
+
+    def receive(self):
+        line = self.proc.stdout.readline()
+        if not line:
+            raise RuntimeError("worker exited")
+        return json.loads(line)
+
+    def close(self):
+        self.proc.stdin.close()
+        self.proc.wait(timeout=10)
+
+
+def measure_worker(worker, target, args, rng):
+    # Up to --concurrency requests are in flight at once, like concurrent AiService calls.
+    payloads = [target.worker_data(rng) for _ in range(args.warmup + args.calls)]
+    for payload in payloads[:args.warmup]:
+        worker.send(target.worker_op, payload)
+        worker.receive()
+
+    samples = []
+    errors = 0
+    pending = payloads[args.warmup:]
+    started = time.perf_counter()
+    for i in range(0, len(pending), args.concurrency):
+        sent_at = {}
+        for payload in pending[i:i + args.concurrency]:
+            sent_at[worker.send(target.worker_op, payload)] = time.perf_counter()
+        for _ in range(len(sent_at)):
+            response = worker.receive()
+            samples.append(time.perf_counter() - sent_at[response["id"]])
+            errors += not response.get("ok")
+    summary = summarize(samples, time.perf_counter() - started)
+    summary["errors"] = errors
+    return summary
+
+
+def git_revision():
+    try:
+        sha = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True,
+        ).stdout.strip()
+        dirty = subprocess.run(["git", "diff", "--quiet", "HEAD", "--", "."], cwd=BASE_DIR).returncode != 0
+        return sha or "unknown", dirty
+    except OSError:
+        return "unknown", False
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    farm_ids = [f"bench-{i}" for i in range(args.batch)]
+    start_stubs(args, farm_ids, rng)
+
+    targets = build_targets(farm_ids)
+    if args.only:
+        wanted = set(args.only.split(","))
+        targets = [t for t in targets if t.name in wanted]
+
+    sha, dirty = git_revision()
+    results = {
+        "meta": {
+            "git_sha": sha,
+            "dirty": dirty,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+        },
+        "targets": {},
+    }
+
+    worker = None
+    if not args.skip_worker:
+        worker = WorkerClient()
+        results["meta"]["worker_ready_ms"] = round(worker.ready_s * 1000, 2)
+
+    try:
+        for target in targets:
+            print(f"-- {target.name}", file=sys.stderr, flush=True)
+            entry = {}
+            if not args.skip_cold:
+                entry["import"] = measure_import(target, args.cold_runs)
+                entry["cold_start"] = measure_cold_start(target, args.cold_runs, rng)
+            entry["call"] = measure_calls(target, args, rng)
+            if worker is not None and target.worker_op:
+                entry["worker"] = measure_worker(worker, target, args, rng)
+            results["targets"][target.name] = entry
+    finally:
+        if worker is not None:
+            worker.close()
+
+    if "advisory_adapter" in results["targets"]:
+        from llm_cache import advisory_cache
+        results["targets"]["advisory_adapter"]["llm_cache"] = advisory_cache.stats()
+    if "chatbot_adapter" in results["targets"]:
+        from answer_cache import answer_cache
+        results["targets"]["chatbot_adapter"]["answer_cache"] = answer_cache.stats()
+    return results
+
+
+def _fmt(section, key):
+    value = (section or {}).get(key)
+    return "-" if value is None else f"{value:.3f}"
+
+
+def print_table(results):
+    header = f"{'target':<20} {'import':>8} {'cold':>9} {'call p50':>9} {'p95':>9} {'p99':>9} {'rps':>10} {'worker p50':>11} {'p99':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, entry in results["targets"].items():
+        call = entry.get("call")
+        worker = entry.get("worker")
+        print(
+            f"{name:<20} {_fmt(entry.get('import'), 'p50_ms'):>8} {_fmt(entry.get('cold_start'), 'p50_ms'):>9} "
+            f"{_fmt(call, 'p50_ms'):>9} {_fmt(call, 'p95_ms'):>9} {_fmt(call, 'p99_ms'):>9} "
+            f"{_fmt(call, 'throughput_rps'):>10} {_fmt(worker, 'p50_ms'):>11} {_fmt(worker, 'p99_ms'):>9}"
+        )
+    print("(latencies in ms, rps = calls per second)")
+
+
+def compare(current, baseline, threshold_pct, min_delta_ms):
+    # Returns the regressions; a latency must also move by min_delta_ms to count,
+    # so sub-millisecond jitter on the cheap scripts doesn't fail the run.
+    regressions = []
+    print(f"\nvs {baseline['meta'].get('git_sha')} ({baseline['meta'].get('timestamp')})")
+    for name, entry in current["targets"].items():
+        base_entry = baseline["targets"].get(name)
+        if not base_entry:
+            continue
+        for section, metric, higher_is_better in COMPARED_METRICS:
+            new = (entry.get(section) or {}).get(metric)
+            old = (base_entry.get(section) or {}).get(metric)
+            if new is None or not old:
+                continue
+            change_pct = (new - old) / old * 100
+            worse = -change_pct if higher_is_better else change_pct
+            # Throughput is compared as time per call for the min_delta_ms check.
+            delta_ms = 1000 / new - 1000 / old if higher_is_better else new - old
+            regressed = worse > threshold_pct and delta_ms > min_delta_ms
+            flag = "REGRESSION" if regressed else ""
+            print(f"  {name:<20} {section + '.' + metric:<26} {old:>10.2f} -> {new:>10.2f} {change_pct:+7.1f}%  {flag}")
+            if regressed:
+                regressions.append((name, section, metric, old, new))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the AI scripts against local stand-ins")
+    parser.add_argument("--only", help="comma-separated target names")
+    parser.add_argument("--calls", type=int, default=200, help="measured calls per target")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--cold-runs", type=int, default=5, help="fresh interpreters per import / cold start")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--batch", type=int, default=32, help="farms per yeild/main.py batch")
+    parser.add_argument("--llm-delay", type=float, default=0.0, help="stub LLM response delay (s)")
+    parser.add_argument("--weather-delay", type=float, default=0.0, help="stub forecast response delay (s)")
+    parser.add_argument("--skip-cold", action="store_true", help="skip import / cold start runs")
+    parser.add_argument("--skip-worker", action="store_true")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", help="result file (default scripts/ai/benchmark-<git sha>.json)")
+    parser.add_argument("--compare", help="previous result file to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0, help="regression threshold in percent")
+    parser.add_argument("--min-delta-ms", type=float, default=0.1)
+    args = parser.parse_args()
+
+    results = run(args)
+    print_table(results)
+
+    out = args.out or os.path.join(BASE_DIR, f"benchmark-{results['meta']['git_sha']}.json")
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold, args.min_delta_ms):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
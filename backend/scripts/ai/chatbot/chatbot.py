@@ -1,20 +1,29 @@
+import getpass
+import os
+import sys
+
 from llm_client import ask_model
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from conversation_store import get_store  # noqa: E402
+
 print("Welcome Ask me ! Type 'exit' to quit.")
 
-# chat_history = []  # Initialize chat history list
+# History lives in the shared conversation store (summary + recent turns,
+# bounded by CHAT_HISTORY_TOKENS), keyed per local user.
+store = get_store()
+session_id = f"cli:{getpass.getuser()}"
 
 while True:
     user_input = input("You: ")
-    chat_history.append(user_input)
-    
+
     if user_input.lower() in ["exit", "quit"]:
         print("Goodbye!")
         break
 
-    response = ask_model(user_input)
-    chat_history.append(response)  # response is already a string
-    print("Bot:", response)
-    print(chat_history)
-
-
+    history = store.context_messages(store.load(session_id))
+    # The answer is printed as it streams in.
+    print("Bot: ", end="", flush=True)
+    response = ask_model(user_input, history, on_delta=lambda delta: print(delta, end="", flush=True))
+    print()
+    store.append(session_id, user_input, response)  # response is already a string
@@ -1,48 +1,50 @@
 import os
-from langchain_huggingface import ChatHuggingFace, HuggingFaceEndpoint
-from langchain.schema import HumanMessage, SystemMessage
+import sys
+
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv(dotenv_path=r"C:\Users\Patel\OneDrive\Desktop\RAG\.env")
-
-def get_model():
-    api_token = os.getenv("HUGGINGFACEHUB_API_TOKEN")
-    if not api_token:
-        raise ValueError("HUGGINGFACEHUB_API_TOKEN is not set in environment variables")
-
-    endpoint = HuggingFaceEndpoint(
-        repo_id="deepseek-ai/DeepSeek-V3.1",
-        task="text-generation",
-        huggingfacehub_api_token=api_token,
-    )
-
-    llm = ChatHuggingFace(llm=endpoint)
-    return llm
-
-
-def ask_model(prompt: str):
-    model = get_model()
-
-    messages = [
-        SystemMessage(content=(
-            "You are an AI Grain Quality Analyzer Assistant. "
-            "Your task is to analyze wheat or other grains based on given parameters like: "
-            "moisture level, temperature, humidity, grade, and storage conditions. "
-            "Provide output in structured bullet points including:\n"
-            "1. Quality Assessment\n"
-            "2. Storage Recommendation\n"
-            "3. Risk Factors (if any)\n"
-            "4. Shelf-life Insight\n"
-            "5. Market Advisory (Sell / Store / Monitor)\n"
-            "Keep answers short, technical, and practical. "
-            "Do NOT answer unrelated questions."
-        )),
-        HumanMessage(content=prompt)
-    ]
-
-    response = model.invoke(messages)
-    return response.content
+# The shared client reads HF_TOKEN; older .env files only set the hub token.
+if os.getenv("HUGGINGFACEHUB_API_TOKEN") and not os.getenv("HF_TOKEN"):
+    os.environ["HF_TOKEN"] = os.environ["HUGGINGFACEHUB_API_TOKEN"]
+
+# Same client as the advisory and chatbot_adapter paths (advisory/llm_pool.py):
+# kept-alive connections, bounded concurrency and streaming.
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "advisory"))
+from llm_pool import get_client, is_configured  # noqa: E402
+
+SYSTEM_PROMPT = (
+    "You are an AI Grain Quality Analyzer Assistant. "
+    "Your task is to analyze wheat or other grains based on given parameters like: "
+    "moisture level, temperature, humidity, grade, and storage conditions. "
+    "Provide output in structured bullet points including:\n"
+    "1. Quality Assessment\n"
+    "2. Storage Recommendation\n"
+    "3. Risk Factors (if any)\n"
+    "4. Shelf-life Insight\n"
+    "5. Market Advisory (Sell / Store / Monitor)\n"
+    "Keep answers short, technical, and practical. "
+    "Do NOT answer unrelated questions."
+)
+
+
+def ask_model(prompt: str, history=(), on_delta=None):
+    # history: earlier {"role", "content"} messages (see conversation_store).
+    # on_delta(text) receives the answer as it streams in.
+    if not is_configured():
+        raise ValueError("HF_TOKEN (or HUGGINGFACEHUB_API_TOKEN) is not set in environment variables")
+
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}, *history, {"role": "user", "content": prompt}]
+    client = get_client()
+    if on_delta is None:
+        return client.chat(messages)
+
+    parts = []
+    for delta in client.stream_chat(messages):
+        parts.append(delta)
+        on_delta(delta)
+    return "".join(parts)
 
 
 if __name__ == "__main__":
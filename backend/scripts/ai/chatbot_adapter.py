@@ -1,52 +1,61 @@
 import json
-import re
 import sys
 from pathlib import Path
 
+from answer_cache import answer_cache
+from conversation_store import get_store
+from intent_matcher import match as match_intent
+
 
 def _fallback_answer(question, sensor):
-    q = question.lower()
+    matched = match_intent(question)
+    intent = matched["intent"]
+    crops = matched["entities"].get("crop", [])
+    pests = matched["entities"].get("pest", [])
     moisture = sensor.get("moisture")
     temp = sensor.get("temperature")
     humidity = sensor.get("humidity")
+    crop_note = f" ({', '.join(crops)})" if crops else ""
 
-    if any(k in q for k in ["irrigation", "paani", "water", "motor", "pump"]):
+    if intent == "irrigation":
         if moisture is not None and moisture < 35:
             return (
-                "Haan, abhi irrigation dena sahi rahega. Soil moisture low side par hai. "
+                f"Haan, abhi irrigation dena sahi rahega{crop_note}. Soil moisture low side par hai. "
                 "Short cycle me paani do (15-20 min), phir 30-45 min baad moisture re-check karo."
             )
         return (
-            "Irrigation ke liye pehle soil moisture check karo. Agar top layer dry ho aur moisture 35% se niche ho "
+            f"Irrigation{crop_note} ke liye pehle soil moisture check karo. Agar top layer dry ho aur moisture 35% se niche ho "
             "to short irrigation cycle do. Overwatering avoid karo."
         )
 
-    if any(k in q for k in ["pest", "insect", "keeda", "disease", "rog", "whitefly", "aphid", "thrips"]):
+    if intent == "pest":
+        target = f"{', '.join(pests)}{crop_note} ke liye" if pests else f"Pest/disease{crop_note} ke liye"
         return (
-            "Pest/disease ke liye pehle symptom isolate karo: leaf spots, curling, stem damage ya sucking marks. "
+            f"{target} pehle symptom isolate karo: leaf spots, curling, stem damage ya sucking marks. "
             "Affected plants ko alag karo, field scouting badhao, aur local agri guideline ke hisaab se targeted spray plan banao."
         )
 
-    if any(k in q for k in ["fertilizer", "khad", "nutrient", "npk", "urea"]):
+    if intent == "fertilizer":
         return (
-            "Fertilizer blindly apply mat karo. Crop stage + soil status ke basis par split dose best hoti hai. "
+            f"Fertilizer{crop_note} blindly apply mat karo. Crop stage + soil status ke basis par split dose best hoti hai. "
             "Vegetative stage me nitrogen priority, flowering/fruiting me potash balance maintain karo."
         )
 
-    if any(k in q for k in ["weather", "rain", "baarish", "temperature"]):
+    if intent == "weather":
         base = "Weather-based planning rakho: rain chance high ho to irrigation postpone karo."
         if temp is not None and temp >= 32:
             base += " High temperature me subah ya shaam irrigation better rahega."
         return base
 
-    # Match greetings as whole words to avoid false positives like "bhindi" -> "hi"
-    if re.search(r"\b(hello|hi|hey)\b", q) or "can i ask" in q or "anything" in q:
+    if intent == "greeting":
         return (
             "Bilkul, aap agriculture se related kuch bhi pooch sakte ho. "
             "Main irrigation, pest control, fertilizer planning, crop stage decisions aur weather-based actions me help kar sakta hoon."
         )
 
     extra = []
+    if crops:
+        extra.append(f"crop {', '.join(crops)}")
     if moisture is not None:
         extra.append(f"moisture {moisture}%")
     if temp is not None:
@@ -61,24 +70,42 @@ def _fallback_answer(question, sensor):
     )
 
 
-def main():
-    payload = json.loads(sys.argv[1]) if len(sys.argv) > 1 else {}
-    question = payload.get("question", "").strip()
-    sensor = payload.get("sensor", {}) or {}
-
-    advisory_dir = Path(__file__).resolve().parent / "advisory"
-    sys.path.insert(0, str(advisory_dir))
-
+def _llm_summarizer(client):
+    # Rolls old turns into the session summary (see conversation_store).
+    def summarize(previous, turns, max_tokens):
+        transcript = "\n".join(f"Farmer: {turn['q']}\nAssistant: {turn['a']}" for turn in turns)
+        messages = [
+            {
+                "role": "system",
+                "content": (
+                    "Summarize this farming chat in simple Hinglish, in at most "
+                    f"{max_tokens * 3 // 4} words. Keep the crop, field problems, readings and advice given."
+                ),
+            },
+            {"role": "user", "content": f"Summary so far: {previous or 'none'}\n\n{transcript}"},
+        ]
+        return client.chat(messages, max_tokens=max_tokens, temperature=0)
+    return summarize
+
+
+def _answer(question, sensor, history, on_delta):
     try:
         from rag_service import retrieve  # noqa
-        from llm_service import InferenceClient, HF_MODEL, HF_TOKEN  # noqa
+        from llm_pool import get_client, is_configured  # noqa
     except Exception:
-        print(json.dumps({"answer": _fallback_answer(question, sensor), "source": "fallback"}))
-        return
+        return {"answer": _fallback_answer(question, sensor), "source": "fallback"}
 
-    if not InferenceClient or not HF_TOKEN:
-        print(json.dumps({"answer": _fallback_answer(question, sensor), "source": "fallback"}))
-        return
+    if not is_configured():
+        return {"answer": _fallback_answer(question, sensor), "source": "fallback"}
+
+    # Near-duplicate questions with compatible readings reuse an earlier
+    # answer. Inside a conversation the answer depends on the history, which
+    # cached answers were written without.
+    cached = None if history else answer_cache.lookup(question, sensor)
+    if cached is not None:
+        if on_delta is not None:
+            on_delta(cached)
+        return {"answer": cached, "source": "cache"}
 
     notes = []
     try:
@@ -87,7 +114,6 @@ def main():
         notes = []
 
     context_block = "\n".join(notes) if notes else "No additional reference context."
-    client = InferenceClient(model=HF_MODEL, token=HF_TOKEN)
 
     system_message = (
         "You are a general-purpose agriculture assistant for farmers. "
@@ -105,19 +131,67 @@ def main():
         f"If question is general, answer generally. If sensor data is useful, include it naturally."
     )
 
+    # Earlier turns (summary + recent ones, within CHAT_HISTORY_TOKENS) go
+    # between the system prompt and the new question.
+    messages = [{"role": "system", "content": system_message}, *history, {"role": "user", "content": user_message}]
+
     try:
-        response = client.chat_completion(
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": user_message},
-            ],
-            max_tokens=220,
-            temperature=0.2,
-        )
-        answer = response.choices[0].message.content.strip()
-        print(json.dumps({"answer": answer, "source": "llm"}))
+        client = get_client()
+        if on_delta is None:
+            text = client.chat(messages, max_tokens=220, temperature=0.2)
+        else:
+            parts = []
+            for delta in client.stream_chat(messages, max_tokens=220, temperature=0.2):
+                parts.append(delta)
+                on_delta(delta)
+            text = "".join(parts)
+        text = text.strip()
+        # Only answers written without conversation history are reusable by others.
+        if not history:
+            answer_cache.store(question, sensor, text)
+        return {"answer": text, "source": "llm"}
     except Exception:
-        print(json.dumps({"answer": _fallback_answer(question, sensor), "source": "fallback"}))
+        return {"answer": _fallback_answer(question, sensor), "source": "fallback"}
+
+
+def answer(payload, on_delta=None):
+    # on_delta(text) receives partial answer text as it streams in. With a
+    # user_id the conversation is remembered across calls.
+    question = payload.get("question", "").strip()
+    sensor = payload.get("sensor", {}) or {}
+    session_id = payload.get("user_id")
+
+    advisory_dir = Path(__file__).resolve().parent / "advisory"
+    if str(advisory_dir) not in sys.path:
+        sys.path.insert(0, str(advisory_dir))
+
+    if not session_id:
+        return _answer(question, sensor, [], on_delta)
+
+    store = get_store()
+    history = store.context_messages(store.load(session_id))
+    result = _answer(question, sensor, history, on_delta)
+
+    summarizer = None
+    if result["source"] == "llm":
+        from llm_pool import get_client  # noqa
+        summarizer = _llm_summarizer(get_client())
+    store.append(session_id, question, result["answer"], summarizer)
+    return result
+
+
+def main():
+    payload = json.loads(sys.argv[1]) if len(sys.argv) > 1 else {}
+
+    if payload.get("stream"):
+        # One {"delta": ...} line per streamed piece, then the final answer object.
+        def emit(delta):
+            print(json.dumps({"delta": delta}), flush=True)
+
+        print(json.dumps(answer(payload, on_delta=emit)))
+        return
+
+    print(json.dumps(answer(payload)))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,229 @@
+# conversation_store.py
+# Per-user chat memory for the chatbot, kept in Redis under chat:session:<id>.
+#
+# - Each session is one small document: a rolling summary plus the most recent
+#   turns. When the turns outgrow CHAT_HISTORY_TOKENS, the oldest ones are
+#   folded into the summary, so the history sent to the LLM never exceeds the
+#   budget however long the chat runs.
+# - Idle sessions expire after CHAT_SESSION_TTL seconds; every write renews it.
+# - Stored text is capped per turn, so a session's size is bounded too.
+# - If Redis is unavailable, sessions live in a small in-process LRU instead.
+#
+# Tokens are estimated as characters / 4, which is close enough for budgeting
+# and needs no tokenizer.
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+
+import redis_pool
+
+CHAT_HISTORY_TOKENS = int(os.getenv("CHAT_HISTORY_TOKENS", "800"))
+CHAT_SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", "200"))
+CHAT_TURN_MAX_CHARS = int(os.getenv("CHAT_TURN_MAX_CHARS", "2000"))
+CHAT_SESSION_TTL = int(os.getenv("CHAT_SESSION_TTL", "3600"))
+CHAT_LOCAL_SESSIONS = int(os.getenv("CHAT_LOCAL_SESSIONS", "256"))
+
+REDIS_PREFIX = "chat:session:"
+CHARS_PER_TOKEN = 4
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s")
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN if text else 0
+
+
+def _turn_tokens(turn):
+    return estimate_tokens(turn["q"]) + estimate_tokens(turn["a"])
+
+
+def _first_sentence(text, limit=160):
+    sentence = _SENTENCE_RE.split(text.strip(), 1)[0]
+    return sentence if len(sentence) <= limit else sentence[:limit].rsplit(" ", 1)[0] + "..."
+
+
+def _clip_tail(text, max_tokens):
+    # Keep the most recent part of the summary within max_tokens.
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    tail = text[-(limit - 3):]
+    return "..." + tail.split(" ", 1)[-1]
+
+
+def compact_summary(previous, turns, max_tokens):
+    # Extractive summary: the first sentence of each question and answer.
+    lines = [previous] if previous else []
+    for turn in turns:
+        lines.append(f"Farmer asked: {_first_sentence(turn['q'])} Advised: {_first_sentence(turn['a'])}")
+    return _clip_tail(" ".join(lines), max_tokens)
+
+
+def new_session():
+    return {"summary": "", "turns": []}
+
+
+def _with_turn(session, turn):
+    return {"summary": session["summary"], "turns": session["turns"] + [turn]}
+
+
+class ConversationStore:
+    # summarizer(previous_summary, turns, max_tokens) -> str; an LLM-backed one
+    # can be passed in, compact_summary is used when it fails or is missing.
+
+    def __init__(self, history_tokens=CHAT_HISTORY_TOKENS, summary_tokens=CHAT_SUMMARY_TOKENS,
+                 ttl=CHAT_SESSION_TTL, local_sessions=CHAT_LOCAL_SESSIONS):
+        self.history_tokens = history_tokens
+        self.summary_tokens = min(summary_tokens, history_tokens // 2)
+        self.ttl = ttl
+        self.local_sessions = local_sessions
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self.summaries = 0
+
+    def _key(self, session_id):
+        return REDIS_PREFIX + str(session_id)
+
+    def _redis_client(self):
+        if not redis_pool.available():
+            return None
+        return redis_pool.get_client(decode_responses=False)
+
+    def _get_local(self, session_id):
+        with self._lock:
+            entry = self._local.get(session_id)
+            if entry is None:
+                return None
+            expires_at, session = entry
+            if expires_at < time.time():
+                del self._local[session_id]
+                return None
+            self._local.move_to_end(session_id)
+            return session
+
+    def _put_local(self, session_id, session):
+        with self._lock:
+            self._local[session_id] = (time.time() + self.ttl, session)
+            self._local.move_to_end(session_id)
+            while len(self._local) > self.local_sessions:
+                self._local.popitem(last=False)
+
+    def load(self, session_id):
+        client = self._redis_client()
+        if client is not None:
+            try:
+                return redis_pool.get_value(self._key(session_id), client) or new_session()
+            except redis.RedisError:
+                redis_pool.mark_down()
+        return self._get_local(session_id) or new_session()
+
+    def context_messages(self, session):
+        # Chat messages for the prompt: the summary, then as many of the most
+        # recent turns as fit in the remaining budget.
+        budget = self.history_tokens - estimate_tokens(session["summary"])
+        recent = []
+        for turn in reversed(session["turns"]):
+            budget -= _turn_tokens(turn)
+            if budget < 0:
+                break
+            recent.append(turn)
+
+        messages = []
+        if session["summary"]:
+            messages.append({"role": "system", "content": f"Earlier in this conversation: {session['summary']}"})
+        for turn in reversed(recent):
+            messages.append({"role": "user", "content": turn["q"]})
+            messages.append({"role": "assistant", "content": turn["a"]})
+        return messages
+
+    def _roll_up(self, session, summarizer):
+        # Once the turns outgrow the budget, fold the oldest into the summary
+        # and keep half the budget of recent turns, so this runs every few turns
+        # rather than on every one.
+        turns = session["turns"]
+        if estimate_tokens(session["summary"]) + sum(map(_turn_tokens, turns)) <= self.history_tokens:
+            return session
+
+        target = (self.history_tokens - self.summary_tokens) // 2
+        kept, used = 0, 0
+        for turn in reversed(turns):
+            used += _turn_tokens(turn)
+            if used > target and kept:
+                break
+            kept += 1
+        old, recent = turns[:len(turns) - kept], turns[len(turns) - kept:]
+        if not old:
+            return session
+
+        summary = None
+        if summarizer is not None:
+            try:
+                summary = summarizer(session["summary"], old, self.summary_tokens)
+            except Exception:
+                summary = None
+        if not summary:
+            summary = compact_summary(session["summary"], old, self.summary_tokens)
+        self.summaries += 1
+        return {"summary": _clip_tail(summary.strip(), self.summary_tokens), "turns": recent}
+
+    def append(self, session_id, question, answer, summarizer=None):
+        turn = {"q": question[:CHAT_TURN_MAX_CHARS], "a": answer[:CHAT_TURN_MAX_CHARS]}
+        key = self._key(session_id)
+        client = self._redis_client()
+        if client is not None:
+            try:
+                # The roll-up may call the LLM summarizer, so it runs before the
+                # transaction: no pooled connection is held during it, and a
+                # WATCH retry does not repeat it.
+                raw = client.get(key)
+                session = redis_pool.decode(raw) or new_session()
+                rolled = self._roll_up(_with_turn(session, turn), summarizer)
+
+                # WATCH/MULTI, so two replies for one user can't drop a turn. If
+                # the session changed meanwhile, the turn goes onto the current
+                # one with the extractive summary instead.
+                def update(pipe):
+                    current = pipe.get(key)
+                    if current == raw:
+                        result = rolled
+                    else:
+                        result = self._roll_up(_with_turn(redis_pool.decode(current) or new_session(), turn), None)
+                    pipe.multi()
+                    pipe.set(key, redis_pool.get_codec().dumps(result), ex=self.ttl)
+                    return result
+
+                return client.transaction(update, key, value_from_callable=True)
+            except redis.RedisError:
+                redis_pool.mark_down()
+
+        session = self._roll_up(_with_turn(self._get_local(session_id) or new_session(), turn), summarizer)
+        self._put_local(session_id, session)
+        return session
+
+    def clear(self, session_id):
+        with self._lock:
+            self._local.pop(session_id, None)
+        client = self._redis_client()
+        if client is not None:
+            try:
+                client.delete(self._key(session_id))
+            except redis.RedisError:
+                redis_pool.mark_down()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ConversationStore()
+    return _store
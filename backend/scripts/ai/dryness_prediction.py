@@ -1,18 +1,90 @@
 import sys
 import json
 
+import numpy as np
+
+# Formula: lower moisture = fewer days remaining before critical (10% threshold)
+# Simple linear approximation: (current - threshold) / (evaporation rate/day)
+THRESHOLD = 10
+EVAP_RATE = 5 # 5% per day
+DEFAULT_MOISTURE = 50 # assumed when a farm has no moisture reading
+
+# Windowed mode: the drying rate is fitted from recent history instead of EVAP_RATE.
+WINDOW = 24
+MIN_EVAP_RATE = 0.5 # floor for flat / rising moisture (e.g. right after irrigation)
+
+
+def days_remaining(input_data):
+    moisture = input_data.get('moisture', DEFAULT_MOISTURE)
+    return max(0, round((moisture - THRESHOLD) / EVAP_RATE, 1))
+
+
+def days_remaining_batch(moisture, evap_rate=EVAP_RATE):
+    # moisture and evap_rate broadcast together, e.g. one value per farm.
+    moisture = np.asarray(moisture, dtype=np.float64)
+    evap_rate = np.asarray(evap_rate, dtype=np.float64)
+    return np.maximum(0, np.round((moisture - THRESHOLD) / evap_rate, 1))
+
+
+def _rolling_sum(values, window):
+    csum = np.cumsum(values, axis=-1)
+    csum = np.concatenate([np.zeros(values.shape[:-1] + (1,)), csum], axis=-1)
+    return csum[..., window:] - csum[..., :-window]
+
+
+def rolling_evap_rate(moisture, times_days, window=WINDOW, min_rate=MIN_EVAP_RATE):
+    # Least-squares slope of moisture vs time over every rolling window, for all
+    # farms at once. moisture: (farms, T) with NaN for missing readings;
+    # times_days: (farms, T) or (T,). Returns (farms, T - window + 1) drying
+    # rates in %/day, NaN where a window holds fewer than two readings.
+    moisture = np.atleast_2d(np.asarray(moisture, dtype=np.float64))
+    times = np.broadcast_to(np.asarray(times_days, dtype=np.float64), moisture.shape)
+
+    valid = ~(np.isnan(moisture) | np.isnan(times))
+    # Center time per farm to keep the sums well conditioned (a farm without
+    # readings has no start time; all its windows come out NaN).
+    start = np.min(np.where(valid, times, np.inf), axis=-1, keepdims=True)
+    t = np.where(valid, times - np.where(np.isinf(start), 0.0, start), 0.0)
+    m = np.where(valid, moisture, 0.0)
+    w = valid.astype(np.float64)
+
+    n = _rolling_sum(w, window)
+    s_t = _rolling_sum(t, window)
+    s_m = _rolling_sum(m, window)
+    s_tt = _rolling_sum(t * t, window)
+    s_tm = _rolling_sum(t * m, window)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        var = s_tt - s_t * s_t / n
+        cov = s_tm - s_t * s_m / n
+        slope = cov / var
+    rate = np.where((n >= 2) & (var > 1e-12), -slope, np.nan)
+    return np.where(np.isnan(rate), rate, np.maximum(rate, min_rate))
+
+
+def days_remaining_windowed(moisture, times_days, window=WINDOW, min_rate=MIN_EVAP_RATE):
+    # Days to critical per farm from the latest reading and the drying rate
+    # fitted over the last `window` readings; falls back to EVAP_RATE. A farm
+    # with no moisture reading at all gets days_remaining's default
+    # (DEFAULT_MOISTURE at EVAP_RATE), never NaN.
+    moisture = np.atleast_2d(np.asarray(moisture, dtype=np.float64))
+    times = np.broadcast_to(np.asarray(times_days, dtype=np.float64), moisture.shape)
+    window = min(window, moisture.shape[-1])
+    # Only the most recent window matters here.
+    rate = rolling_evap_rate(moisture[:, -window:], times[:, -window:], window, min_rate)[:, -1]
+    rate = np.where(np.isnan(rate), EVAP_RATE, rate)
+
+    has_reading = ~np.isnan(moisture)
+    last_index = moisture.shape[-1] - 1 - np.argmax(has_reading[:, ::-1], axis=-1)
+    latest = moisture[np.arange(len(moisture)), last_index]
+    latest = np.where(has_reading.any(axis=-1), latest, DEFAULT_MOISTURE)
+    return days_remaining_batch(latest, rate), rate
+
+
 def predict():
     # Simulate processing
     input_data = json.loads(sys.argv[1])
-    
-    moisture = input_data.get('moisture', 50)
-    # Formula: lower moisture = fewer days remaining before critical (10% threshold)
-    # Simple linear approximation: (current - threshold) / (evaporation rate/day)
-    threshold = 10
-    evap_rate = 5 # 5% per day
-    days_rem = max(0, round((moisture - threshold) / evap_rate, 1))
-    
-    print(json.dumps({"prediction": days_rem}))
+    print(json.dumps({"prediction": days_remaining(input_data)}))
 
 if __name__ == "__main__":
     predict()
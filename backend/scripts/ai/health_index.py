@@ -1,23 +1,50 @@
 import sys
 import json
 
+import numpy as np
+
+def score(input_data):
+    m = input_data.get('moisture', 50)
+    t = input_data.get('temperature', 25)
+    h = input_data.get('humidity', 50)
+
+    # Health Index based on sensor stability (0-100 scale)
+    # Ideal: M: 40-60, T: 22-28, H: 45-65
+    m_score = 100 - abs(m - 50) * 2
+    t_score = 100 - abs(t - 25) * 4
+    h_score = 100 - abs(h - 55) * 2
+
+    health = (m_score + t_score + h_score) / 3
+    return max(0, min(100, round(health, 0)))
+
+
+def score_batch(moisture, temperature, humidity):
+    # Same formula as score() over arrays of readings (any matching shape,
+    # e.g. one value per farm or a farms x time matrix).
+    m = np.asarray(moisture, dtype=np.float64)
+    t = np.asarray(temperature, dtype=np.float64)
+    h = np.asarray(humidity, dtype=np.float64)
+
+    health = (
+        (100 - np.abs(m - 50) * 2)
+        + (100 - np.abs(t - 25) * 4)
+        + (100 - np.abs(h - 55) * 2)
+    ) / 3
+    return np.clip(np.round(health), 0, 100)
+
+
+def score_records(records):
+    return score_batch(
+        [r.get('moisture', 50) for r in records],
+        [r.get('temperature', 25) for r in records],
+        [r.get('humidity', 50) for r in records],
+    )
+
+
 def calculate():
     try:
         input_data = json.loads(sys.argv[1])
-        m = input_data.get('moisture', 50)
-        t = input_data.get('temperature', 25)
-        h = input_data.get('humidity', 50)
-        
-        # Health Index based on sensor stability (0-100 scale)
-        # Ideal: M: 40-60, T: 22-28, H: 45-65
-        m_score = 100 - abs(m - 50) * 2
-        t_score = 100 - abs(t - 25) * 4
-        h_score = 100 - abs(h - 55) * 2
-        
-        health = (m_score + t_score + h_score) / 3
-        health = max(0, min(100, round(health, 0)))
-
-        print(json.dumps({"index": health}))
+        print(json.dumps({"index": score(input_data)}))
     except Exception as e:
         print(json.dumps({"index": 0, "error": str(e)}))
 
@@ -0,0 +1,556 @@
+# history_store.py
+# Append-only per-farm sensor history in compact columnar files.
+#
+# Layout, one directory per farm under SENSOR_HISTORY_DIR:
+#   active.bin        rows as they arrive: fixed 24-byte records
+#                     (int64 epoch ms, float32 moisture / temperature /
+#                     humidity / tds), appended with one write per batch
+#   seg-<first ts>-<rows>.col
+#                     sealed segments of up to SENSOR_HISTORY_SEGMENT_ROWS
+#                     rows, sorted by time. A JSON header is followed by one
+#                     8-byte aligned block per column:
+#                       ts      uint32 deltas in ms (raw int64 if a gap
+#                               exceeds ~49 days)
+#                       metric  fixed point (value * METRIC_SCALES), stored
+#                               as int8 deltas when every step fits, else as
+#                               raw int16 (INT16_MISSING marks a gap)
+# Columns are read through numpy.memmap at their offsets; decoding is a
+# cumsum / scale over the rows a query touches, never a per-record parse.
+#
+# Sealing renames active.bin to sealing.bin, writes the segment under a name
+# derived from its content and then deletes sealing.bin, so it can be redone
+# after a crash. Appends need a single writer per directory: run one
+# `--ingest` process (it reads the sensor stream in its own consumer group).
+# Readers can be any process.
+#
+#   python history_store.py --ingest                 # tail stream:sensors
+#   python history_store.py '{"farm_id": "f1", "start": "2024-05-01", "bucket_s": 3600}'
+#   python history_store.py --bench [--rows 1000000]
+
+import argparse
+import json
+import math
+import os
+import socket
+import sys
+import threading
+import time
+from datetime import datetime
+from urllib.parse import quote
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SENSOR_HISTORY_DIR = os.getenv("SENSOR_HISTORY_DIR", os.path.join(BASE_DIR, "history"))
+SENSOR_HISTORY_SEGMENT_ROWS = int(os.getenv("SENSOR_HISTORY_SEGMENT_ROWS", "65536"))
+# Most raw rows one query returns (the latest ones); downsample for more.
+SENSOR_HISTORY_MAX_ROWS = int(os.getenv("SENSOR_HISTORY_MAX_ROWS", "10000"))
+HISTORY_GROUP = os.getenv("SENSOR_HISTORY_GROUP", "group:history")
+
+METRICS = ("moisture", "temperature", "humidity", "tds")
+# Fixed-point scale per metric: 0.01 resolution, TDS in whole ppm.
+METRIC_SCALES = {"moisture": 100, "temperature": 100, "humidity": 100, "tds": 1}
+INT16_MISSING = -32768
+
+ROW_DTYPE = np.dtype([("ts", "<i8")] + [(m, "<f4") for m in METRICS])
+MAGIC = b"AGHSEG1\n"
+ALIGN = 8
+ACTIVE = "active.bin"
+SEALING = "sealing.bin"
+
+
+def farm_dir(farm, root=SENSOR_HISTORY_DIR):
+    return os.path.join(root, quote(str(farm), safe=""))
+
+
+def parse_ts_ms(record, default_ms):
+    value = record.get("timestamp")
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        # Seconds or milliseconds since the epoch.
+        return int(value * 1000) if value < 1e11 else int(value)
+    if isinstance(value, str):
+        try:
+            return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp() * 1000)
+        except ValueError:
+            pass
+    return default_ms
+
+
+def to_ms(value, default=None):
+    if value is None:
+        return default
+    return parse_ts_ms({"timestamp": value}, default)
+
+
+def to_rows(ts_ms, records):
+    rows = np.zeros(len(records), dtype=ROW_DTYPE)
+    rows["ts"] = ts_ms
+    for metric in METRICS:
+        values = [record.get(metric) for record in records]
+        rows[metric] = [
+            v if isinstance(v, (int, float)) and not isinstance(v, bool) else np.nan for v in values
+        ]
+    return rows
+
+
+# --- segment encoding -------------------------------------------------------
+
+def _encode_ts(ts):
+    deltas = np.diff(ts)
+    if len(ts) and deltas.max(initial=0) <= np.iinfo(np.uint32).max:
+        return "delta32", np.uint32, {"base": int(ts[0])}, deltas.astype(np.uint32)
+    return "raw64", np.int64, {}, ts.astype(np.int64)
+
+
+def _encode_metric(values, scale):
+    fixed = np.round(values.astype(np.float64) * scale)
+    missing = np.isnan(fixed)
+    if not missing.any() and len(fixed):
+        deltas = np.diff(fixed)
+        if np.abs(deltas).max(initial=0) <= 127:
+            return "delta8", np.int8, {"base": int(fixed[0])}, deltas.astype(np.int8)
+    fixed = np.clip(np.where(missing, INT16_MISSING, fixed), INT16_MISSING, 32767)
+    return "raw16", np.int16, {}, fixed.astype(np.int16)
+
+
+def write_segment(directory, rows):
+    # rows: structured ROW_DTYPE array. Returns the segment path.
+    rows = rows[np.argsort(rows["ts"], kind="stable")]
+    columns, blocks, offset = {}, [], 0
+    encoded = [("ts",) + _encode_ts(rows["ts"])]
+    encoded += [(m,) + _encode_metric(rows[m], METRIC_SCALES[m]) for m in METRICS]
+    for name, encoding, dtype, extra, data in encoded:
+        columns[name] = dict(extra, encoding=encoding, dtype=np.dtype(dtype).str, offset=offset, count=len(data))
+        if name != "ts":
+            columns[name]["scale"] = METRIC_SCALES[name]
+        raw = data.tobytes()
+        blocks.append(raw + b"\0" * (-len(raw) % ALIGN))
+        offset += len(blocks[-1])
+
+    first_ts = int(rows["ts"][0]) if len(rows) else 0
+    header = json.dumps({
+        "rows": len(rows),
+        "first_ts": first_ts,
+        "last_ts": int(rows["ts"][-1]) if len(rows) else 0,
+        "columns": columns,
+    }).encode("utf-8")
+    header += b" " * (-(len(MAGIC) + 8 + len(header)) % ALIGN)
+
+    path = os.path.join(directory, f"seg-{first_ts:013d}-{len(rows)}.col")
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + len(header).to_bytes(8, "little") + header)
+        for block in blocks:
+            f.write(block)
+    os.replace(tmp, path)
+    return path
+
+
+class Segment:
+    # A sealed segment: header parsed once, columns memory-mapped on demand.
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Not a history segment: {path}")
+            size = int.from_bytes(f.read(8), "little")
+            self.header = json.loads(f.read(size))
+        self.data_offset = len(MAGIC) + 8 + size
+        self.rows = self.header["rows"]
+        self.first_ts = self.header["first_ts"]
+        self.last_ts = self.header["last_ts"]
+        self._ts = None
+
+    def _raw(self, name):
+        column = self.header["columns"][name]
+        if not column["count"]:
+            return np.zeros(0, dtype=column["dtype"])
+        return np.memmap(
+            self.path, dtype=column["dtype"], mode="r",
+            offset=self.data_offset + column["offset"], shape=(column["count"],),
+        )
+
+    def timestamps(self):
+        # Decoded once per segment (sealed segments never change).
+        if self._ts is None:
+            column = self.header["columns"]["ts"]
+            raw = self._raw("ts")
+            if column["encoding"] == "delta32":
+                ts = np.empty(self.rows, dtype=np.int64)
+                if self.rows:
+                    ts[0] = column["base"]
+                    np.cumsum(raw, dtype=np.int64, out=ts[1:])
+                    ts[1:] += column["base"]
+                self._ts = ts
+            else:
+                self._ts = np.asarray(raw, dtype=np.int64)
+        return self._ts
+
+    def metric(self, name, start=0, stop=None):
+        # Float32 values of rows [start, stop).
+        column = self.header["columns"][name]
+        stop = self.rows if stop is None else stop
+        raw = self._raw(name)
+        if column["encoding"] == "delta8":
+            # Value at row i = base + sum(deltas[:i]).
+            fixed = np.empty(stop - start, dtype=np.int64)
+            if stop > start:
+                fixed[0] = column["base"] + int(raw[:start].sum(dtype=np.int64))
+                np.cumsum(raw[start:stop - 1], dtype=np.int64, out=fixed[1:])
+                fixed[1:] += fixed[0]
+            return (fixed / column["scale"]).astype(np.float32)
+        values = np.asarray(raw[start:stop])
+        out = values.astype(np.float32) / column["scale"]
+        out[values == INT16_MISSING] = np.nan
+        return out
+
+
+# --- store --------------------------------------------------------------------
+
+class HistoryStore:
+    def __init__(self, root=SENSOR_HISTORY_DIR, segment_rows=SENSOR_HISTORY_SEGMENT_ROWS):
+        self.root = root
+        self.segment_rows = segment_rows
+        self._segments = {}  # path -> Segment
+        self._lock = threading.Lock()
+
+    # writes (single writer per farm directory)
+
+    def append(self, farm, ts_ms, records):
+        # ts_ms: one epoch-ms timestamp per record.
+        if not records:
+            return
+        directory = farm_dir(farm, self.root)
+        os.makedirs(directory, exist_ok=True)
+        self._recover(directory)
+        active = os.path.join(directory, ACTIVE)
+        with open(active, "ab") as f:
+            f.write(to_rows(ts_ms, records).tobytes())
+            size = f.tell()
+        if size // ROW_DTYPE.itemsize >= self.segment_rows:
+            self.seal(farm)
+
+    def seal(self, farm):
+        directory = farm_dir(farm, self.root)
+        active = os.path.join(directory, ACTIVE)
+        if not os.path.exists(active):
+            return None
+        sealing = os.path.join(directory, SEALING)
+        os.replace(active, sealing)
+        return self._seal_file(directory, sealing)
+
+    def _seal_file(self, directory, sealing):
+        rows = _read_rows(sealing)
+        path = write_segment(directory, np.array(rows)) if len(rows) else None
+        os.unlink(sealing)
+        return path
+
+    def _recover(self, directory):
+        # A crash between renaming active.bin and deleting sealing.bin.
+        sealing = os.path.join(directory, SEALING)
+        if os.path.exists(sealing):
+            self._seal_file(directory, sealing)
+
+    # reads (any process)
+
+    def _segment(self, path):
+        with self._lock:
+            segment = self._segments.get(path)
+            if segment is None:
+                segment = self._segments[path] = Segment(path)
+            return segment
+
+    def _sources(self, directory):
+        # sealing.bin is opened before listing segments: if its segment is
+        # already written, its rows are there and it is skipped.
+        pending = _read_rows(os.path.join(directory, SEALING))
+        try:
+            names = sorted(n for n in os.listdir(directory) if n.startswith("seg-") and n.endswith(".col"))
+        except FileNotFoundError:
+            return [], None, None
+        segments = []
+        for name in names:
+            try:
+                segments.append(self._segment(os.path.join(directory, name)))
+            except (OSError, ValueError):
+                continue  # removed or half-written; skip
+        if len(pending):
+            first = int(pending["ts"].min())
+            if f"seg-{first:013d}-{len(pending)}.col" in names:
+                pending = None
+        return segments, pending, _read_rows(os.path.join(directory, ACTIVE))
+
+    def range(self, farm, start_ms=None, end_ms=None, metrics=METRICS):
+        # {"ts": int64 ms, metric: float32, ...} for start_ms <= ts < end_ms, in time order.
+        start_ms = -2 ** 63 if start_ms is None else int(start_ms)
+        end_ms = 2 ** 63 - 1 if end_ms is None else int(end_ms)
+        segments, pending, active = self._sources(farm_dir(farm, self.root))
+        parts = {name: [] for name in ("ts",) + tuple(metrics)}
+
+        for segment in segments:
+            if segment.last_ts < start_ms or segment.first_ts >= end_ms:
+                continue
+            ts = segment.timestamps()
+            lo, hi = np.searchsorted(ts, start_ms, "left"), np.searchsorted(ts, end_ms, "left")
+            if lo == hi:
+                continue
+            parts["ts"].append(ts[lo:hi])
+            for metric in metrics:
+                parts[metric].append(segment.metric(metric, lo, hi))
+
+        for rows in (pending, active):
+            if rows is None or not len(rows):
+                continue
+            mask = (rows["ts"] >= start_ms) & (rows["ts"] < end_ms)
+            if mask.any():
+                parts["ts"].append(rows["ts"][mask])
+                for metric in metrics:
+                    parts[metric].append(rows[metric][mask])
+
+        result = {
+            name: np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int64 if name == "ts" else np.float32)
+            for name, chunks in parts.items()
+        }
+        if len(result["ts"]) > 1 and (np.diff(result["ts"]) < 0).any():
+            # Late rows (or unsorted active rows) interleave with sealed ones.
+            order = np.argsort(result["ts"], kind="stable")
+            result = {name: values[order] for name, values in result.items()}
+        return result
+
+    def latest(self, farm, count, metrics=METRICS):
+        # The most recent `count` rows, oldest first.
+        directory = farm_dir(farm, self.root)
+        segments, pending, active = self._sources(directory)
+        available = sum(s.rows for s in segments) + sum(len(r) for r in (pending, active) if r is not None)
+        if not available:
+            return self.range(farm, 0, 0, metrics)
+        # Walk back over segments until enough rows are covered.
+        covered = sum(len(r) for r in (pending, active) if r is not None)
+        start_ms = None
+        for segment in reversed(segments):
+            if covered >= count:
+                break
+            covered += segment.rows
+            start_ms = segment.first_ts
+        if covered >= count and start_ms is None:
+            times = np.concatenate([r["ts"] for r in (pending, active) if r is not None and len(r)])
+            start_ms = int(np.sort(times)[-count])
+        result = self.range(farm, start_ms, None, metrics)
+        return {name: values[-count:] for name, values in result.items()}
+
+    def downsample(self, farm, start_ms, end_ms, bucket_ms, metrics=METRICS):
+        # Per bucket of bucket_ms: start time, reading count, and mean / min /
+        # max per metric (NaN where a bucket has no value for it).
+        data = self.range(farm, start_ms, end_ms, metrics)
+        ts = data["ts"]
+        if not len(ts):
+            return {"ts": [], "count": [], **{m: {"mean": [], "min": [], "max": []} for m in metrics}}
+        origin = int(start_ms) if start_ms is not None else int(ts[0]) - int(ts[0]) % bucket_ms
+        bucket = (ts - origin) // bucket_ms
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        result = {
+            "ts": (origin + bucket[starts] * bucket_ms).tolist(),
+            "count": np.diff(np.r_[starts, len(ts)]).tolist(),
+        }
+        for metric in metrics:
+            values = data[metric].astype(np.float64)
+            present = ~np.isnan(values)
+            sums = np.add.reduceat(np.where(present, values, 0.0), starts)
+            counts = np.add.reduceat(present.astype(np.int64), starts)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean = np.where(counts > 0, sums / counts, np.nan)
+            result[metric] = {
+                "mean": _rounded(mean),
+                "min": _rounded(np.fmin.reduceat(values, starts)),
+                "max": _rounded(np.fmax.reduceat(values, starts)),
+            }
+        return result
+
+    def farms(self):
+        try:
+            return sorted(os.listdir(self.root))
+        except FileNotFoundError:
+            return []
+
+
+def _read_rows(path):
+    # Structured rows of an append file (memory-mapped; a torn last record is ignored).
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return np.zeros(0, dtype=ROW_DTYPE)
+    count = size // ROW_DTYPE.itemsize
+    if not count:
+        return np.zeros(0, dtype=ROW_DTYPE)
+    try:
+        return np.memmap(path, dtype=ROW_DTYPE, mode="r", shape=(count,))
+    except (OSError, ValueError):
+        return np.zeros(0, dtype=ROW_DTYPE)
+
+
+def _rounded(values):
+    return [None if v != v else round(v, 3) for v in values.tolist()]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = HistoryStore()
+    return _store
+
+
+def query(request, store=None):
+    # request: {"farm_id", "start", "end" (epoch ms/s or ISO; default the last
+    # 24 hours), "bucket_s" (downsample), "metrics", "dryness": true (days to
+    # critical from the drying rate over the latest readings)}
+    import dryness_prediction
+
+    store = store or get_store()
+    farm = request.get("farm_id")
+    if not farm:
+        raise ValueError("farm_id is required")
+    metrics = tuple(request.get("metrics") or METRICS)
+    unknown = [m for m in metrics if m not in METRICS]
+    if unknown:
+        raise ValueError(f"Unknown metrics: {', '.join(unknown)} (expected {', '.join(METRICS)})")
+    end = to_ms(request.get("end"), int(time.time() * 1000))
+    start = to_ms(request.get("start"), end - 86400_000)
+    if start >= end:
+        raise ValueError("start must be before end")
+
+    result = {"farm_id": farm, "start": start, "end": end}
+    bucket_s = request.get("bucket_s")
+    if bucket_s:
+        result["buckets"] = store.downsample(farm, start, end, int(bucket_s * 1000), metrics)
+    else:
+        data = store.range(farm, start, end, metrics)
+        result["truncated"] = len(data["ts"]) > SENSOR_HISTORY_MAX_ROWS
+        rows = {name: values[-SENSOR_HISTORY_MAX_ROWS:] for name, values in data.items()}
+        result["rows"] = {name: _rounded(values) for name, values in rows.items() if name != "ts"}
+        result["rows"]["ts"] = rows["ts"].tolist()
+
+    if request.get("dryness"):
+        recent = store.latest(farm, dryness_prediction.WINDOW, ("moisture",))
+        moisture = recent["moisture"].astype(np.float64)
+        # None without a moisture reading among the latest rows (NaN is not JSON).
+        result["dryness"] = None
+        if len(recent["ts"]) and not np.isnan(moisture).all():
+            days, rate = dryness_prediction.days_remaining_windowed(moisture, recent["ts"] / 86400_000)
+            days, rate = float(days[0]), float(rate[0])
+            result["dryness"] = {
+                "prediction": round(days, 2) if math.isfinite(days) else None,
+                "evap_rate": round(rate, 3) if math.isfinite(rate) else None,
+                "readings": len(recent["ts"]),
+            }
+    return result
+
+
+# --- ingestion from the sensor stream ------------------------------------------
+
+def ingest():
+    from sensor_stats import farm_key
+    from stream_worker import follow
+
+    store = get_store()
+
+    def handle(entries):
+        by_farm = {}
+        for entry_id, record in entries:
+            # Stream ids start with the arrival time in ms.
+            ts, records = by_farm.setdefault(farm_key(record), ([], []))
+            ts.append(parse_ts_ms(record, int(entry_id.split("-")[0])))
+            records.append(record)
+        for farm, (ts, records) in by_farm.items():
+            store.append(farm, ts, records)
+
+    follow(HISTORY_GROUP, f"history-{socket.gethostname()}", handle)
+
+
+def bench(rows, root):
+    store = HistoryStore(root, segment_rows=65536)
+    rng = np.random.default_rng(0)
+    start = 1_700_000_000_000
+    step_ms = 60_000
+    ts = start + np.arange(rows, dtype=np.int64) * step_ms
+    moisture = np.clip(50 + np.cumsum(rng.normal(0, 0.05, rows)), 5, 95).round(2)
+    records = [
+        {"moisture": m, "temperature": t, "humidity": h, "tds": d}
+        for m, t, h, d in zip(
+            moisture.tolist(), (25 + 5 * np.sin(np.arange(rows) / 720)).round(2).tolist(),
+            rng.uniform(40, 80, rows).round(1).tolist(), rng.integers(300, 600, rows).tolist(),
+        )
+    ]
+    started = time.perf_counter()
+    for i in range(0, rows, 1000):
+        store.append("bench", ts[i:i + 1000].tolist(), records[i:i + 1000])
+    append_s = time.perf_counter() - started
+
+    directory = farm_dir("bench", root)
+    disk = sum(os.path.getsize(os.path.join(directory, n)) for n in os.listdir(directory))
+    json_bytes = sum(len(json.dumps(r)) for r in records[:10000]) / 10000 * rows
+
+    reader = HistoryStore(root)
+    started = time.perf_counter()
+    month = reader.range("bench", start, start + 30 * 86400_000)
+    cold_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    reader.range("bench", start, start + 30 * 86400_000)
+    warm_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    hourly = reader.downsample("bench", start, start + 30 * 86400_000, 3600_000)
+    downsample_ms = (time.perf_counter() - started) * 1000
+
+    payloads = [json.dumps(r) for r in records[:len(month["ts"])]]
+    started = time.perf_counter()
+    parsed = [json.loads(p) for p in payloads]
+    np.array([p["moisture"] for p in parsed])
+    json_ms = (time.perf_counter() - started) * 1000
+
+    print(json.dumps({
+        "rows": rows,
+        "append_us_per_row": round(append_s / rows * 1e6, 3),
+        "bytes_per_row": round(disk / rows, 2),
+        "json_bytes_per_row": round(json_bytes / rows, 2),
+        "month_rows": len(month["ts"]),
+        "month_range_ms": round(cold_ms, 2),
+        "month_range_warm_ms": round(warm_ms, 2),
+        "month_hourly_downsample_ms": round(downsample_ms, 2),
+        "hourly_buckets": len(hourly["ts"]),
+        "month_json_decode_ms": round(json_ms, 2),
+        "max_moisture_error": float(np.abs(month["moisture"] - moisture[:len(month["ts"])]).max()),
+    }, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar per-farm sensor history")
+    parser.add_argument("request", nargs="?")
+    parser.add_argument("--ingest", action="store_true", help="append readings from the sensor stream")
+    parser.add_argument("--bench", action="store_true")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--root", default=None, help="store directory for --bench")
+    args = parser.parse_args()
+
+    if args.ingest:
+        ingest()
+    elif args.bench:
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as root:
+            bench(args.rows, args.root or root)
+    else:
+        try:
+            request = json.loads(args.request if args.request is not None else sys.stdin.read())
+            print(json.dumps(query(request)))
+        except Exception as e:
+            # Same contract as the other scripts: always a JSON reply on stdout.
+            print(json.dumps({"error": str(e)}))
+
+
+if __name__ == "__main__":
+    main()
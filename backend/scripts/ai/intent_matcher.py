@@ -0,0 +1,286 @@
+# intent_matcher.py
+# Keyword intent matcher for the chatbot's offline answers (chatbot_adapter's
+# fallback when the LLM is down).
+#
+# All intent and entity terms are compiled once into a single regex shaped
+# like a trie (shared prefixes are matched once, so adding terms doesn't add
+# passes), and one finditer over the question finds every term. Matches are
+# then scored per intent and crop, pest and fertilizer names are returned as
+# entities.
+#
+# Terms are normalised (lowercase, punctuation to spaces, repeated letters
+# squeezed) and each letter is compiled as "xx*" (a literal first letter keeps
+# re's fast first-character scan), so Hinglish spellings like
+# "paani" / "pani" or "keeda" / "keda" meet without rewriting the question
+# first. Terms match at a word start; a trailing "*" also lets the word
+# continue ("irrigat*" -> "irrigation", "irrigate").
+#
+#   python intent_matcher.py "gehu mein aphid lag gaya, spray karu?"
+#   python intent_matcher.py --bench [--terms 50,200,800]
+
+import argparse
+import json
+import random
+import re
+import string
+import sys
+import time
+from functools import lru_cache
+
+# Listed in tie-break order: on equal scores the earlier intent wins.
+INTENT_TERMS = {
+    "irrigation": [
+        "irrigat*", "paani", "water*", "motor", "pump*", "sinchai", "sichai", "drip", "sprinkler*", "nami",
+    ],
+    "pest": [
+        "pest*", "insect*", "keeda", "keede", "kida", "keet", "disease*", "rog", "bimari", "fungus", "fungal",
+        "blight", "rust", "wilt*", "spray*",
+    ],
+    "fertilizer": ["fertili*", "khaad", "nutrient*"],
+    "weather": [
+        "weather", "mausam", "rain*", "baarish", "barsaat", "temperature", "garmi", "thand", "forecast",
+    ],
+    "greeting": ["hello", "hi", "hey", "namaste", "can i ask", "anything"],
+}
+
+# Greetings often open a real question ("hi, pump kab chalau?"); they only
+# win when nothing else matched.
+INTENT_WEIGHTS = {"greeting": 0.5}
+
+CROP_TERMS = {
+    "wheat": ["wheat", "gehu", "gehun", "gehoon", "kanak"],
+    "rice": ["rice", "paddy", "dhaan", "chawal"],
+    "maize": ["maize", "corn", "makka", "makki"],
+    "cotton": ["cotton", "kapas", "narma"],
+    "mustard": ["mustard", "sarson"],
+    "sugarcane": ["sugarcane", "ganna"],
+    "potato": ["potato*", "aloo"],
+    "tomato": ["tomato*", "tamatar"],
+    "onion": ["onion*", "pyaaz", "pyaj"],
+    "okra": ["okra", "bhindi"],
+    "chickpea": ["chickpea*", "chana"],
+    "soybean": ["soybean*", "soya"],
+    "bajra": ["bajra", "pearl millet"],
+}
+
+# A pest or fertilizer name is also evidence for the "pest" / "fertilizer" intent.
+PEST_TERMS = {
+    "whitefly": ["whitefl*", "white fly", "safed makhi"],
+    "aphid": ["aphid*", "mahu", "chepa"],
+    "thrips": ["thrips"],
+    "jassid": ["jassid*", "hopper*"],
+    "bollworm": ["bollworm*", "sundi"],
+    "stem borer": ["stem borer*", "tana chedak"],
+    "termite": ["termite*", "deemak", "dimak"],
+    "armyworm": ["armyworm*"],
+    "mite": ["mite*", "makdi"],
+    "locust": ["locust*", "tiddi"],
+}
+
+FERTILIZER_TERMS = {
+    "urea": ["urea"],
+    "dap": ["dap"],
+    "npk": ["npk"],
+    "potash": ["potash"],
+    "zinc": ["zinc"],
+    "manure": ["manure"],
+    "compost": ["compost"],
+}
+
+_PUNCT_RE = re.compile(r"[^a-z0-9]+")
+_REPEAT_RE = re.compile(r"(?<=([a-z]))\1+")
+_END = ""  # trie key marking the end of a term
+SURFACE_CACHE_SIZE = 10000
+
+
+def normalize(text):
+    text = _PUNCT_RE.sub(" ", str(text).lower())
+    return _REPEAT_RE.sub("", text).strip()
+
+
+def _char_pattern(ch):
+    if ch == " ":
+        return r"[\W_]+"
+    ch = re.escape(ch)
+    return ch + ch + "*" if ch.isalpha() else ch
+
+
+def _trie_pattern(node):
+    # Longer continuations are tried first; a term that ends here must end
+    # the word too unless it is a prefix term.
+    branches = [_char_pattern(ch) + _trie_pattern(child) for ch, child in sorted(node.items()) if ch != _END]
+    if _END in node:
+        branches.append("" if node[_END] else r"(?!\w)")
+    if len(branches) == 1:
+        return branches[0]
+    return "(?:" + "|".join(branches) + ")"
+
+
+class IntentMatcher:
+    def __init__(self, intents=INTENT_TERMS, crops=CROP_TERMS, pests=PEST_TERMS, fertilizers=FERTILIZER_TERMS,
+                 weights=INTENT_WEIGHTS):
+        self.intent_order = list(intents)
+        # normalized term -> {"intents": {intent: weight}, "entity": (kind, name) or None}
+        self.terms = {}
+        trie = {}
+
+        def add(raw, intent=None, entity=None):
+            prefix = raw.endswith("*")
+            term = normalize(raw.rstrip("*"))
+            info = self.terms.setdefault(term, {"intents": {}, "entity": None})
+            if intent is not None:
+                info["intents"][intent] = weights.get(intent, 1.0)
+            if entity is not None:
+                info["entity"] = entity
+            node = trie
+            for ch in term:
+                node = node.setdefault(ch, {})
+            node[_END] = node.get(_END, False) or prefix
+
+        for intent, terms in intents.items():
+            for raw in terms:
+                add(raw, intent=intent)
+        for name, terms in crops.items():
+            for raw in terms:
+                add(raw, entity=("crop", name))
+        for kind, names in (("pest", pests), ("fertilizer", fertilizers)):
+            if kind not in self.intent_order and names:
+                self.intent_order.append(kind)
+            for name, terms in names.items():
+                for raw in terms:
+                    add(raw, intent=kind, entity=(kind, name))
+
+        pattern = _trie_pattern(trie) if trie else None
+        self.regex = re.compile(r"\b" + pattern) if trie else None
+        # Same terms, but a match runs to the end of its word (for canonicalize).
+        self._word_regex = re.compile(r"\b(" + pattern + r")\w*") if trie else None
+        # matched text ("paaani") -> normalized term ("pani")
+        self._surface = {}
+
+    def _info(self, surface):
+        term = self._surface.get(surface)
+        if term is None:
+            term = normalize(surface)
+            if len(self._surface) < SURFACE_CACHE_SIZE:
+                self._surface[surface] = term
+        return self.terms[term]
+
+    def _canonical_term(self, m):
+        info = self._info(m.group(1))
+        if info["entity"] is not None:
+            return info["entity"][1]
+        return max(info["intents"], key=info["intents"].get)
+
+    def canonicalize(self, text):
+        # Normalized text with every known term replaced by its entity or
+        # intent name: "paani", "sinchai" and "irrigate" all read "irrigation".
+        text = normalize(text)
+        if self._word_regex is not None:
+            text = self._word_regex.sub(self._canonical_term, text)
+        return text
+
+    def match(self, text):
+        scores = {}
+        entities = {}
+        if self.regex is not None:
+            for surface in self.regex.findall(str(text).lower()):
+                info = self._info(surface)
+                for intent, weight in info["intents"].items():
+                    scores[intent] = scores.get(intent, 0.0) + weight
+                if info["entity"] is not None:
+                    kind, name = info["entity"]
+                    found = entities.setdefault(kind, [])
+                    if name not in found:
+                        found.append(name)
+
+        intent, best = None, 0.0
+        for name in self.intent_order:
+            if scores.get(name, 0.0) > best:
+                intent, best = name, scores[name]
+        return {"intent": intent, "scores": scores, "entities": entities}
+
+
+@lru_cache(maxsize=1)
+def get_matcher():
+    return IntentMatcher()
+
+
+def match(text):
+    return get_matcher().match(text)
+
+
+# --- benchmark against the previous if/any() chain -------------------------
+
+BENCH_QUESTIONS = [
+    "Gehu mein paani kab dena chahiye?",
+    "Patte peele ho rahe hain, kya karu?",
+    "Urea kitna dalna hai tillering stage par?",
+    "Aaj baarish hogi kya, irrigation rokna chahiye?",
+    "Keet lag gaye hain fasal mein, whitefly dikh rahi hai",
+    "hi, can i ask something about bhindi?",
+    "Cotton mein pink bollworm ka attack hai, kaunsa spray karu aur pump kab chalau?",
+    "Temperature 38 hai, sarson ki fasal ko kya nuksaan hoga?",
+]
+
+
+def _legacy_intent(question, intents):
+    # Same shape as the old _fallback_answer: lowercase, then one any() scan
+    # per intent in order, first hit wins.
+    q = question.lower()
+    for intent, terms in intents.items():
+        if any(k in q for k in terms):
+            return intent
+    return None
+
+
+def _synthetic_vocab(extra_terms, seed=7):
+    # The real vocabulary plus extra_terms random words spread over the intents.
+    rng = random.Random(seed)
+    intents = {intent: list(terms) for intent, terms in INTENT_TERMS.items()}
+    names = list(intents)
+    for i in range(extra_terms):
+        word = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10)))
+        intents[names[i % len(names)]].append(word)
+    return intents
+
+
+def _time_per_call(fn, questions, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for q in questions:
+            fn(q)
+    return (time.perf_counter() - start) / (rounds * len(questions))
+
+
+def bench(term_counts, rounds):
+    print(f"{'terms':>6} {'legacy us':>10} {'matcher us':>11} {'build ms':>9}")
+    for extra in term_counts:
+        intents = _synthetic_vocab(extra)
+        legacy_terms = {intent: [t.rstrip("*") for t in terms] for intent, terms in intents.items()}
+        total = sum(len(terms) for terms in intents.values())
+
+        start = time.perf_counter()
+        matcher = IntentMatcher(intents)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        legacy = _time_per_call(lambda q: _legacy_intent(q, legacy_terms), BENCH_QUESTIONS, rounds)
+        compiled = _time_per_call(matcher.match, BENCH_QUESTIONS, rounds)
+        print(f"{total:>6} {legacy * 1e6:>10.2f} {compiled * 1e6:>11.2f} {build_ms:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chatbot fallback intent matcher")
+    parser.add_argument("text", nargs="?")
+    parser.add_argument("--bench", action="store_true", help="time against the legacy any() chain")
+    parser.add_argument("--terms", default="0,200,800", help="extra synthetic terms per --bench row")
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    if args.bench:
+        bench([int(n) for n in args.terms.split(",")], args.rounds)
+        return
+    print(json.dumps(match(args.text if args.text is not None else sys.stdin.read())))
+
+
+if __name__ == "__main__":
+    main()
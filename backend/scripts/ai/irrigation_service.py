@@ -0,0 +1,269 @@
+# irrigation_service.py
+# Recommended irrigation minutes from the RandomForest trained by
+# "hardware codescripts/Randomforest.py" (irrigation_model.pkl + stage_encoder.pkl).
+# The model and stage encodings are loaded together and reloaded when the
+# artifacts change (checked every MODEL_RELOAD_CHECK_S, e.g. after
+# train_pipeline.py promotes a version), and a whole fleet is scored with a
+# single predict call per tick.
+#
+# The crop stage is the payload's crop_stage, else derived from its
+# days_after_sowing or sowing_date, else from the farm's sowing date in
+# season:<farm> (set by SowingService, see season_features.py), else
+# DEFAULT_STAGE. A stage the encoder doesn't know is reported as an error.
+#
+# stage_encoder.classes.json (encoder.classes_ with the encoder's sha1) is
+# written by the training step (train_pipeline.py, or --export-classes after
+# Randomforest.py), so serving never unpickles the encoder or writes here.
+#
+#   python irrigation_service.py '{"crop_stage": "Tillering", "temperature": 31, "humidity": 40, "moisture": 27}'
+#   python irrigation_service.py '{"farms": {"farm-1": {...}, "farm-2": {...}}}'
+#   python irrigation_service.py --export-classes
+
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from datetime import date
+
+import joblib
+import numpy as np
+
+import tracing
+from tree_engine import compiled_path, file_digest, is_current, load_compiled
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.getenv(
+    "IRRIGATION_MODEL_DIR",
+    os.path.join(BASE_DIR, "..", "..", "..", "hardware codescripts"),
+)
+MODEL_PATH = os.path.join(MODEL_DIR, "irrigation_model.pkl")
+ENCODER_PATH = os.path.join(MODEL_DIR, "stage_encoder.pkl")
+# encoder.classes_ as JSON, so serving doesn't have to import sklearn to unpickle it.
+CLASSES_PATH = os.path.join(MODEL_DIR, "stage_encoder.classes.json")
+
+# Flat-array export of the model (see tree_engine.py); used when it matches MODEL_PATH.
+USE_COMPILED = os.getenv("IRRIGATION_COMPILED_MODEL", "true").lower() not in ("false", "0", "no")
+
+# How often the artifacts are checked for a promoted model.
+MODEL_RELOAD_CHECK_S = float(os.getenv("MODEL_RELOAD_CHECK_S", "30"))
+
+# Used when neither the payload nor the farm's season has a stage or sowing date.
+DEFAULT_STAGE = os.getenv("IRRIGATION_DEFAULT_STAGE", "Tillering")
+
+# Column order of Randomforest.py's X.
+FEATURES = ["crop_stage", "temperature", "humidity", "soil_moisture"]
+
+# Wheat growth stages by days after sowing (upper bound, stage).
+STAGE_BY_DAS = [
+    (20, "Germination"),
+    (30, "CRI"),
+    (45, "Tillering"),
+    (65, "Jointing"),
+    (80, "Booting"),
+    (95, "Flowering"),
+    (110, "MilkStage"),
+]
+LATE_STAGE = "Maturity"
+
+_loaded = None  # (model, stage codes, version, artifacts mtime)
+_checked_at = 0.0
+_load_lock = threading.Lock()
+
+
+def _stage_key(name):
+    # "Milk Stage", "milk_stage" and "MilkStage" all map to the same class.
+    return re.sub(r"[^a-z0-9]", "", str(name).lower())
+
+
+def classes_path(encoder_path):
+    return os.path.splitext(encoder_path)[0] + ".classes.json"
+
+
+def export_stage_classes(encoder_path, out_path=None):
+    # Training / export step: write the encoder's classes next to it.
+    out_path = out_path or classes_path(encoder_path)
+    classes = [str(name) for name in joblib.load(encoder_path).classes_]
+    tmp = f"{out_path}.tmp-{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump({"source_sha1": file_digest(encoder_path), "classes": classes}, f, indent=2)
+    os.replace(tmp, out_path)
+    return out_path
+
+
+def load_stage_classes():
+    # From the exported JSON when it matches the encoder; else (stale or
+    # missing export) from the encoder itself, without writing anything.
+    try:
+        with open(CLASSES_PATH) as f:
+            cached = json.load(f)
+        if cached.get("source_sha1") == file_digest(ENCODER_PATH):
+            return cached["classes"]
+    except (OSError, ValueError, KeyError):
+        pass
+    return [str(name) for name in joblib.load(ENCODER_PATH).classes_]
+
+
+def artifacts_mtime():
+    paths = [MODEL_PATH, ENCODER_PATH] + ([CLASSES_PATH] if os.path.exists(CLASSES_PATH) else [])
+    return max(os.path.getmtime(path) for path in paths)
+
+
+def _load():
+    mtime = artifacts_mtime()
+    with tracing.span("irrigation.load_model"):
+        stage_codes = {_stage_key(name): float(i) for i, name in enumerate(load_stage_classes())}
+        if USE_COMPILED and is_current(MODEL_PATH):
+            model = load_compiled(compiled_path(MODEL_PATH))
+        else:
+            model = joblib.load(MODEL_PATH)
+        digest = hashlib.sha1((file_digest(MODEL_PATH) + file_digest(ENCODER_PATH)).encode("ascii"))
+    return model, stage_codes, digest.hexdigest()[:16], mtime
+
+
+def load_model():
+    # Returns (model, {stage key: encoded value}); stage lookups are plain
+    # dict hits. The pair is swapped as one, so a call never mixes a new model
+    # with old stage codes; if a reload fails the loaded model keeps serving.
+    global _loaded, _checked_at
+    loaded = _loaded
+    if loaded is None or time.time() - _checked_at >= MODEL_RELOAD_CHECK_S:
+        with _load_lock:
+            if _loaded is None or time.time() - _checked_at >= MODEL_RELOAD_CHECK_S:
+                _checked_at = time.time()
+                try:
+                    if _loaded is None or artifacts_mtime() != _loaded[3]:
+                        _loaded = _load()
+                except Exception:
+                    if _loaded is None:
+                        raise
+            loaded = _loaded
+    return loaded[0], loaded[1]
+
+
+def model_version():
+    # Changes whenever a new model or encoder is loaded; cached advisories
+    # that quote the model's minutes are keyed on it.
+    load_model()
+    return _loaded[2]
+
+
+def stage_for_days(days_after_sowing):
+    for upper, stage in STAGE_BY_DAS:
+        if days_after_sowing <= upper:
+            return stage
+    return LATE_STAGE
+
+
+def resolve_stage(record, today=None, sowing_date=None):
+    # sowing_date: the farm's season sowing date, used when the record has none.
+    if record.get("crop_stage"):
+        return str(record["crop_stage"])
+    days = record.get("days_after_sowing")
+    sowing_date = record.get("sowing_date") or sowing_date
+    if days is None and sowing_date:
+        try:
+            sown = date.fromisoformat(str(sowing_date)[:10])
+            days = ((today or date.today()) - sown).days
+        except ValueError:
+            days = None
+    if days is not None:
+        try:
+            return stage_for_days(float(days))
+        except (TypeError, ValueError):
+            pass
+    return DEFAULT_STAGE
+
+
+def resolve_stages(records, farm_ids=None):
+    # Stage per record; records without their own stage or sowing date use
+    # their farm's season sowing date (one Redis round trip for all of them).
+    missing = [
+        i for i, record in enumerate(records)
+        if not record.get("crop_stage") and record.get("days_after_sowing") is None and not record.get("sowing_date")
+    ]
+    sown = {}
+    if missing:
+        from season_features import get_aggregator
+        from sensor_stats import farm_key
+
+        farms = {i: farm_ids[i] if farm_ids else farm_key(records[i]) for i in missing}
+        dates = get_aggregator().sowing_dates(farms.values())
+        sown = {i: dates.get(farm) for i, farm in farms.items()}
+    return [resolve_stage(record, sowing_date=sown.get(i)) for i, record in enumerate(records)]
+
+
+def to_feature_matrix(records, stages, stage_codes):
+    # One row per record in FEATURES order; an unknown stage or a missing /
+    # non-numeric reading leaves NaN so the row is skipped.
+    matrix = np.full((len(records), len(FEATURES)), np.nan, dtype=np.float64)
+    for i, (record, stage) in enumerate(zip(records, stages)):
+        code = stage_codes.get(_stage_key(stage))
+        if code is not None:
+            matrix[i, 0] = code
+        moisture = record.get("soil_moisture", record.get("moisture"))
+        for j, value in enumerate((record.get("temperature"), record.get("humidity"), moisture), start=1):
+            try:
+                matrix[i, j] = float(value)
+            except (TypeError, ValueError):
+                pass
+    return matrix
+
+
+def score(records, farm_ids=None):
+    # {"minutes", "crop_stage"} per record, one predict call; records that
+    # can't be scored get minutes None and an "error".
+    if not records:
+        return []
+    model, stage_codes = load_model()
+    stages = resolve_stages(records, farm_ids)
+    matrix = to_feature_matrix(records, stages, stage_codes)
+    valid = ~np.isnan(matrix).any(axis=1)
+    results = [{"minutes": None, "crop_stage": stage} for stage in stages]
+    if valid.any():
+        minutes = np.maximum(np.asarray(model.predict(matrix[valid]), dtype=np.float64), 0.0)
+        for i, value in zip(np.flatnonzero(valid), np.round(minutes, 1)):
+            results[i]["minutes"] = float(value)
+    for i in np.flatnonzero(~valid):
+        if np.isnan(matrix[i, 0]):
+            results[i]["error"] = f"Unknown crop stage: {stages[i]}"
+        else:
+            results[i]["error"] = "Missing or non-numeric temperature, humidity or soil moisture"
+    return results
+
+
+def predict_minutes_batch(records):
+    # Minutes per record (None where the record can't be scored).
+    return [result["minutes"] for result in score(records)]
+
+
+def predict_minutes(record):
+    return predict_minutes_batch([record])[0]
+
+
+def plan(record):
+    # Single-farm result as used by the advisory pipeline.
+    return dict(score([record])[0], model_version=model_version())
+
+
+def score_fleet(farms):
+    # farms: {farm_id: state}. Returns {farm_id: {"minutes", "crop_stage"[, "error"]}}.
+    ids = list(farms)
+    return dict(zip(ids, score([farms[farm_id] for farm_id in ids], ids)))
+
+
+def main():
+    if sys.argv[1:] == ["--export-classes"]:
+        print(export_stage_classes(ENCODER_PATH))
+        return
+    payload = json.loads(sys.argv[1]) if len(sys.argv) > 1 else {}
+    if "farms" in payload:
+        print(json.dumps({"farms": score_fleet(payload["farms"])}))
+    else:
+        print(json.dumps(plan(payload)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,510 @@
+# loadgen.py
+# Fleet-scale load generator and end-to-end latency harness for the AI path.
+#
+# Seeded sensor traces for --farms virtual farms (diurnal temperature and
+# humidity, soil drying between irrigations, rain and wind events, a share of
+# faulty sensors) are replayed open-loop at --rate readings/s, or through a
+# --ramp of rates, into one of:
+#   stream   XADD to the sensor stream, as MQTT -> StreamCore.publish does.
+#            stream_worker.py consumers (started here, --procs) score them;
+#            a reading's latency is its result entry's id time minus its
+#            sensor entry's (both stream ids carry ms).
+#   worker   worker.py's JSON-lines protocol, the way AiService calls it:
+#            sensor_stats, then dryness / yield / health (and advisory with
+#            --advisory) concurrently.
+# Redis is redis_stub.py and the weather / LLM APIs are advisory/stub_server.py,
+# as in benchmark.py, unless --redis HOST:PORT points at a real server (the
+# stub is single-threaded Python and saturates early on its own).
+#
+# Every --interval-s it records offered and completed readings/s, latency
+# percentiles, error rate and queue depth: backlog (sent, not yet answered)
+# and, in stream mode, the consumer group's pending entries. A ramp step is
+# "saturated" when completions fall behind the offered rate or the backlog
+# keeps growing; the report names the highest sustained rate.
+#
+#   python loadgen.py --farms 5000 --ramp 50,100,200,400 --step-s 30
+#   python loadgen.py --target worker --rate 100 --duration 60 [--advisory --llm-delay 0.5]
+#
+# Results are written as JSON (default loadgen-<git sha>.json next to this
+# script, where .gitignore covers it, whatever the working directory).
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+from benchmark import git_revision, start_local_services, summarize  # noqa: E402
+
+STREAM = os.getenv("REDIS_STREAM_SENSORS", "stream:sensors")
+GROUP = os.getenv("AI_STREAM_GROUP", "group:analytics")
+RESULT_STREAM = os.getenv("AI_RESULT_STREAM", "stream:analytics")
+
+# A step is saturated below this share of the offered rate.
+SATURATION_RATIO = 0.9
+SEND_BATCH = 100
+
+
+class FleetTrace:
+    # Readings are produced a tick at a time: one per farm, --report-s of
+    # virtual time apart, farms in a fixed shuffled order.
+    def __init__(self, farms, seed, report_s=60, fault_rate=0.01, start=None):
+        self.rng = np.random.default_rng(seed)
+        rng = self.rng
+        self.farm_ids = [f"farm-{i:05d}" for i in range(farms)]
+        self.order = rng.permutation(farms)
+        self.report_s = report_s
+        self.clock = start or datetime.now(timezone.utc)
+        self.tick = 0
+
+        self.temp_mean = rng.uniform(16, 32, farms)
+        self.temp_swing = rng.uniform(3, 9, farms)
+        self.humidity_mean = rng.uniform(35, 80, farms)
+        self.moisture = rng.uniform(35, 80, farms)
+        self.drying = rng.uniform(0.5, 4.0, farms) / 86400  # %/s
+        self.irrigate_below = rng.uniform(18, 30, farms)
+        self.tds = rng.uniform(150, 800, farms)
+        self.wind_mean = rng.uniform(2, 15, farms)
+        self.rain_chance = rng.uniform(0.001, 0.02, farms)
+        # Faulty sensors: stuck at a value, or spiking out of range.
+        self.stuck = rng.random(farms) < fault_rate / 2
+        self.spiky = rng.random(farms) < fault_rate / 2
+        self.stuck_value = rng.uniform(20, 60, farms)
+
+    def next_tick(self):
+        rng, n = self.rng, len(self.farm_ids)
+        now = self.clock + timedelta(seconds=self.tick * self.report_s)
+        hour = now.hour + now.minute / 60
+        diurnal = np.sin((hour - 9) / 24 * 2 * np.pi)
+
+        rain = np.where(rng.random(n) < self.rain_chance, rng.gamma(2.0, 3.0, n), 0.0)
+        self.moisture -= self.drying * self.report_s * (1 + 0.5 * diurnal)
+        self.moisture += rain * 1.5
+        irrigated = self.moisture < self.irrigate_below
+        self.moisture[irrigated] += rng.uniform(25, 40, irrigated.sum())
+        np.clip(self.moisture, 2, 98, out=self.moisture)
+
+        moisture = self.moisture + rng.normal(0, 0.3, n)
+        moisture[self.stuck] = self.stuck_value[self.stuck]
+        spikes = self.spiky & (rng.random(n) < 0.2)
+        moisture[spikes] = rng.uniform(120, 200, spikes.sum())
+        temperature = self.temp_mean + self.temp_swing * diurnal + rng.normal(0, 0.4, n)
+        humidity = np.clip(self.humidity_mean - 10 * diurnal + 25 * (rain > 0) + rng.normal(0, 1.5, n), 5, 100)
+        wind = np.clip(self.wind_mean + rng.normal(0, 2, n), 0, None)
+        tds = self.tds + rng.normal(0, 5, n)
+
+        timestamp = now.isoformat().replace("+00:00", "Z")
+        self.tick += 1
+        columns = zip(
+            np.round(moisture, 1).tolist(), np.round(temperature, 1).tolist(), np.round(humidity, 1).tolist(),
+            np.round(tds).tolist(), np.round(rain, 1).tolist(), np.round(wind, 1).tolist(),
+        )
+        readings = [
+            {
+                "farm_id": farm_id, "moisture": m, "temperature": t, "humidity": h,
+                "tds": d, "rainfall": r, "wind_speed": w, "timestamp": timestamp,
+            }
+            for farm_id, (m, t, h, d, r, w) in zip(self.farm_ids, columns)
+        ]
+        return [readings[i] for i in self.order]
+
+    def __iter__(self):
+        while True:
+            yield from self.next_tick()
+
+
+class Window:
+    # Counters of the current interval, and of the whole run.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sent = self.completed = self.errors = 0
+        self.total_sent = self.total_completed = self.total_errors = 0
+        self.latencies = []
+
+    def on_sent(self, n=1):
+        with self.lock:
+            self.sent += n
+            self.total_sent += n
+
+    def on_done(self, latency_s, error=False):
+        with self.lock:
+            self.completed += 1
+            self.total_completed += 1
+            self.latencies.append(latency_s)
+            if error:
+                self.errors += 1
+                self.total_errors += 1
+
+    def take(self):
+        with self.lock:
+            snapshot = (self.sent, self.completed, self.errors, self.latencies)
+            self.sent = self.completed = self.errors = 0
+            self.latencies = []
+            return snapshot
+
+    def backlog(self):
+        with self.lock:
+            return self.total_sent - self.total_completed
+
+
+def _id_ms(entry_id):
+    return int((entry_id.decode() if isinstance(entry_id, bytes) else entry_id).split("-")[0])
+
+
+class StreamTarget:
+    # Readings go to the sensor stream; results are read back from the result stream.
+
+    def __init__(self, args, window):
+        import redis_pool
+
+        self.window = window
+        self.client = redis_pool.get_client()
+        self.reader = redis_pool.blocking_client(1.0)
+        self.consumers = None
+        # Only results of readings sent from here on count.
+        last = self.client.xrevrange(RESULT_STREAM, count=1)
+        self.cursor = last[0][0] if last else "0-0"
+        self.stopping = threading.Event()
+        self.collector = threading.Thread(target=self._collect, daemon=True)
+
+        if args.procs:
+            command = [sys.executable, os.path.join(BASE_DIR, "stream_worker.py"),
+                       "--procs", str(args.procs), "--batch", str(args.batch)]
+            if not args.advisory:
+                command.append("--no-advisory")
+            self.consumers = subprocess.Popen(command, stderr=subprocess.DEVNULL)
+        self._wait_ready(args.procs, args.ready_timeout_s)
+        self.collector.start()
+
+    def _wait_ready(self, procs, timeout_s):
+        # Consumers join the group on their first XREADGROUP, after loading the models.
+        deadline = time.time() + timeout_s
+        while time.time() < deadline:
+            if self.consumers is not None and self.consumers.poll() is not None:
+                raise RuntimeError("stream_worker.py exited during startup")
+            try:
+                groups = {g["name"]: g for g in self.client.xinfo_groups(STREAM)}
+            except Exception:
+                groups = {}
+            group = groups.get(GROUP)
+            if group and group["consumers"] >= max(procs, 1):
+                return
+            time.sleep(0.2)
+        raise RuntimeError(f"no {GROUP} consumers on {STREAM} after {timeout_s}s")
+
+    def send(self, readings):
+        pipe = self.client.pipeline(transaction=False)
+        for reading in readings:
+            pipe.xadd(STREAM, {"data": json.dumps(reading)})
+        pipe.execute()
+        self.window.on_sent(len(readings))
+
+    def _collect(self):
+        while not self.stopping.is_set():
+            try:
+                reply = self.reader.xread({RESULT_STREAM: self.cursor}, count=1000, block=500)
+            except Exception:
+                time.sleep(0.5)
+                continue
+            for _, entries in reply or []:
+                for entry_id, fields in entries:
+                    self.cursor = entry_id
+                    source = fields.get("source_id")
+                    if source:
+                        self.window.on_done((_id_ms(entry_id) - _id_ms(source)) / 1000, "error" in fields)
+
+    def pending(self):
+        try:
+            return self.client.xpending(STREAM, GROUP)["pending"]
+        except Exception:
+            return None
+
+    def close(self):
+        self.stopping.set()
+        if self.consumers is not None:
+            self.consumers.terminate()
+            try:
+                self.consumers.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.consumers.kill()
+        self.collector.join(timeout=2)
+
+
+class WorkerProcess:
+    # One worker.py; requests are pipelined and answered by a reader thread.
+    def __init__(self):
+        self.proc = subprocess.Popen(
+            [sys.executable, os.path.join(BASE_DIR, "worker.py")],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, bufsize=1,
+        )
+        self.lock = threading.Lock()
+        self.closed = False
+        self.next_id = 0
+        self.callbacks = {}
+        self.ready = threading.Event()
+        threading.Thread(target=self._read, daemon=True).start()
+        self.request("healthcheck", {}, lambda response: self.ready.set())
+
+    def request(self, op, data, callback):
+        with self.lock:
+            if self.closed:
+                return
+            self.next_id += 1
+            self.callbacks[self.next_id] = callback
+            self.proc.stdin.write(json.dumps({"id": self.next_id, "op": op, "data": data}) + "\n")
+            self.proc.stdin.flush()
+
+    def _read(self):
+        for line in self.proc.stdout:
+            response = json.loads(line)
+            with self.lock:
+                callback = self.callbacks.pop(response.get("id"), None)
+            if callback is not None:
+                callback(response)
+
+    def close(self):
+        # Whatever is still queued after the drain is abandoned.
+        with self.lock:
+            self.closed = True
+            self.proc.stdin.close()
+        try:
+            self.proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+
+
+class WorkerTarget:
+    # What AiService.processSensorData does per reading, against worker.py.
+
+    def __init__(self, args, window):
+        self.window = window
+        self.ops = ["dryness_prediction", "yield_prediction", "health_index"]
+        if args.advisory:
+            self.ops.append("advisory_adapter")
+        self.workers = [WorkerProcess() for _ in range(args.workers)]
+        for worker in self.workers:
+            if not worker.ready.wait(args.ready_timeout_s):
+                raise RuntimeError("worker.py did not start")
+        self.turn = 0
+
+    def _submit(self, reading):
+        worker = self.workers[self.turn % len(self.workers)]
+        self.turn += 1
+        started = time.perf_counter()
+        state = {"left": len(self.ops), "error": False}
+        lock = threading.Lock()
+
+        def model_done(response):
+            with lock:
+                state["left"] -= 1
+                state["error"] |= not response.get("ok")
+                finished = state["left"] == 0
+            if finished:
+                self.window.on_done(time.perf_counter() - started, state["error"])
+
+        def checked(response):
+            if not response.get("ok"):
+                self.window.on_done(time.perf_counter() - started, True)
+            elif not response["result"].get("ok", True):
+                # Rejected reading: AiService only scores health on the baseline.
+                state["left"] = 1
+                worker.request("health_index", reading, model_done)
+            else:
+                for op in self.ops:
+                    worker.request(op, reading, model_done)
+
+        worker.request("sensor_stats", reading, checked)
+
+    def send(self, readings):
+        for reading in readings:
+            self._submit(reading)
+        self.window.on_sent(len(readings))
+
+    def pending(self):
+        return None
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
+
+
+def replay(target, trace, window, steps, interval_s, drain_s):
+    # Open loop: reading i of a step is due at step start + i / rate, whether or
+    # not earlier ones have been answered. Completions count toward the step
+    # (and interval) in which they arrive.
+    readings = iter(trace)
+    intervals, step_rows = [], []
+    run_started = time.perf_counter()
+    next_report = run_started + interval_s
+    last_report = [run_started]
+
+    def report(now, rate, step):
+        sent, completed, errors, latencies = window.take()
+        elapsed, last_report[0] = now - last_report[0], now
+        row = {
+            "t_s": round(now - run_started, 2),
+            "offered_rps": rate,
+            "sent_rps": round(sent / elapsed, 2),
+            "completed_rps": round(completed / elapsed, 2),
+            "errors": errors,
+            "error_rate": round(errors / completed, 4) if completed else 0.0,
+            "backlog": window.backlog(),
+            "pending": target.pending(),
+        }
+        row.update({k: v for k, v in summarize(latencies).items() if k != "n"})
+        intervals.append(row)
+        print(json.dumps(row), file=sys.stderr, flush=True)
+        if step is not None:
+            step["latencies"].extend(latencies)
+            step["errors"] += errors
+
+    for rate, duration_s in steps:
+        step_started = time.perf_counter()
+        step = {"offered_rps": rate, "duration_s": duration_s, "sent": 0, "latencies": [], "errors": 0,
+                "backlog_start": window.backlog()}
+        while True:
+            now = time.perf_counter()
+            if now >= next_report:
+                report(now, rate, step)
+                next_report += interval_s
+            elapsed = now - step_started
+            if elapsed >= duration_s:
+                break
+            owed = int(elapsed * rate) + 1 - step["sent"]
+            if owed > 0:
+                batch = [next(readings) for _ in range(min(owed, SEND_BATCH))]
+                target.send(batch)
+                step["sent"] += len(batch)
+            else:
+                time.sleep(max(0.0, min(next_report, step_started + step["sent"] / rate) - now))
+        # Completions since the last report belong to this step too.
+        now = time.perf_counter()
+        if now - last_report[0] > 0.05:
+            report(now, rate, step)
+        next_report = now + interval_s
+        step["backlog_end"] = window.backlog()
+        step_rows.append(step)
+
+    # Let the backlog drain so the last step's stragglers are reported.
+    drain_until = time.perf_counter() + drain_s
+    while window.backlog() > 0 and time.perf_counter() < drain_until:
+        time.sleep(0.1)
+    report(time.perf_counter(), 0, None)
+    return intervals, step_rows
+
+
+def summarize_steps(step_rows):
+    summaries = []
+    for step in step_rows:
+        completed = len(step["latencies"])
+        completed_rps = completed / step["duration_s"]
+        backlog_growth = step["backlog_end"] - step["backlog_start"]
+        summaries.append({
+            "offered_rps": step["offered_rps"],
+            "sent": step["sent"],
+            "completed_rps": round(completed_rps, 2),
+            "error_rate": round(step["errors"] / completed, 4) if completed else 0.0,
+            **{k: v for k, v in summarize(step["latencies"]).items() if k != "n"},
+            "backlog_growth": backlog_growth,
+            "saturated": bool(
+                completed_rps < SATURATION_RATIO * step["offered_rps"]
+                or backlog_growth > max(step["offered_rps"], 0.05 * step["sent"])
+            ),
+        })
+    return summaries
+
+
+def print_table(steps):
+    header = f"{'offered':>8} {'done/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'backlog+':>9}  saturated"
+    print(header)
+    print("-" * len(header))
+    for step in steps:
+        print(
+            f"{step['offered_rps']:>8} {step['completed_rps']:>8.1f} {step.get('p50_ms', 0):>9.1f} "
+            f"{step.get('p95_ms', 0):>9.1f} {step.get('p99_ms', 0):>9.1f} {step['error_rate']:>7.2%} "
+            f"{step['backlog_growth']:>9}  {'yes' if step['saturated'] else ''}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fleet load generator and end-to-end latency harness")
+    parser.add_argument("--target", choices=("stream", "worker"), default="stream")
+    parser.add_argument("--farms", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=50, help="readings per second (without --ramp)")
+    parser.add_argument("--duration", type=float, default=30, help="seconds (without --ramp)")
+    parser.add_argument("--ramp", help="comma-separated rates, --step-s seconds each")
+    parser.add_argument("--step-s", type=float, default=30)
+    parser.add_argument("--interval-s", type=float, default=5, help="reporting interval")
+    parser.add_argument("--drain-s", type=float, default=10, help="wait this long for the backlog at the end")
+    parser.add_argument("--report-s", type=int, default=60, help="virtual seconds between a farm's readings")
+    parser.add_argument("--fault-rate", type=float, default=0.01, help="share of farms with faulty sensors")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--procs", type=int, default=2, help="stream_worker.py processes (0: use running ones)")
+    parser.add_argument("--batch", type=int, default=64, help="stream_worker.py --batch")
+    parser.add_argument("--workers", type=int, default=1, help="worker.py processes (worker target)")
+    parser.add_argument("--advisory", action="store_true", help="include the advisory (stub LLM) stage")
+    parser.add_argument("--llm-delay", type=float, default=0.0, help="stub LLM response delay (s)")
+    parser.add_argument("--weather-delay", type=float, default=0.0, help="stub forecast response delay (s)")
+    parser.add_argument("--redis", help="HOST:PORT of a real Redis instead of the in-process stub")
+    parser.add_argument("--ready-timeout-s", type=float, default=120)
+    parser.add_argument("--out", help="result file (default scripts/ai/loadgen-<git sha>.json)")
+    args = parser.parse_args()
+
+    if args.redis:
+        host, _, port = args.redis.partition(":")
+        os.environ.update({"REDIS_HOST": host, "REDIS_PORT": port or "6379"})
+    start_local_services(args.weather_delay, args.llm_delay, with_redis=not args.redis)
+
+    if args.ramp:
+        steps = [(float(rate), args.step_s) for rate in args.ramp.split(",")]
+    else:
+        steps = [(args.rate, args.duration)]
+
+    window = Window()
+    trace = FleetTrace(args.farms, args.seed, args.report_s, args.fault_rate)
+    started = time.perf_counter()
+    target = StreamTarget(args, window) if args.target == "stream" else WorkerTarget(args, window)
+    ready_s = time.perf_counter() - started
+    try:
+        intervals, step_rows = replay(target, trace, window, steps, args.interval_s, args.drain_s)
+    finally:
+        target.close()
+
+    summaries = summarize_steps(step_rows)
+    sustained = [s["offered_rps"] for s in summaries if not s["saturated"]]
+    saturated = [s["offered_rps"] for s in summaries if s["saturated"]]
+    sha, dirty = git_revision()
+    results = {
+        "meta": {
+            "git_sha": sha,
+            "dirty": dirty,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "cpus": os.cpu_count(),
+            "ready_s": round(ready_s, 2),
+            "args": vars(args),
+        },
+        "steps": summaries,
+        "max_sustained_rps": max(sustained) if sustained else None,
+        "saturated_at_rps": min(saturated) if saturated else None,
+        "total": {"sent": window.total_sent, "completed": window.total_completed, "errors": window.total_errors},
+        "intervals": intervals,
+    }
+
+    print_table(summaries)
+    print(f"max sustained: {results['max_sustained_rps']} readings/s, saturated at: {results['saturated_at_rps']}")
+    out = args.out or os.path.join(BASE_DIR, f"loadgen-{sha}.json")
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
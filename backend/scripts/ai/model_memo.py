@@ -0,0 +1,216 @@
+# model_memo.py
+# Memoization of the deterministic numeric models (dryness, health index,
+# yield) on quantized inputs.
+#
+# Each model's inputs are rounded to MODEL_MEMO_PRECISION steps (sensor
+# precision), and the result is cached under (model, model version, rounded
+# inputs). The model always runs on the rounded inputs, so a cached result is
+# exactly what a fresh call with the same key would return.
+#
+# - In-process LRU of MODEL_MEMO_SIZE entries; a shared Redis tier
+#   (memo:<model>:<version>:<inputs>, MODEL_MEMO_TTL) for the models listed in
+#   MODEL_MEMO_REDIS. dryness and health are a few arithmetic operations, so
+#   by default only yield (a 500-tree ensemble) is worth a round trip.
+# - The version is a digest of the model's artifacts (yeild/*.pkl) or, for the
+#   formula models, of their source file. set_version() drops the local
+#   entries of the old version; old Redis entries are never read again and
+#   expire. worker.py reloads the yield model when its artifacts change.
+# - stats() reports hits (local / Redis) and misses per model.
+#
+# MODEL_MEMO=false turns it off (every call computes).
+
+import os
+import threading
+from collections import OrderedDict
+
+import redis
+
+import redis_pool
+from tree_engine import file_digest
+
+MODEL_MEMO = os.getenv("MODEL_MEMO", "true").lower() in ("true", "1", "yes")
+MODEL_MEMO_SIZE = int(os.getenv("MODEL_MEMO_SIZE", "20000"))
+MODEL_MEMO_TTL = int(os.getenv("MODEL_MEMO_TTL", "86400"))
+MODEL_MEMO_REDIS = frozenset(filter(None, os.getenv("MODEL_MEMO_REDIS", "yield_prediction").split(",")))
+MODEL_MEMO_PRECISION = {
+    field: float(step)
+    for field, step in (
+        item.split("=") for item in os.getenv(
+            "MODEL_MEMO_PRECISION", "moisture=0.1,temperature=0.1,humidity=0.1,rainfall=1,wind_speed=0.1"
+        ).split(",")
+    )
+}
+
+REDIS_PREFIX = "memo:"
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Model -> the input fields it reads, with the defaults it applies.
+MODEL_INPUTS = {
+    "dryness_prediction": {"moisture": 50.0},
+    "health_index": {"moisture": 50.0, "temperature": 25.0, "humidity": 50.0},
+    "yield_prediction": {
+        "rainfall": 100.0, "temperature": 25.0, "moisture": 50.0, "humidity": 50.0, "wind_speed": 10.0,
+    },
+}
+
+
+def source_version(module_file):
+    return file_digest(module_file)[:16]
+
+
+class ModelMemo:
+    def __init__(self, max_entries=MODEL_MEMO_SIZE, ttl=MODEL_MEMO_TTL, redis_models=MODEL_MEMO_REDIS,
+                 enabled=MODEL_MEMO):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.redis_models = redis_models
+        self.enabled = enabled
+        self._versions = {}
+        self._entries = OrderedDict()  # (model, version, rounded inputs) -> result
+        self._lock = threading.Lock()
+        self._counts = {}  # model -> [hits, redis_hits, misses]
+
+    def version(self, model):
+        return self._versions.get(model)
+
+    def set_version(self, model, version):
+        with self._lock:
+            if self._versions.get(model) == version:
+                return
+            self._versions[model] = version
+            for key in [key for key in self._entries if key[0] == model]:
+                del self._entries[key]
+
+    def quantize(self, model, record):
+        # -> (key, record with the rounded inputs the model should run on)
+        steps, rounded = [], dict(record)
+        for field, default in MODEL_INPUTS[model].items():
+            value = record.get(field)
+            if value is None:
+                value = default
+            step = MODEL_MEMO_PRECISION.get(field)
+            if step:
+                q = round(float(value) / step)
+                steps.append(q)
+                value = round(q * step, 10)
+            else:
+                steps.append(float(value))
+            rounded[field] = value
+        return (model, self._versions.get(model), tuple(steps)), rounded
+
+    def _count(self, model, slot, n=1):
+        counts = self._counts.get(model)
+        if counts is None:
+            counts = self._counts[model] = [0, 0, 0]
+        counts[slot] += n
+
+    def _redis_client(self, model):
+        if model not in self.redis_models or not redis_pool.available():
+            return None
+        return redis_pool.get_client(decode_responses=False)
+
+    def _redis_key(self, key):
+        model, version, steps = key
+        return f"{REDIS_PREFIX}{model}:{version}:" + ",".join(map(str, steps))
+
+    def get_or_compute(self, model, record, compute):
+        # compute(rounded_record) -> JSON-serialisable result
+        return self.get_or_compute_batch(model, [record], lambda rows: [compute(rows[0])])[0]
+
+    def get_or_compute_batch(self, model, records, compute_batch):
+        # compute_batch(rounded_records) -> results; only called for the misses,
+        # and at most once.
+        if not self.enabled or self._versions.get(model) is None:
+            return list(compute_batch(records))
+        keyed = [self.quantize(model, record) for record in records]
+        results = [None] * len(records)
+        missing = []
+        with self._lock:
+            for i, (key, _) in enumerate(keyed):
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    results[i] = self._entries[key]
+                else:
+                    missing.append(i)
+            self._count(model, 0, len(records) - len(missing))
+        if not missing:
+            return results
+
+        client = self._redis_client(model)
+        if client is not None:
+            try:
+                raws = client.mget([self._redis_key(keyed[i][0]) for i in missing])
+                found = [(i, redis_pool.decode(raw)) for i, raw in zip(missing, raws) if raw is not None]
+                for i, value in found:
+                    results[i] = value
+                if found:
+                    with self._lock:
+                        for i, value in found:
+                            self._put(keyed[i][0], value)
+                        self._count(model, 1, len(found))
+                    missing = [i for i in missing if results[i] is None]
+            except redis.RedisError:
+                redis_pool.mark_down()
+                client = None
+        if not missing:
+            return results
+
+        # Identical inputs within one batch are computed once.
+        unique = list(OrderedDict((keyed[i][0], i) for i in missing).items())
+        computed = compute_batch([keyed[i][1] for _, i in unique])
+        by_key = {key: value for (key, _), value in zip(unique, computed)}
+        for i in missing:
+            results[i] = by_key[keyed[i][0]]
+        with self._lock:
+            for key, value in by_key.items():
+                self._put(key, value)
+            self._count(model, 2, len(missing))
+        if client is not None:
+            try:
+                codec = redis_pool.get_codec()
+                pipe = client.pipeline(transaction=False)
+                for key, value in by_key.items():
+                    pipe.set(self._redis_key(key), codec.dumps(value), ex=self.ttl)
+                pipe.execute()
+            except redis.RedisError:
+                redis_pool.mark_down()
+        return results
+
+    def _put(self, key, value):
+        # Caller holds the lock.
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            models = {}
+            for model, (hits, redis_hits, misses) in self._counts.items():
+                total = hits + redis_hits + misses
+                models[model] = {
+                    "version": self._versions.get(model),
+                    "hits": hits,
+                    "redis_hits": redis_hits,
+                    "misses": misses,
+                    "hit_rate": round((hits + redis_hits) / total, 4) if total else 0.0,
+                }
+            return {"enabled": self.enabled, "entries": len(self._entries), "models": models}
+
+
+_memo = None
+_memo_lock = threading.Lock()
+
+
+def get_memo():
+    # Formula models are versioned by their source; callers set the yield
+    # model's version when they load it (model_service.model_version()).
+    global _memo
+    if _memo is None:
+        with _memo_lock:
+            if _memo is None:
+                memo = ModelMemo()
+                for model in ("dryness_prediction", "health_index"):
+                    memo.set_version(model, source_version(os.path.join(BASE_DIR, model + ".py")))
+                _memo = memo
+    return _memo
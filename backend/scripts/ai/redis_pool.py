@@ -0,0 +1,162 @@
+# redis_pool.py
+# Shared Redis access for the AI scripts.
+#
+# - One connection pool per process (REDIS_HOST / REDIS_PORT / REDIS_DB), so
+#   scripts and long-lived workers reuse sockets instead of reconnecting.
+# - Bulk helpers that read or write many farms' values in one pipelined round trip.
+# - Value codecs for writes: JSON (default, what the Node backend writes) or
+#   msgpack (REDIS_CODEC=msgpack, needs the msgpack package). Reads detect the
+#   encoding per value, so keys don't have to be flushed when the codec changes.
+# - Fail fast: no retries, short timeouts, and after an error callers can skip
+#   Redis for REDIS_RETRY_S (see available() / mark_down()).
+
+import json
+import os
+import threading
+import time
+
+import redis
+from redis.backoff import NoBackoff
+from redis.retry import Retry
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+REDIS_DB = int(os.getenv("REDIS_DB", "0"))
+REDIS_POOL_SIZE = int(os.getenv("REDIS_POOL_SIZE", "32"))
+REDIS_TIMEOUT_S = float(os.getenv("REDIS_TIMEOUT_S", "1.0"))
+REDIS_CODEC = os.getenv("REDIS_CODEC", "json")
+REDIS_RETRY_S = 30
+
+# Bulk writes are split into pipelines of this many keys.
+BULK_CHUNK = 1000
+
+_pools = {}
+_pool_lock = threading.Lock()
+_down_until = 0.0
+
+
+def get_pool(decode_responses=True):
+    pool = _pools.get(decode_responses)
+    if pool is None:
+        with _pool_lock:
+            pool = _pools.get(decode_responses)
+            if pool is None:
+                pool = _pools[decode_responses] = redis.BlockingConnectionPool(
+                    host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB,
+                    max_connections=REDIS_POOL_SIZE, timeout=REDIS_TIMEOUT_S,
+                    socket_timeout=REDIS_TIMEOUT_S, socket_connect_timeout=REDIS_TIMEOUT_S,
+                    retry=Retry(NoBackoff(), 0), decode_responses=decode_responses,
+                )
+    return pool
+
+
+def get_client(decode_responses=True):
+    # Cheap: clients share the process-wide pool. Binary clients
+    # (decode_responses=False) are what the codec helpers use.
+    return redis.Redis(connection_pool=get_pool(decode_responses))
+
+
+def blocking_client(block_s, decode_responses=True):
+    # Own connection for blocking reads (XREADGROUP BLOCK ...): it must not
+    # hold a pooled socket, and its read timeout has to outlast the block.
+    return redis.Redis(
+        host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=decode_responses,
+        socket_timeout=block_s + REDIS_TIMEOUT_S, socket_connect_timeout=REDIS_TIMEOUT_S,
+        retry=Retry(NoBackoff(), 0),
+    )
+
+
+def available():
+    return time.time() >= _down_until
+
+
+def mark_down():
+    global _down_until
+    _down_until = time.time() + REDIS_RETRY_S
+
+
+# msgpack values start with 0xc1, a byte msgpack itself never emits and that
+# can't start JSON text, so every reader can tell the two apart.
+MSGPACK_TAG = b"\xc1"
+
+
+class JsonCodec:
+    name = "json"
+
+    def dumps(self, value):
+        return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+class MsgpackCodec:
+    name = "msgpack"
+
+    def dumps(self, value):
+        return MSGPACK_TAG + msgpack.packb(value, use_bin_type=True)
+
+
+def get_codec(name=None):
+    name = name or REDIS_CODEC
+    if name == "msgpack":
+        if msgpack is None:
+            raise RuntimeError("REDIS_CODEC=msgpack needs the msgpack package")
+        return MsgpackCodec()
+    if name == "json":
+        return JsonCodec()
+    raise ValueError(f"Unknown Redis codec: {name}")
+
+
+def decode(raw):
+    if raw is None:
+        return None
+    if isinstance(raw, bytes) and raw[:1] == MSGPACK_TAG:
+        if msgpack is None:
+            raise RuntimeError("msgpack value found but the msgpack package is not installed")
+        return msgpack.unpackb(raw[1:], raw=False)
+    return json.loads(raw)
+
+
+def get_value(key, client=None):
+    client = client or get_client(decode_responses=False)
+    return decode(client.get(key))
+
+
+def set_value(key, value, ttl=None, codec=None, client=None):
+    client = client or get_client(decode_responses=False)
+    client.set(key, (codec or get_codec()).dumps(value), ex=ttl or None)
+
+
+def get_many(keys, client=None):
+    # One MGET; None for missing keys.
+    if not keys:
+        return []
+    client = client or get_client(decode_responses=False)
+    return [decode(raw) for raw in client.mget(keys)]
+
+
+def set_many(values, ttl=None, codec=None, client=None):
+    # values: {key: value}. One pipelined round trip per BULK_CHUNK keys.
+    if not values:
+        return
+    codec = codec or get_codec()
+    client = client or get_client(decode_responses=False)
+    items = list(values.items())
+    for start in range(0, len(items), BULK_CHUNK):
+        pipe = client.pipeline(transaction=False)
+        for key, value in items[start:start + BULK_CHUNK]:
+            pipe.set(key, codec.dumps(value), ex=ttl or None)
+        pipe.execute()
+
+
+def get_farms(prefix, farm_ids, client=None):
+    # {farm_id: value} for the farms that have a value under prefix + farm_id.
+    values = get_many([prefix + farm_id for farm_id in farm_ids], client)
+    return {farm_id: value for farm_id, value in zip(farm_ids, values) if value is not None}
+
+
+def set_farms(prefix, values_by_farm, ttl=None, codec=None, client=None):
+    set_many({prefix + farm_id: value for farm_id, value in values_by_farm.items()}, ttl, codec, client)
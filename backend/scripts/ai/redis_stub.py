@@ -0,0 +1,662 @@
+# redis_stub.py
+# Minimal in-memory Redis (RESP2 / RESP3) for benchmarks and local runs without a Redis
+# server. Covers the string / hash / key commands the AI scripts use, and the
+# stream and consumer-group commands of StreamCore and stream_worker.py
+# (XADD, XREADGROUP with BLOCK, XACK, XPENDING, XAUTOCLAIM, ...), and
+# WATCH / MULTI / EXEC for redis-py's client.transaction(); anything else
+# answers with an error. WATCH compares a key's value at EXEC with the one it
+# saw, so writing back an equal value doesn't abort the transaction.
+#
+#   python redis_stub.py [--port 6380]
+#   REDIS_HOST=127.0.0.1 REDIS_PORT=6380 python yeild/main.py FARM_ID
+
+import argparse
+import json
+import socket
+import socketserver
+import threading
+import time
+
+
+class RedisState:
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.commands = 0
+        self.lock = threading.Lock()
+        # Notified on XADD; blocked XREADGROUPs wait on it.
+        self.changed = threading.Condition(self.lock)
+
+    def _alive(self, key):
+        expires_at = self.expires.get(key)
+        if expires_at is not None and expires_at <= time.time():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def get(self, key):
+        return self.data[key] if self._alive(key) else None
+
+    def set(self, key, value, ttl=None):
+        self.data[key] = value
+        if ttl is None:
+            self.expires.pop(key, None)
+        else:
+            self.expires[key] = time.time() + ttl
+
+    def delete(self, key):
+        self.expires.pop(key, None)
+        return self.data.pop(key, None) is not None
+
+
+class WrongType(Exception):
+    pass
+
+
+class Blocked:
+    # Returned by a command that should wait (XREAD / XREADGROUP ... BLOCK) and
+    # be retried; retry(state) replaces the original call when given.
+    def __init__(self, timeout_s, retry=None):
+        self.timeout_s = timeout_s
+        self.retry = retry
+
+
+class PerKey(dict):
+    # Per-stream replies (XREADGROUP): a map in RESP3, [[key, value], ...] in RESP2.
+    pass
+
+
+class Stream:
+    def __init__(self):
+        self.entries = []  # [(id tuple, fields)], ids increasing
+        self.last_id = (0, 0)
+        self.groups = {}  # name -> StreamGroup
+
+
+class StreamGroup:
+    def __init__(self, last_id):
+        self.last_id = last_id
+        self.entries_read = 0
+        self.pending = {}  # id tuple -> [consumer, delivered at, deliveries]
+        self.consumers = set()
+
+
+def _int(value):
+    return int(value.decode() if isinstance(value, bytes) else value)
+
+
+def _hash(state, key, create=False):
+    value = state.get(key)
+    if value is None:
+        if not create:
+            return {}
+        value = {}
+        state.set(key, value)
+    if not isinstance(value, dict):
+        raise WrongType()
+    return value
+
+
+def cmd_set(state, key, value, *opts):
+    opts = [o.upper() for o in opts]
+    ttl = None
+    for flag, scale in ((b"EX", 1), (b"PX", 0.001)):
+        if flag in opts:
+            ttl = _int(opts[opts.index(flag) + 1]) * scale
+    if b"NX" in opts and state.get(key) is not None:
+        return None
+    if b"XX" in opts and state.get(key) is None:
+        return None
+    state.set(key, value, ttl)
+    return "OK"
+
+
+def cmd_incrby(state, key, amount=b"1"):
+    value = _int(state.get(key) or b"0") + _int(amount)
+    ttl = state.expires.get(key)
+    state.set(key, str(value).encode())
+    if ttl is not None:
+        state.expires[key] = ttl
+    return value
+
+
+def cmd_expire(state, key, seconds):
+    if state.get(key) is None:
+        return 0
+    state.expires[key] = time.time() + _int(seconds)
+    return 1
+
+
+def cmd_ttl(state, key):
+    if state.get(key) is None:
+        return -2
+    expires_at = state.expires.get(key)
+    return -1 if expires_at is None else max(0, round(expires_at - time.time()))
+
+
+def cmd_hset(state, key, *pairs):
+    h = _hash(state, key, create=True)
+    added = sum(1 for field in pairs[0::2] if field not in h)
+    h.update(zip(pairs[0::2], pairs[1::2]))
+    return added
+
+
+def cmd_hincrby(state, key, field, amount):
+    h = _hash(state, key, create=True)
+    h[field] = str(_int(h.get(field, b"0")) + _int(amount)).encode()
+    return _int(h[field])
+
+
+def cmd_hincrbyfloat(state, key, field, amount):
+    h = _hash(state, key, create=True)
+    h[field] = repr(float(h.get(field, b"0")) + float(amount)).encode()
+    return h[field]
+
+
+def cmd_hgetall(state, key):
+    return dict(_hash(state, key))
+
+
+def cmd_hdel(state, key, *fields):
+    h = _hash(state, key)
+    return sum(1 for field in fields if h.pop(field, None) is not None)
+
+
+def _stream(state, key, create=False):
+    value = state.get(key)
+    if value is None:
+        if not create:
+            return None
+        value = Stream()
+        state.set(key, value)
+    if not isinstance(value, Stream):
+        raise WrongType()
+    return value
+
+
+def _parse_id(raw, default_seq=0):
+    raw = raw.decode() if isinstance(raw, bytes) else raw
+    if raw == "-":
+        return (0, 0)
+    if raw == "+":
+        return (2 ** 64, 0)
+    ms, _, seq = raw.partition("-")
+    return (int(ms), int(seq) if seq else default_seq)
+
+
+def _format_id(entry_id):
+    return b"%d-%d" % entry_id
+
+
+def _entry(stream, entry_id):
+    i = _find(stream, entry_id)
+    if i < len(stream.entries) and stream.entries[i][0] == entry_id:
+        return [_format_id(entry_id), stream.entries[i][1]]
+    return None
+
+
+def _find(stream, entry_id):
+    # Index of the first entry with id >= entry_id.
+    lo, hi = 0, len(stream.entries)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if stream.entries[mid][0] < entry_id:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def _snapshot(value):
+    # What WATCH compares at EXEC; hashes are mutated in place, so copy them.
+    return dict(value) if isinstance(value, dict) else value
+
+
+def _options(args, flags):
+    # Leading [FLAG value] / [FLAG] options, up to the first unknown word.
+    found, i = {}, 0
+    while i < len(args) and args[i].upper() in flags:
+        flag = args[i].upper()
+        if flags[flag]:
+            found[flag] = args[i + 1]
+            i += 2
+        else:
+            found[flag] = True
+            i += 1
+    return found, args[i:]
+
+
+def cmd_xadd(state, key, *args):
+    opts, rest = _options(list(args), {b"NOMKSTREAM": False, b"MAXLEN": True, b"MINID": True})
+    maxlen = opts.get(b"MAXLEN")
+    if maxlen in (b"~", b"="):
+        maxlen, rest = rest[0], rest[1:]
+    stream = _stream(state, key, create=not opts.get(b"NOMKSTREAM"))
+    if stream is None:
+        return None
+    raw_id, fields = rest[0], list(rest[1:])
+    if not fields or len(fields) % 2:
+        raise ValueError()
+    if raw_id == b"*":
+        now = int(time.time() * 1000)
+        entry_id = (now, 0) if now > stream.last_id[0] else (stream.last_id[0], stream.last_id[1] + 1)
+    else:
+        entry_id = _parse_id(raw_id)
+        if entry_id <= stream.last_id:
+            return Exception("ERR The ID specified in XADD is equal or smaller than the target stream top item")
+    stream.entries.append((entry_id, fields))
+    stream.last_id = entry_id
+    if maxlen is not None and len(stream.entries) > _int(maxlen):
+        del stream.entries[:len(stream.entries) - _int(maxlen)]
+    state.changed.notify_all()
+    return _format_id(entry_id)
+
+
+def cmd_xlen(state, key):
+    stream = _stream(state, key)
+    return len(stream.entries) if stream else 0
+
+
+def cmd_xrange(state, key, low, high, *args, reverse=False):
+    stream = _stream(state, key)
+    if stream is None:
+        return []
+    opts, _ = _options(list(args), {b"COUNT": True})
+    low, high = _parse_id(low), _parse_id(high, 2 ** 64)
+    entries = [[_format_id(i), f] for i, f in stream.entries if low <= i <= high]
+    if reverse:
+        entries.reverse()
+    return entries[:_int(opts[b"COUNT"])] if b"COUNT" in opts else entries
+
+
+def cmd_xread(state, *args):
+    opts, rest = _options(list(args), {b"COUNT": True, b"BLOCK": True})
+    if not rest or rest[0].upper() != b"STREAMS" or len(rest) != 3:
+        raise ValueError()  # one stream at a time is all the callers use
+    key, raw_id = rest[1], rest[2]
+    stream = _stream(state, key)
+    count = _int(opts.get(b"COUNT", b"0")) or None
+    # "$" means entries added after the call; fixed on the first attempt so a
+    # blocked retry still sees them.
+    if raw_id == b"$":
+        after = stream.last_id if stream else (0, 0)
+    else:
+        after = _parse_id(raw_id)
+    start = _find(stream, (after[0], after[1] + 1)) if stream else 0
+    new = stream.entries[start:start + count if count else None] if stream else []
+    if not new:
+        block = opts.get(b"BLOCK")
+        if block is None:
+            return None
+        if raw_id == b"$":
+            args = list(args)
+            args[-1] = _format_id(after)
+        return Blocked(_int(block) / 1000, lambda s: cmd_xread(s, *args))
+    return PerKey({key: [[_format_id(entry_id), fields] for entry_id, fields in new]})
+
+
+def cmd_xgroup(state, sub, key, *args):
+    sub = sub.upper()
+    if sub == b"CREATE":
+        group, raw_id = args[0], args[1]
+        stream = _stream(state, key, create=b"MKSTREAM" in [a.upper() for a in args[2:]])
+        if stream is None:
+            return Exception("ERR The XGROUP subcommand requires the key to exist")
+        if group in stream.groups:
+            return Exception("BUSYGROUP Consumer Group name already exists")
+        stream.groups[group] = StreamGroup(stream.last_id if raw_id == b"$" else _parse_id(raw_id))
+        return "OK"
+    if sub == b"DESTROY":
+        stream = _stream(state, key)
+        return int(bool(stream and stream.groups.pop(args[0], None)))
+    raise ValueError()
+
+
+def _group(state, key, group):
+    stream = _stream(state, key)
+    if stream is None or group not in stream.groups:
+        raise KeyError(group)
+    return stream, stream.groups[group]
+
+
+def cmd_xreadgroup(state, *args):
+    if args[0].upper() != b"GROUP":
+        raise ValueError()
+    group_name, consumer = args[1], args[2]
+    opts, rest = _options(list(args[3:]), {b"COUNT": True, b"BLOCK": True, b"NOACK": False})
+    if not rest or rest[0].upper() != b"STREAMS" or len(rest) != 3:
+        raise ValueError()  # one stream at a time is all the callers use
+    key, raw_id = rest[1], rest[2]
+    count = _int(opts.get(b"COUNT", b"0")) or None
+    try:
+        stream, group = _group(state, key, group_name)
+    except KeyError:
+        return Exception("NOGROUP No such key or consumer group")
+    group.consumers.add(consumer)
+    now = time.time()
+
+    if raw_id != b">":
+        # This consumer's pending entries after the given id.
+        after = _parse_id(raw_id)
+        ids = sorted(i for i, p in group.pending.items() if p[0] == consumer and i > after)[:count]
+        entries = []
+        for entry_id in ids:
+            group.pending[entry_id][1] = now
+            entries.append(_entry(stream, entry_id) or [_format_id(entry_id), None])
+        return PerKey({key: entries})
+
+    start = _find(stream, (group.last_id[0], group.last_id[1] + 1))
+    new = stream.entries[start:start + count if count else None]
+    if not new:
+        block = opts.get(b"BLOCK")
+        return Blocked(_int(block) / 1000) if block is not None else None
+    for entry_id, _ in new:
+        if not opts.get(b"NOACK"):
+            group.pending[entry_id] = [consumer, now, 1]
+    group.last_id = new[-1][0]
+    group.entries_read += len(new)
+    return PerKey({key: [[_format_id(entry_id), fields] for entry_id, fields in new]})
+
+
+def cmd_xack(state, key, group_name, *ids):
+    try:
+        _, group = _group(state, key, group_name)
+    except KeyError:
+        return 0
+    return sum(group.pending.pop(_parse_id(i), None) is not None for i in ids)
+
+
+def cmd_xpending(state, key, group_name, *args):
+    try:
+        _, group = _group(state, key, group_name)
+    except KeyError:
+        return Exception("NOGROUP No such key or consumer group")
+    if not args:
+        if not group.pending:
+            return [0, None, None, None]
+        per_consumer = {}
+        for consumer, _, _ in group.pending.values():
+            per_consumer[consumer] = per_consumer.get(consumer, 0) + 1
+        ids = sorted(group.pending)
+        return [
+            len(ids), _format_id(ids[0]), _format_id(ids[-1]),
+            [[c, str(n).encode()] for c, n in per_consumer.items()],
+        ]
+    opts, rest = _options(list(args), {b"IDLE": True})
+    low, high, count = _parse_id(rest[0]), _parse_id(rest[1], 2 ** 64), _int(rest[2])
+    consumer = rest[3] if len(rest) > 3 else None
+    min_idle_ms = _int(opts.get(b"IDLE", b"0"))
+    now = time.time()
+    result = []
+    for entry_id in sorted(group.pending):
+        owner, delivered_at, deliveries = group.pending[entry_id]
+        idle_ms = int((now - delivered_at) * 1000)
+        if low <= entry_id <= high and (consumer is None or owner == consumer) and idle_ms >= min_idle_ms:
+            result.append([_format_id(entry_id), owner, idle_ms, deliveries])
+            if len(result) >= count:
+                break
+    return result
+
+
+def cmd_xautoclaim(state, key, group_name, consumer, min_idle_ms, start, *args):
+    try:
+        stream, group = _group(state, key, group_name)
+    except KeyError:
+        return Exception("NOGROUP No such key or consumer group")
+    opts, _ = _options(list(args), {b"COUNT": True, b"JUSTID": False})
+    count = _int(opts.get(b"COUNT", b"100"))
+    now, start_id = time.time(), _parse_id(start)
+    claimed, deleted, cursor = [], [], (0, 0)
+    ids = sorted(i for i in group.pending if i >= start_id)
+    for entry_id in ids:
+        if len(claimed) + len(deleted) >= count:
+            cursor = entry_id
+            break
+        pending = group.pending[entry_id]
+        if (now - pending[1]) * 1000 < _int(min_idle_ms):
+            continue
+        entry = _entry(stream, entry_id)
+        if entry is None:
+            # Trimmed away: dropped from the pending list, as Redis 7 does.
+            del group.pending[entry_id]
+            deleted.append(_format_id(entry_id))
+            continue
+        group.pending[entry_id] = [consumer, now, pending[2] + (not opts.get(b"JUSTID"))]
+        claimed.append(entry[0] if opts.get(b"JUSTID") else entry)
+    group.consumers.add(consumer)
+    return [_format_id(cursor), claimed, deleted]
+
+
+def cmd_xinfo(state, sub, key):
+    if sub.upper() != b"GROUPS":
+        raise ValueError()
+    stream = _stream(state, key)
+    if stream is None:
+        return Exception("ERR no such key")
+    return [
+        {
+            b"name": name, b"consumers": len(group.consumers), b"pending": len(group.pending),
+            b"last-delivered-id": _format_id(group.last_id), b"entries-read": group.entries_read,
+            b"lag": len(stream.entries) - _find(stream, (group.last_id[0], group.last_id[1] + 1)),
+        }
+        for name, group in stream.groups.items()
+    ]
+
+
+COMMANDS = {
+    # HELLO is answered by the handler, which tracks the protocol per connection.
+    b"PING": lambda s, msg=None: msg if msg is not None else "PONG",
+    b"ECHO": lambda s, msg: msg,
+    b"SELECT": lambda s, db: "OK",
+    b"CLIENT": lambda s, *args: "OK",
+    b"GET": lambda s, key: s.get(key),
+    b"SET": cmd_set,
+    b"MGET": lambda s, *keys: [s.get(k) for k in keys],
+    b"MSET": lambda s, *pairs: [s.set(k, v) for k, v in zip(pairs[0::2], pairs[1::2])] and "OK",
+    b"DEL": lambda s, *keys: sum(s.delete(k) for k in keys),
+    b"EXISTS": lambda s, *keys: sum(s.get(k) is not None for k in keys),
+    b"EXPIRE": cmd_expire,
+    b"TTL": cmd_ttl,
+    b"INCR": lambda s, key: cmd_incrby(s, key),
+    b"INCRBY": cmd_incrby,
+    b"HSET": cmd_hset,
+    b"HGET": lambda s, key, field: _hash(s, key).get(field),
+    b"HMGET": lambda s, key, *fields: [_hash(s, key).get(f) for f in fields],
+    b"HGETALL": cmd_hgetall,
+    b"HDEL": cmd_hdel,
+    b"HINCRBY": cmd_hincrby,
+    b"HINCRBYFLOAT": cmd_hincrbyfloat,
+    b"XADD": cmd_xadd,
+    b"XLEN": cmd_xlen,
+    b"XRANGE": cmd_xrange,
+    b"XREVRANGE": lambda s, key, high, low, *args: cmd_xrange(s, key, low, high, *args, reverse=True),
+    b"XREAD": cmd_xread,
+    b"XGROUP": cmd_xgroup,
+    b"XREADGROUP": cmd_xreadgroup,
+    b"XACK": cmd_xack,
+    b"XPENDING": cmd_xpending,
+    b"XAUTOCLAIM": cmd_xautoclaim,
+    b"XINFO": cmd_xinfo,
+    b"DBSIZE": lambda s: sum(s.get(k) is not None for k in list(s.data)),
+    b"FLUSHDB": lambda s, *args: s.data.clear() or s.expires.clear() or "OK",
+    b"FLUSHALL": lambda s, *args: s.data.clear() or s.expires.clear() or "OK",
+}
+
+
+# Answered per connection by RedisHandler._transaction.
+TRANSACTION_COMMANDS = {b"WATCH", b"UNWATCH", b"MULTI", b"EXEC", b"DISCARD"}
+
+
+def encode(value, resp3=False):
+    if value is None:
+        return b"_\r\n" if resp3 else b"$-1\r\n"
+    if isinstance(value, Exception):
+        return b"-" + str(value).encode() + b"\r\n"
+    if isinstance(value, str):
+        return b"+" + value.encode() + b"\r\n"
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, PerKey) and not resp3:
+        value = [list(pair) for pair in value.items()]
+    if isinstance(value, dict):
+        if resp3:
+            return b"%%%d\r\n" % len(value) + b"".join(
+                encode(k, resp3) + encode(v, resp3) for k, v in value.items()
+            )
+        value = [item for pair in value.items() for item in pair]
+    if isinstance(value, (list, tuple)):
+        return b"*%d\r\n" % len(value) + b"".join(encode(v, resp3) for v in value)
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+class RedisHandler(socketserver.StreamRequestHandler):
+    state = None
+
+    def setup(self):
+        super().setup()
+        self.resp3 = False
+        # MULTI state of this connection: queued (handler, args), None outside MULTI.
+        self.queued = None
+        self.aborted = False
+        self.watched = {}  # key -> snapshot taken at WATCH
+        # Replies are written one by one; don't let Nagle hold back pipelined ones.
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.split()  # inline command, e.g. from telnet
+        args = []
+        for _ in range(int(line[1:])):
+            size = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+    def handle(self):
+        while True:
+            args = self._read_command()
+            if args is None:
+                return
+            if not args:
+                continue
+            if args[0].upper() == b"HELLO":
+                self.wfile.write(self._hello(args[1:]))
+                continue
+            if args[0].upper() in TRANSACTION_COMMANDS or self.queued is not None:
+                self.wfile.write(encode(self._transaction(args), self.resp3))
+                continue
+            handler = COMMANDS.get(args[0].upper())
+            with self.state.lock:
+                self.state.commands += 1
+                if handler is None:
+                    reply = Exception(f"ERR unknown command '{args[0].decode(errors='replace')}'")
+                else:
+                    reply = self._call(handler, args)
+                    deadline = None
+                    while isinstance(reply, Blocked):
+                        # BLOCK 0 waits forever; re-check at least once a second.
+                        if deadline is None:
+                            deadline = time.time() + reply.timeout_s if reply.timeout_s else float("inf")
+                            if reply.retry is not None:
+                                handler = lambda state, *_, retry=reply.retry: retry(state)  # noqa: E731
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            reply = None
+                            break
+                        self.state.changed.wait(min(remaining, 1.0))
+                        reply = self._call(handler, args)
+            self.wfile.write(encode(reply, self.resp3))
+
+    def _call(self, handler, args):
+        try:
+            return handler(self.state, *args[1:])
+        except WrongType:
+            return Exception("WRONGTYPE Operation against a key holding the wrong kind of value")
+        except (TypeError, ValueError, IndexError):
+            return Exception(f"ERR wrong arguments for '{args[0].decode(errors='replace')}'")
+
+    def _transaction(self, args):
+        # EXEC runs the queued commands under the state lock, so no other
+        # connection's command lands in between.
+        name = args[0].upper()
+        with self.state.lock:
+            self.state.commands += 1
+            if name == b"WATCH":
+                if self.queued is not None:
+                    return Exception("ERR WATCH inside MULTI is not allowed")
+                for key in args[1:]:
+                    self.watched.setdefault(key, _snapshot(self.state.get(key)))
+                return "OK"
+            if name == b"UNWATCH":
+                self.watched = {}
+                return "OK"
+            if name == b"MULTI":
+                if self.queued is not None:
+                    return Exception("ERR MULTI calls can not be nested")
+                self.queued, self.aborted = [], False
+                return "OK"
+            if name in (b"EXEC", b"DISCARD"):
+                if self.queued is None:
+                    return Exception(f"ERR {name.decode()} without MULTI")
+                queued, watched, aborted = self.queued, self.watched, self.aborted
+                self.queued, self.watched, self.aborted = None, {}, False
+                if name == b"DISCARD":
+                    return "OK"
+                if aborted:
+                    return Exception("EXECABORT Transaction discarded because of previous errors.")
+                if any(_snapshot(self.state.get(key)) != seen for key, seen in watched.items()):
+                    return None
+                replies = [self._call(handler, queued_args) for handler, queued_args in queued]
+                # A blocking read inside MULTI doesn't block, as in Redis.
+                return [None if isinstance(reply, Blocked) else reply for reply in replies]
+            handler = COMMANDS.get(name)
+            if handler is None:
+                self.aborted = True
+                return Exception(f"ERR unknown command '{args[0].decode(errors='replace')}'")
+            self.queued.append((handler, args))
+            return "QUEUED"
+
+    def _hello(self, args):
+        version = _int(args[0]) if args else 2
+        if version not in (2, 3):
+            return encode(Exception("NOPROTO unsupported protocol version"))
+        self.resp3 = version == 3
+        return encode({
+            b"server": b"redis-stub", b"version": b"7.0.0", b"proto": version,
+            b"id": 1, b"mode": b"standalone", b"role": b"master", b"modules": [],
+        }, self.resp3)
+
+
+def start_redis_stub(port=0, host="127.0.0.1"):
+    # Runs in a daemon thread; server.state holds the data, server.port the bound port.
+    state = RedisState()
+    handler = type("BoundRedisHandler", (RedisHandler,), {"state": state})
+    server = socketserver.ThreadingTCPServer((host, port), handler)
+    server.daemon_threads = True
+    server.state = state
+    server.host = host
+    server.port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-memory Redis stand-in")
+    parser.add_argument("--port", type=int, default=6380)
+    args = parser.parse_args()
+
+    server = start_redis_stub(args.port)
+    print(json.dumps({"host": server.host, "port": server.port}), flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+# season_features.py
+# Season-to-date yield features per farm, aggregated incrementally in Redis.
+#
+# The yield model was trained on season aggregates (Cumulative_Rainfall and
+# Average_* of temperature, soil moisture, humidity and wind speed), not on
+# one reading. Each farm has a hash, season:<farm>:
+#   sowing_date, crop_type   written by SowingService when a date is published
+#                            (farms without one use the mqtt-global date)
+#   <sowing date>|n          readings folded in since sowing
+#   <sowing date>|sum:<f>    running sum of field f
+#   <sowing date>|count:<f>  readings that carried field f
+#   features                 JSON {"sowing_date", "readings", "last_ts",
+#                            "rainfall" (sum), "temperature", "moisture",
+#                            "humidity", "wind_speed" (means)}
+# Every reading is folded in with HINCRBY / HINCRBYFLOAT, so the cost per
+# reading is O(1) and history is never rescanned. Prefixing the sums with the
+# sowing date starts a new season with no reset step: the aggregator writes
+# under whatever date it reads. Readers take "features" only if its
+# sowing_date is the farm's current one. Readings before the sowing date and
+# values outside SENSOR_LIMITS are left out, and a sowing date that isn't a
+# real day counts as no date.
+#
+# `--ingest` runs the aggregator as its own consumer group on the sensor
+# stream, so readings are counted whichever analytics consumers run. Delivery
+# is at least once: a crash or retry between the increments and the XACK
+# counts that batch twice (a small bias in the sums and means, not worth a
+# per-entry dedup on the hot path). Yield inference (worker.py, stream_worker.py,
+# yield_prediction.py and AiService.runYieldModelFromRedis) reads the
+# features with one pipelined lookup and uses them in place of the
+# instantaneous values. Without a season (no sowing date, or Redis down) it
+# falls back to the reading.
+#
+#   python season_features.py --ingest
+#   python season_features.py FARM [FARM ...]
+
+import argparse
+import json
+import math
+import os
+import socket
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import redis
+
+import redis_pool
+from sensor_stats import DEFAULT_FARM, SENSOR_LIMITS, farm_key
+
+SEASON_PREFIX = "season:"
+SEASON_GROUP = os.getenv("SEASON_GROUP", "group:season")
+SEASON_TTL = int(os.getenv("SEASON_TTL", str(400 * 86400)))
+# How long the aggregator trusts a farm's sowing date before reading it again.
+SEASON_SOWING_CACHE_S = float(os.getenv("SEASON_SOWING_CACHE_S", "10"))
+
+AVERAGED = ("temperature", "moisture", "humidity", "wind_speed")
+SUMMED = ("rainfall",)
+FIELDS = AVERAGED + SUMMED
+
+
+def season_key(farm):
+    return f"{SEASON_PREFIX}{farm}"
+
+
+def sowing_ms(sowing_date):
+    return int(datetime.strptime(sowing_date, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _text(value):
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def _valid_date(value):
+    # The stored sowing date, or None if it is missing or not a real day.
+    value = _text(value)
+    try:
+        sowing_ms(value)
+    except (TypeError, ValueError):
+        return None
+    return value
+
+
+def _value(record, field):
+    value = record.get(field)
+    if not isinstance(value, (int, float)) or isinstance(value, bool) or not math.isfinite(value):
+        return None
+    low, high = SENSOR_LIMITS.get(field, (0.0, math.inf))
+    return value if low <= value <= high else None
+
+
+class SeasonAggregator:
+    def __init__(self, client=None):
+        self._client = client
+        self._sowing = {}  # farm -> (sowing date or None, fetched at)
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        return self._client or redis_pool.get_client()
+
+    def _sowing_dates(self, farms):
+        # Effective sowing date per farm (own, else the mqtt-global one).
+        now = time.time()
+        with self._lock:
+            stale = [
+                f for f in set(farms) | {DEFAULT_FARM}
+                if now - self._sowing.get(f, (None, -math.inf))[1] > SEASON_SOWING_CACHE_S
+            ]
+        if stale:
+            pipe = self.client.pipeline(transaction=False)
+            for farm in stale:
+                pipe.hget(season_key(farm), "sowing_date")
+            dates = pipe.execute()
+            with self._lock:
+                for farm, date in zip(stale, dates):
+                    self._sowing[farm] = (_valid_date(date), now)
+        with self._lock:
+            default = self._sowing[DEFAULT_FARM][0]
+            return {farm: self._sowing[farm][0] or default for farm in farms}
+
+    def sowing_dates(self, farms):
+        # {farm: effective sowing date or None}; all None while Redis is down.
+        farms = list(dict.fromkeys(farms))
+        if not farms or not redis_pool.available():
+            return {farm: None for farm in farms}
+        try:
+            return self._sowing_dates(farms)
+        except redis.RedisError:
+            redis_pool.mark_down()
+            return {farm: None for farm in farms}
+
+    def add(self, readings):
+        # readings: [(epoch ms, payload), ...] -> readings folded in.
+        by_farm = {}
+        for ts, record in readings:
+            by_farm.setdefault(farm_key(record), []).append((ts, record))
+        if not by_farm:
+            return 0
+        dates = self._sowing_dates(list(by_farm))
+
+        # Sum each farm's part of the batch locally, then one increment per field.
+        batches = {}
+        for farm, rows in by_farm.items():
+            date = dates[farm]
+            if not date:
+                continue
+            start = sowing_ms(date)
+            sums, counts, n, last_ts = {}, {}, 0, None
+            for ts, record in rows:
+                if ts < start:
+                    continue
+                n += 1
+                last_ts = ts if last_ts is None else max(last_ts, ts)
+                for field in FIELDS:
+                    value = _value(record, field)
+                    if value is not None:
+                        sums[field] = sums.get(field, 0.0) + value
+                        counts[field] = counts.get(field, 0) + 1
+            if n:
+                batches[farm] = (date, n, last_ts, sums, counts)
+        if not batches:
+            return 0
+
+        pipe = self.client.pipeline(transaction=False)
+        layout = []
+        for farm, (date, n, last_ts, sums, counts) in batches.items():
+            key, prefix = season_key(farm), f"{date}|"
+            pipe.hincrby(key, prefix + "n", n)
+            for field in FIELDS:
+                # Always incremented, so the replies carry every running total.
+                pipe.hincrbyfloat(key, prefix + "sum:" + field, sums.get(field, 0.0))
+                pipe.hincrby(key, prefix + "count:" + field, counts.get(field, 0))
+            layout.append(farm)
+        replies = iter(pipe.execute())
+
+        pipe = self.client.pipeline(transaction=False)
+        for farm in layout:
+            date, _, last_ts, _, _ = batches[farm]
+            features = {"sowing_date": date, "readings": int(next(replies)), "last_ts": last_ts}
+            for field in FIELDS:
+                total, count = float(next(replies)), int(next(replies))
+                if count:
+                    features[field] = round(total if field in SUMMED else total / count, 4)
+            key = season_key(farm)
+            pipe.hset(key, "features", json.dumps(features))
+            pipe.expire(key, SEASON_TTL)
+        pipe.execute()
+        return sum(batch[1] for batch in batches.values())
+
+    def features(self, farms):
+        # {farm: features or None}, one round trip for any number of farms.
+        farms = list(dict.fromkeys(farms))
+        if not farms or not redis_pool.available():
+            return {farm: None for farm in farms}
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for farm in farms:
+                pipe.hmget(season_key(farm), "sowing_date", "features")
+            pipe.hget(season_key(DEFAULT_FARM), "sowing_date")
+            replies = pipe.execute()
+        except redis.RedisError:
+            redis_pool.mark_down()
+            return {farm: None for farm in farms}
+
+        default = _text(replies[-1])
+        result = {}
+        for farm, (date, raw) in zip(farms, replies[:-1]):
+            date = _text(date) or default
+            features = json.loads(raw) if raw else None
+            result[farm] = features if features and features.get("sowing_date") == date else None
+        return result
+
+    def with_season(self, records):
+        # The records with season aggregates in place of the instantaneous
+        # yield inputs, where the farm has them.
+        season = self.features([farm_key(r) for r in records])
+        merged = []
+        for record in records:
+            features = season.get(farm_key(record))
+            if features:
+                record = dict(record, **{f: features[f] for f in FIELDS if f in features})
+            merged.append(record)
+        return merged
+
+
+_aggregator = None
+_aggregator_lock = threading.Lock()
+
+
+def get_aggregator():
+    global _aggregator
+    if _aggregator is None:
+        with _aggregator_lock:
+            if _aggregator is None:
+                _aggregator = SeasonAggregator()
+    return _aggregator
+
+
+def ingest():
+    from history_store import parse_ts_ms
+    from stream_worker import follow
+
+    aggregator = get_aggregator()
+
+    def handle(entries):
+        # Stream ids start with the arrival time in ms.
+        aggregator.add([(parse_ts_ms(record, int(entry_id.split("-")[0])), record) for entry_id, record in entries])
+
+    follow(SEASON_GROUP, f"season-{socket.gethostname()}", handle)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Season-to-date yield features per farm")
+    parser.add_argument("farms", nargs="*")
+    parser.add_argument("--ingest", action="store_true", help="aggregate readings from the sensor stream")
+    args = parser.parse_args()
+
+    if args.ingest:
+        ingest()
+    elif args.farms:
+        print(json.dumps(get_aggregator().features(args.farms)))
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+# sensor_stats.py
+# Streaming per-farm sensor statistics and a reading pre-filter.
+#
+# For each farm and each of moisture, temperature, humidity and TDS this keeps
+# count, running mean and variance (Welford), EWMA, min, max, the last value
+# and when the farm first reported it: 8 float64 slots per field, one
+# fixed-size row per farm in a growable numpy table, so memory per farm is
+# constant however many readings arrive.
+#
+# Each reading is checked against the farm's state before it is folded in:
+#   out_of_range  outside SENSOR_LIMITS (not folded into the stats)
+#   flatline      the same value for SENSOR_FLAT_S seconds of reading time
+#                 (stuck sensor); elapsed time rather than a count of readings,
+#                 so steady values at sensor precision are not flagged
+#   spike         more than SENSOR_SPIKE_Z standard deviations from the EWMA,
+#                 once there are SENSOR_MIN_SAMPLES readings
+# Readings with a flag in SENSOR_REJECT (by default only out_of_range; the
+# others are reported in "flags") come back with ok=false, and callers
+# skip the expensive stages for them (see stream_worker.py and
+# AiService.processSensorData). "baseline" holds the farm's EWMA per field.
+#
+# Rows are persisted in Redis as raw bytes under sensor:stats:<farm>. A batch
+# refreshes its farms with one MGET and writes them back in one pipeline, so
+# processes that share a stream see each other's updates (last write wins if
+# two update the same farm at once). Without Redis the in-process table is used.
+#
+#   python sensor_stats.py '<sensor json>'
+#   python sensor_stats.py --bench [--farms 20000]
+
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import redis
+
+import redis_pool
+from history_store import parse_ts_ms
+
+FIELDS = ("moisture", "temperature", "humidity", "tds")
+SENSOR_LIMITS = {
+    field: tuple(float(v) for v in limits.split(":"))
+    for field, limits in (
+        item.split("=") for item in os.getenv(
+            "SENSOR_LIMITS", "moisture=0:100,temperature=-10:60,humidity=0:100,tds=0:5000"
+        ).split(",")
+    )
+}
+SENSOR_EWMA_ALPHA = float(os.getenv("SENSOR_EWMA_ALPHA", "0.2"))
+SENSOR_SPIKE_Z = float(os.getenv("SENSOR_SPIKE_Z", "4"))
+SENSOR_MIN_SAMPLES = int(os.getenv("SENSOR_MIN_SAMPLES", "10"))
+SENSOR_FLAT_S = float(os.getenv("SENSOR_FLAT_S", str(24 * 3600)))
+SENSOR_REJECT = frozenset(os.getenv("SENSOR_REJECT", "out_of_range").split(","))
+SENSOR_STATS_TTL = int(os.getenv("SENSOR_STATS_TTL", str(30 * 86400)))
+
+REDIS_PREFIX = "sensor:stats:"
+DEFAULT_FARM = "mqtt-global"  # what ReportService files farm-less readings under
+
+# Slots of one field's state.
+COUNT, MEAN, M2, EWMA, MIN, MAX, LAST, SINCE = range(8)
+SLOTS = 8
+WIDTH = len(FIELDS) * SLOTS
+ROW_BYTES = WIDTH * 8
+
+_LOW = np.array([SENSOR_LIMITS.get(f, (-np.inf, np.inf))[0] for f in FIELDS])
+_HIGH = np.array([SENSOR_LIMITS.get(f, (-np.inf, np.inf))[1] for f in FIELDS])
+# A history that never moved has std 0; spikes are measured against at least
+# 1% of the field's range instead.
+_STD_FLOOR = np.where(np.isfinite(_HIGH - _LOW), (_HIGH - _LOW) * 0.01, 1e-6)
+_FLAT_EPS = 1e-9
+_LOW_LIST, _HIGH_LIST, _STD_FLOOR_LIST = _LOW.tolist(), _HIGH.tolist(), _STD_FLOOR.tolist()
+
+
+def farm_key(record):
+    for name in ("farm_id", "farmId", "userId"):
+        if record.get(name):
+            return str(record[name])
+    return DEFAULT_FARM
+
+
+def _empty_row():
+    row = np.zeros((len(FIELDS), SLOTS))
+    row[:, MIN] = np.inf
+    row[:, MAX] = -np.inf
+    row[:, LAST] = np.nan
+    return row.reshape(-1)
+
+
+_EMPTY_ROW = _empty_row()
+_NAN = float("nan")
+
+
+def _number(value):
+    return value if type(value) in (int, float) else _NAN
+
+
+def readings(records):
+    # (n, fields) float matrix; NaN where a field is missing or not a number.
+    return np.array([[_number(record.get(field)) for field in FIELDS] for record in records], dtype=np.float64)
+
+
+def reading_times(records):
+    # Epoch seconds of each reading: its own timestamp, else now.
+    now_ms = time.time() * 1000
+    return np.array([parse_ts_ms(record, now_ms) for record in records], dtype=np.float64) / 1000
+
+
+def update(state, x, t):
+    # state: (n, fields, SLOTS), updated in place with readings x (n, fields)
+    # taken at epoch seconds t (n,). Returns the per-field flag masks. Every
+    # farm appears at most once.
+    count, mean, m2, ewma = state[..., COUNT], state[..., MEAN], state[..., M2], state[..., EWMA]
+    present = ~np.isnan(x)
+    with np.errstate(invalid="ignore"):
+        out_of_range = present & ((x < _LOW) | (x > _HIGH))
+    valid = present & ~out_of_range
+
+    std = np.sqrt(np.divide(m2, count - 1, out=np.zeros_like(m2), where=count > 1))
+    with np.errstate(invalid="ignore"):
+        spike = valid & (count >= SENSOR_MIN_SAMPLES) & (
+            np.abs(x - ewma) > SENSOR_SPIKE_Z * np.maximum(std, _STD_FLOOR)
+        )
+        repeat = valid & (np.abs(x - state[..., LAST]) <= _FLAT_EPS)
+    since = np.where(repeat, state[..., SINCE], t[:, None])
+    flatline = repeat & (t[:, None] - since >= SENSOR_FLAT_S)
+
+    # Welford and EWMA updates, only where the reading is valid.
+    xv = np.where(valid, x, 0.0)
+    new_count = count + valid
+    delta = xv - mean
+    new_mean = mean + np.divide(delta, new_count, out=np.zeros_like(delta), where=valid)
+    state[..., M2] = np.where(valid, m2 + delta * (xv - new_mean), m2)
+    state[..., EWMA] = np.where(valid, np.where(count == 0, xv, ewma + SENSOR_EWMA_ALPHA * (xv - ewma)), ewma)
+    state[..., MEAN] = new_mean
+    state[..., COUNT] = new_count
+    state[..., MIN] = np.where(valid, np.minimum(state[..., MIN], xv), state[..., MIN])
+    state[..., MAX] = np.where(valid, np.maximum(state[..., MAX], xv), state[..., MAX])
+    state[..., LAST] = np.where(valid, xv, state[..., LAST])
+    state[..., SINCE] = np.where(valid, since, state[..., SINCE])
+    return {"out_of_range": out_of_range, "flatline": flatline, "spike": spike}
+
+
+def update_one(row, values, t):
+    # Same as update() for a single farm, on a plain list (row, updated in
+    # place): numpy's per-call overhead would dominate for one reading.
+    flags = {}
+    for j, x in enumerate(values):
+        if x != x:
+            continue
+        base = j * SLOTS
+        count, mean, m2, ewma, low, high, last, since = row[base:base + SLOTS]
+        if x < _LOW_LIST[j] or x > _HIGH_LIST[j]:
+            flags[FIELDS[j]] = ["out_of_range"]
+            continue
+        field_flags = []
+        if not abs(x - last) <= _FLAT_EPS:  # also the first reading (last is NaN)
+            since = t
+        elif t - since >= SENSOR_FLAT_S:
+            field_flags.append("flatline")
+        if count >= SENSOR_MIN_SAMPLES:
+            std = math.sqrt(m2 / (count - 1)) if count > 1 else 0.0
+            if abs(x - ewma) > SENSOR_SPIKE_Z * max(std, _STD_FLOOR_LIST[j]):
+                field_flags.append("spike")
+        if field_flags:
+            flags[FIELDS[j]] = field_flags
+
+        new_count = count + 1
+        delta = x - mean
+        new_mean = mean + delta / new_count
+        row[base:base + SLOTS] = [
+            new_count, new_mean, m2 + delta * (x - new_mean),
+            x if count == 0 else ewma + SENSOR_EWMA_ALPHA * (x - ewma),
+            min(low, x), max(high, x), x, since,
+        ]
+    return flags
+
+
+class SensorStats:
+    def __init__(self, capacity=1024, persist=True):
+        self._rows = np.empty((capacity, WIDTH))
+        self._index = {}  # farm -> row
+        self._lock = threading.Lock()
+        self.persist = persist
+
+    def _row(self, farm):
+        row = self._index.get(farm)
+        if row is None:
+            row = len(self._index)
+            if row == len(self._rows):
+                self._rows = np.concatenate([self._rows, np.empty_like(self._rows)])
+            self._rows[row] = _EMPTY_ROW
+            self._index[farm] = row
+        return row
+
+    def _redis_client(self):
+        if not self.persist or not redis_pool.available():
+            return None
+        return redis_pool.get_client(decode_responses=False)
+
+    def _load(self, client, farms, rows):
+        for row, raw in zip(rows, client.mget([REDIS_PREFIX + farm for farm in farms])):
+            if raw is not None and len(raw) == ROW_BYTES:
+                self._rows[row] = np.frombuffer(raw, dtype=np.float64)
+
+    def _save(self, client, farms, rows):
+        for start in range(0, len(farms), redis_pool.BULK_CHUNK):
+            pipe = client.pipeline(transaction=False)
+            for farm, row in zip(farms[start:start + redis_pool.BULK_CHUNK], rows[start:start + redis_pool.BULK_CHUNK]):
+                pipe.set(REDIS_PREFIX + farm, self._rows[row].tobytes(), ex=SENSOR_STATS_TTL)
+            pipe.execute()
+
+    def check_batch(self, records, farms=None):
+        # One result per record: {"ok", "flags": {field: [flag, ...]}, "baseline": {field: ewma}}.
+        if not records:
+            return []
+        farms = farms or [farm_key(r) for r in records]
+        x = readings(records)
+        t = reading_times(records)
+        masks = {name: np.zeros(x.shape, dtype=bool) for name in ("out_of_range", "flatline", "spike")}
+        client = self._redis_client()
+        with self._lock:
+            unique = list(dict.fromkeys(farms))
+            unique_rows = [self._row(farm) for farm in unique]
+            if client is not None:
+                try:
+                    self._load(client, unique, unique_rows)
+                except redis.RedisError:
+                    redis_pool.mark_down()
+                    client = None
+
+            rows = np.array([self._index[farm] for farm in farms])
+            # A farm can appear more than once in a batch: its readings are
+            # applied in order, one round per repeat.
+            if len(unique) == len(farms):
+                batches = [np.arange(len(farms))]
+            else:
+                seen = {}
+                rounds = np.empty(len(farms), dtype=np.int64)
+                for i, farm in enumerate(farms):
+                    rounds[i] = seen[farm] = seen.get(farm, -1) + 1
+                batches = [np.flatnonzero(rounds == r) for r in range(int(rounds.max()) + 1)]
+            baseline = np.empty(x.shape)
+            for members in batches:
+                state = self._rows[rows[members]].reshape(len(members), len(FIELDS), SLOTS)
+                for name, mask in update(state, x[members], t[members]).items():
+                    masks[name][members] = mask
+                baseline[members] = np.where(state[..., COUNT] > 0, state[..., EWMA], _NAN)
+                self._rows[rows[members]] = state.reshape(len(members), WIDTH)
+            baseline = baseline.round(3).tolist()
+
+            if client is not None:
+                try:
+                    self._save(client, unique, unique_rows)
+                except redis.RedisError:
+                    redis_pool.mark_down()
+
+        rejected = np.zeros(len(records), dtype=bool)
+        for name, mask in masks.items():
+            if name in SENSOR_REJECT:
+                rejected |= mask.any(axis=1)
+        results = [
+            {
+                "ok": not reject,
+                "flags": {},
+                "baseline": {field: value for field, value in zip(FIELDS, values) if value == value},
+            }
+            for reject, values in zip(rejected.tolist(), baseline)
+        ]
+        # Flags are rare; only the flagged cells are visited.
+        for name, mask in masks.items():
+            for i, j in zip(*np.nonzero(mask)):
+                results[i]["flags"].setdefault(FIELDS[j], []).append(name)
+        return results
+
+    def check(self, record):
+        farm = farm_key(record)
+        values = [float(_number(record.get(field))) for field in FIELDS]
+        t = float(reading_times([record])[0])
+        client = self._redis_client()
+        with self._lock:
+            row = self._row(farm)
+            if client is not None:
+                try:
+                    self._load(client, [farm], [row])
+                except redis.RedisError:
+                    redis_pool.mark_down()
+                    client = None
+            state = self._rows[row].tolist()
+            flags = update_one(state, values, t)
+            self._rows[row] = state
+            if client is not None:
+                try:
+                    self._save(client, [farm], [row])
+                except redis.RedisError:
+                    redis_pool.mark_down()
+        return {
+            "ok": not any(name in SENSOR_REJECT for names in flags.values() for name in names),
+            "flags": flags,
+            "baseline": {
+                field: round(state[j * SLOTS + EWMA], 3) for j, field in enumerate(FIELDS) if state[j * SLOTS + COUNT]
+            },
+        }
+
+    def summary(self, farm):
+        # Current statistics of one farm, per field with readings.
+        with self._lock:
+            row = self._index.get(farm)
+            if row is None:
+                return {}
+            state = self._rows[row].reshape(len(FIELDS), SLOTS)
+            result = {}
+            for j, field in enumerate(FIELDS):
+                count = int(state[j, COUNT])
+                if not count:
+                    continue
+                result[field] = {
+                    "count": count,
+                    "mean": round(float(state[j, MEAN]), 3),
+                    "std": round(math.sqrt(state[j, M2] / (count - 1)), 3) if count > 1 else 0.0,
+                    "ewma": round(float(state[j, EWMA]), 3),
+                    "min": float(state[j, MIN]),
+                    "max": float(state[j, MAX]),
+                }
+            return result
+
+    def __len__(self):
+        return len(self._index)
+
+
+_stats = None
+_stats_lock = threading.Lock()
+
+
+def get_stats():
+    global _stats
+    if _stats is None:
+        with _stats_lock:
+            if _stats is None:
+                _stats = SensorStats()
+    return _stats
+
+
+def bench(farms, batch, rounds):
+    rng = np.random.default_rng(0)
+    stats = SensorStats(persist=False)
+    ids = [f"farm-{i}" for i in range(farms)]
+    center = rng.uniform([20, 15, 30, 200], [70, 35, 80, 900], size=(farms, len(FIELDS)))
+
+    started = time.perf_counter()
+    updates = 0
+    for _ in range(rounds):
+        order = rng.permutation(farms)
+        for start in range(0, farms, batch):
+            chosen = order[start:start + batch]
+            values = center[chosen] + rng.normal(0, 1, size=(len(chosen), len(FIELDS)))
+            stats.check_batch([dict(zip(FIELDS, v)) for v in values.tolist()], [ids[i] for i in chosen])
+            updates += len(chosen)
+    batched = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for i in range(2000):
+        stats.check(dict(zip(FIELDS, center[i % farms].tolist()), farm_id=ids[i % farms]))
+    single = time.perf_counter() - started
+
+    print(json.dumps({
+        "farms": len(stats),
+        "updates": updates,
+        "batch": batch,
+        "batched_us_per_update": round(batched / updates * 1e6, 2),
+        "single_us_per_update": round(single / 2000 * 1e6, 2),
+        "state_bytes_per_farm": ROW_BYTES,
+        "table_mb": round(stats._rows.nbytes / 1e6, 2),
+    }, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-farm streaming sensor statistics")
+    parser.add_argument("reading", nargs="?")
+    parser.add_argument("--bench", action="store_true", help="time in-process updates (no Redis)")
+    parser.add_argument("--farms", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=256)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.bench:
+        bench(args.farms, args.batch, args.rounds)
+        return
+    try:
+        record = json.loads(args.reading if args.reading is not None else sys.stdin.read())
+        print(json.dumps(get_stats().check(record)))
+    except Exception as e:
+        print(json.dumps({"ok": True, "flags": {}, "baseline": {}, "error": str(e)}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,408 @@
+# stream_worker.py
+# Redis Streams consumer for the analytics pipeline. --procs processes join one
+# consumer group on the sensor stream (what StreamCore.publish writes), and each:
+#   - reads up to --batch entries per XREADGROUP,
+#   - checks every reading against its farm's running statistics
+#     (sensor_stats.py) and scores the readings that pass at once: dryness,
+#     health, yield, irrigation minutes and, unless --no-advisory, the
+#     advisory pipeline; a batch that fails is split and retried, so only
+#     the entries that fail on their own stay pending,
+#   - writes one entry per message to the result stream and acks the whole
+#     batch with one XACK, all in a single pipelined round trip,
+#   - XAUTOCLAIMs entries that other consumers left pending for --claim-idle-ms;
+#     entries delivered more than AI_STREAM_MAX_DELIVERIES times are acked with
+#     an error result instead of being retried forever.
+# Backpressure: a process only reads after finishing its previous batch, no
+# process reads new entries while the group has more than --max-pending
+# unacknowledged ones, and the result stream is capped with MAXLEN ~.
+#
+#   python stream_worker.py [--procs 4] [--batch 64] [--no-advisory]
+#
+# Result entries: {"source_id": <sensor entry id>, "data": JSON} with the same
+# fields as AiService.processSensorData plus irrigationMinutes and
+# sensorCheck, or {"source_id", "error"} for messages that could not be scored.
+# Rejected readings (out of range, flat-lined) only get a health index, computed
+# on the farm's baseline for the flagged fields; the other fields are null.
+
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+
+import redis
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, "yeild"))
+
+import redis_pool  # noqa: E402
+
+STREAM = os.getenv("REDIS_STREAM_SENSORS", "stream:sensors")
+GROUP = os.getenv("AI_STREAM_GROUP", "group:analytics")
+RESULT_STREAM = os.getenv("AI_RESULT_STREAM", "stream:analytics")
+RESULT_MAXLEN = int(os.getenv("AI_RESULT_MAXLEN", "100000"))
+MAX_DELIVERIES = int(os.getenv("AI_STREAM_MAX_DELIVERIES", "5"))
+
+REQUIRED_FIELDS = ("moisture", "temperature", "humidity")
+PENDING_CHECK_S = 1.0
+STATS_INTERVAL_S = 10.0
+
+
+def log(**fields):
+    print(json.dumps(fields), file=sys.stderr, flush=True)
+
+
+def ensure_group(client, stream=STREAM, group=GROUP):
+    try:
+        client.xgroup_create(stream, group, id="0", mkstream=True)
+    except redis.ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def parse_entry(fields):
+    # StreamCore.publish stores the JSON payload under "data".
+    data = json.loads(fields.get("data") or "{}")
+    if not isinstance(data, dict):
+        raise ValueError("payload is not an object")
+    missing = [f for f in REQUIRED_FIELDS if not isinstance(data.get(f), (int, float))]
+    if missing:
+        raise ValueError("missing or non-numeric: " + ", ".join(missing))
+    return data
+
+
+def follow(group, consumer, handle, batch=512, block_ms=2000):
+    # Side consumers (history_store.py, season_features.py): their own group on
+    # the sensor stream, handle([(entry_id, payload dict), ...]) per batch, then
+    # one XACK. Undecodable entries are acked and skipped. The consumer first
+    # re-reads what it left pending (after a crash, or when handle raised), so
+    # give it a stable name. After handle raises, the pending entries are
+    # re-read one at a time, so a bad entry only holds up itself; once it has
+    # been delivered more than AI_STREAM_MAX_DELIVERIES times it is acked and
+    # logged instead of retried. Runs until SIGTERM/SIGINT.
+    stopping = _stop_flag()
+    client = redis_pool.blocking_client(block_ms / 1000)
+    ensure_group(client, STREAM, group)
+    cursor, count = "0", batch
+    while not stopping():
+        try:
+            reply = client.xreadgroup(group, consumer, {STREAM: cursor}, count=count, block=block_ms)
+            entries = reply[0][1] if reply else []
+            if not entries:
+                cursor, count = ">", batch
+                continue
+            if cursor == "0":
+                entries = _drop_dead(client, group, consumer, entries)
+                if not entries:
+                    continue
+            records = []
+            for entry_id, fields in entries:
+                try:
+                    record = json.loads((fields or {}).get("data") or "{}")
+                except ValueError:
+                    continue
+                if isinstance(record, dict):
+                    records.append((entry_id, record))
+            handle(records)
+            client.xack(STREAM, group, *[entry_id for entry_id, _ in entries])
+        except redis.RedisError as e:
+            log(consumer=consumer, error=str(e))
+            cursor = "0"
+            time.sleep(1)
+        except Exception as e:
+            log(consumer=consumer, error=f"batch failed: {e}")
+            cursor, count = "0", 1
+            time.sleep(1)
+
+
+def _drop_dead(client, group, consumer, entries):
+    # Acks (and logs) re-read entries delivered more than MAX_DELIVERIES times;
+    # returns the rest.
+    deliveries = {
+        item["message_id"]: item["times_delivered"]
+        for item in client.xpending_range(
+            STREAM, group, min=entries[0][0], max=entries[-1][0], count=len(entries), consumername=consumer,
+        )
+    }
+    dead = [entry_id for entry_id, _ in entries if deliveries.get(entry_id, 0) > MAX_DELIVERIES]
+    if not dead:
+        return entries
+    client.xack(STREAM, group, *dead)
+    log(consumer=consumer, error=f"gave up after {MAX_DELIVERIES} deliveries", dead=dead)
+    return [(entry_id, fields) for entry_id, fields in entries if entry_id not in dead]
+
+
+class Analytics:
+    # Models are loaded once per process.
+    def __init__(self, with_advisory=True):
+        import advisory_adapter
+        import dryness_prediction
+        import health_index
+        import irrigation_service
+        import model_memo
+        import season_features
+        import sensor_stats
+        import yield_prediction
+        from model_service import load_model, model_version, predict_yield_batch
+
+        self.with_advisory = with_advisory
+        self.sensor_stats = sensor_stats.get_stats()
+        self.advisory_adapter = advisory_adapter
+        self.dryness_prediction = dryness_prediction
+        self.health_index = health_index
+        self.irrigation_service = irrigation_service
+        self.yield_prediction = yield_prediction
+        self.predict_yield_batch = predict_yield_batch
+        self.model, self.feature_columns = load_model()
+        # Yield results are memoized on quantized inputs (model_memo.py).
+        self.memo = model_memo.get_memo()
+        self.memo.set_version("yield_prediction", model_version())
+        self.season = season_features.get_aggregator()
+        irrigation_service.load_model()
+
+    def _predict_yields(self, records):
+        return self.predict_yield_batch(
+            self.model, self.feature_columns, [self.yield_prediction.to_farm_data(r) for r in records]
+        )
+
+    def score(self, records):
+        checks = self.sensor_stats.check_batch(records)
+        results = []
+        for record, check in zip(records, checks):
+            if check["ok"]:
+                results.append({"sensorCheck": check})
+            else:
+                baseline = {f: check["baseline"][f] for f in check["flags"] if f in check["baseline"]}
+                health = self.health_index.score_records([dict(record, **baseline)])[0]
+                results.append({
+                    "drynessPrediction": None,
+                    "yieldPrediction": None,
+                    "fieldHealthIndex": float(health),
+                    "irrigationMinutes": None,
+                    "advisory": None,
+                    "sensorCheck": check,
+                })
+
+        passed = [i for i, check in enumerate(checks) if check["ok"]]
+        if not passed:
+            return results
+        records = [records[i] for i in passed]
+        dryness = self.dryness_prediction.days_remaining_batch([r.get("moisture", 50) for r in records])
+        health = self.health_index.score_records(records)
+        # Yield runs on the season-to-date aggregates (season_features.py) where a farm has them.
+        yields = self.memo.get_or_compute_batch(
+            "yield_prediction", self.season.with_season(records), self._predict_yields
+        )
+        minutes = self.irrigation_service.predict_minutes_batch(records)
+        advisories = (
+            self.advisory_adapter.build_advisories(records) if self.with_advisory else [None] * len(records)
+        )
+        for i, d, y, h, m, a in zip(passed, dryness, yields, health, minutes, advisories):
+            results[i].update({
+                "drynessPrediction": float(d),
+                "yieldPrediction": y if y is not None else 0,
+                "fieldHealthIndex": float(h),
+                "irrigationMinutes": m,
+                "advisory": a,
+            })
+        return results
+
+
+class Consumer:
+    def __init__(self, name, analytics, batch, block_ms, claim_idle_ms, max_pending):
+        self.name = name
+        self.analytics = analytics
+        self.batch = batch
+        self.block_ms = block_ms
+        self.claim_idle_ms = claim_idle_ms
+        self.max_pending = max_pending
+        self.client = redis_pool.blocking_client(block_ms / 1000)
+        self.claim_cursor = "0-0"
+        self.next_claim_at = 0.0
+        self.pending_checked_at = 0.0
+        self.backlogged = False
+        self.processed = 0
+        self.errors = 0
+        self.claimed = 0
+
+    def _over_pending_limit(self):
+        now = time.time()
+        if now - self.pending_checked_at >= PENDING_CHECK_S:
+            self.pending_checked_at = now
+            self.backlogged = self.client.xpending(STREAM, GROUP)["pending"] > self.max_pending
+        return self.backlogged
+
+    def reclaim(self):
+        # Entries idle in other consumers' pending lists (crashed or stuck workers).
+        reply = self.client.xautoclaim(
+            STREAM, GROUP, self.name, self.claim_idle_ms, start_id=self.claim_cursor, count=self.batch
+        )
+        self.claim_cursor, entries = reply[0], reply[1]
+        if not entries:
+            return []
+        self.claimed += len(entries)
+
+        deliveries = {
+            item["message_id"]: item["times_delivered"]
+            for item in self.client.xpending_range(
+                STREAM, GROUP, min=entries[0][0], max=entries[-1][0], count=len(entries), consumername=self.name,
+            )
+        }
+        retry, dead = [], []
+        for entry_id, fields in entries:
+            if deliveries.get(entry_id, 0) > MAX_DELIVERIES:
+                dead.append((entry_id, f"gave up after {deliveries[entry_id]} deliveries"))
+            else:
+                retry.append((entry_id, fields))
+        if dead:
+            self._write([], dead)
+        return retry
+
+    def process(self, entries):
+        records, failed = [], []
+        for entry_id, fields in entries:
+            try:
+                records.append((entry_id, parse_entry(fields or {})))
+            except (ValueError, TypeError) as e:
+                failed.append((entry_id, str(e)))
+
+        results = self._score(records) if records else []
+        self._write(results, failed)
+        self.processed += len(results)
+
+    def _score(self, records):
+        # [(entry_id, record), ...] -> [(entry_id, result), ...]. A batch that
+        # raises is split in half and retried, so one bad entry does not fail
+        # the rest. An entry that fails on its own is left pending; reclaim
+        # retries it and dead-letters it after MAX_DELIVERIES.
+        try:
+            scored = self.analytics.score([record for _, record in records])
+            return [(entry_id, dict(result, sensorData=record)) for (entry_id, record), result in zip(records, scored)]
+        except redis.RedisError:
+            raise
+        except Exception as e:
+            if len(records) == 1:
+                log(consumer=self.name, source_id=records[0][0], error=f"scoring failed: {e}")
+                return []
+        middle = len(records) // 2
+        return self._score(records[:middle]) + self._score(records[middle:])
+
+    def _write(self, results, failed):
+        # Results first, then the ack: a crash in between redelivers the batch
+        # (at-least-once) instead of losing it.
+        pipe = self.client.pipeline(transaction=False)
+        for entry_id, result in results:
+            pipe.xadd(
+                RESULT_STREAM, {"source_id": entry_id, "data": json.dumps(result)},
+                maxlen=RESULT_MAXLEN, approximate=True,
+            )
+        for entry_id, error in failed:
+            pipe.xadd(
+                RESULT_STREAM, {"source_id": entry_id, "error": error},
+                maxlen=RESULT_MAXLEN, approximate=True,
+            )
+        ids = [entry_id for entry_id, _ in results] + [entry_id for entry_id, _ in failed]
+        if ids:
+            pipe.xack(STREAM, GROUP, *ids)
+        pipe.execute()
+        self.errors += len(failed)
+
+    def poll(self):
+        # One step of the loop; returns the number of entries handled.
+        if time.time() >= self.next_claim_at:
+            self.next_claim_at = time.time() + self.claim_idle_ms / 1000 / 2
+            entries = self.reclaim()
+            if entries:
+                self.process(entries)
+                return len(entries)
+
+        if self._over_pending_limit():
+            time.sleep(self.block_ms / 1000 / 4)
+            return 0
+
+        reply = self.client.xreadgroup(GROUP, self.name, {STREAM: ">"}, count=self.batch, block=self.block_ms)
+        entries = reply[0][1] if reply else []
+        if entries:
+            self.process(entries)
+        return len(entries)
+
+    def run(self, stopping):
+        started = last_stats = time.time()
+        while not stopping():
+            try:
+                self.poll()
+            except redis.RedisError as e:
+                log(consumer=self.name, error=str(e))
+                time.sleep(1)
+            except Exception as e:
+                # Batch left pending; it is reclaimed (and eventually dead-lettered) later.
+                log(consumer=self.name, error=f"batch failed: {e}")
+                time.sleep(1)
+            if time.time() - last_stats >= STATS_INTERVAL_S:
+                last_stats = time.time()
+                log(
+                    consumer=self.name, processed=self.processed, errors=self.errors, claimed=self.claimed,
+                    rate=round(self.processed / (last_stats - started), 1),
+                )
+
+
+def _stop_flag():
+    # Signal handlers only flip a flag; the loops check it between batches.
+    flag = []
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: flag.append(True))
+    return lambda: bool(flag)
+
+
+def run_consumer(index, args):
+    # SIGTERM (sent by the supervisor) finishes the current batch, then exits.
+    stopping = _stop_flag()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C reaches the whole group; the supervisor handles it
+    name = f"{socket.gethostname()}:{os.getpid()}"
+    consumer = Consumer(
+        name, Analytics(with_advisory=not args.no_advisory), args.batch, args.block_ms,
+        args.claim_idle_ms, args.max_pending,
+    )
+    log(consumer=name, event="started", index=index)
+    consumer.run(stopping)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-process Redis Streams consumer for the AI analytics")
+    parser.add_argument("--procs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch", type=int, default=64, help="entries per XREADGROUP")
+    parser.add_argument("--block-ms", type=int, default=2000)
+    parser.add_argument("--claim-idle-ms", type=int, default=60000, help="reclaim entries pending this long")
+    parser.add_argument("--max-pending", type=int, help="stop reading above this many unacked entries")
+    parser.add_argument("--no-advisory", action="store_true", help="skip the (LLM) advisory stage")
+    args = parser.parse_args()
+    if args.max_pending is None:
+        args.max_pending = args.procs * args.batch * 4
+
+    ensure_group(redis_pool.get_client())
+
+    stopping = _stop_flag()
+    procs = {}
+    while not stopping():
+        for index in range(args.procs):
+            proc = procs.get(index)
+            if proc is None or not proc.is_alive():
+                if proc is not None:
+                    log(event="restarting", index=index, exitcode=proc.exitcode)
+                procs[index] = multiprocessing.Process(target=run_consumer, args=(index, args), daemon=True)
+                procs[index].start()
+        time.sleep(1.0)
+
+    for proc in procs.values():
+        proc.terminate()
+    for proc in procs.values():
+        proc.join(timeout=args.block_ms / 1000 + 30)
+        if proc.is_alive():
+            proc.kill()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+# tracing.py
+# Lightweight stage timing for the AI scripts.
+#
+#   with tracing.trace() as t:            # collect the spans of one request
+#       with tracing.span("weather"):     # one stage: start, end, outcome
+#           ...
+#   meta["spans"] = t.spans
+#
+# Every finished span also lands in an in-process latency histogram per
+# (stage, status), which can be rendered as Prometheus text
+# (prometheus_text()) or published to Redis (export_redis(), one hash field
+# per process under AI_TRACE_REDIS_KEY). `python tracing.py` merges what all
+# processes published and prints it in Prometheus format.
+#
+# AI_TRACE=false turns it all off: span() then returns a shared no-op object
+# and record() returns immediately.
+
+import bisect
+import contextvars
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+AI_TRACE = os.getenv("AI_TRACE", "true").lower() in ("true", "1", "yes")
+AI_TRACE_REDIS_KEY = os.getenv("AI_TRACE_REDIS_KEY", "ai:metrics:stages")
+AI_TRACE_REDIS_TTL = int(os.getenv("AI_TRACE_REDIS_TTL", "300"))
+
+# Histogram upper bounds in seconds (Prometheus "le"), +Inf implied.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRIC = "ai_stage_duration_seconds"
+
+_current = contextvars.ContextVar("ai_trace", default=None)
+_histograms = {}  # (stage, status) -> [bucket counts..., +Inf count], sum, count
+_hist_lock = threading.Lock()
+
+
+class Trace:
+    def __init__(self):
+        self.spans = []
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("name", "attrs", "status", "_start", "_t0")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.status = "ok"
+
+    def set(self, status=None, **attrs):
+        if status is not None:
+            self.status = status
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self._start = time.time()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and self.status == "ok":
+            self.status = "error"
+        record(self.name, self._start, time.perf_counter() - self._t0, self.status, **self.attrs)
+        return False
+
+
+def enabled():
+    return AI_TRACE
+
+
+def span(name, **attrs):
+    if not AI_TRACE:
+        return _NOOP
+    return Span(name, attrs)
+
+
+def record(name, start, duration_s, status="ok", **attrs):
+    # start: epoch seconds. Adds to the active trace (if any) and the histograms.
+    if not AI_TRACE:
+        return
+    current = _current.get()
+    if current is not None:
+        entry = {
+            "name": name,
+            "start_ms": round(start * 1000, 3),
+            "end_ms": round((start + duration_s) * 1000, 3),
+            "duration_ms": round(duration_s * 1000, 3),
+            "status": status,
+        }
+        if attrs:
+            entry.update(attrs)
+        current.spans.append(entry)
+    observe(name, duration_s, status)
+
+
+def observe(name, duration_s, status="ok"):
+    index = bisect.bisect_left(BUCKETS, duration_s)
+    with _hist_lock:
+        hist = _histograms.get((name, status))
+        if hist is None:
+            hist = _histograms[(name, status)] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+        hist[0][index] += 1
+        hist[1] += duration_s
+        hist[2] += 1
+
+
+@contextmanager
+def trace():
+    # Collects the spans recorded in this context, including asyncio tasks
+    # and run_in_context() threads started from it.
+    current = Trace()
+    token = _current.set(current) if AI_TRACE else None
+    try:
+        yield current
+    finally:
+        if token is not None:
+            _current.reset(token)
+
+
+def run_in_context(target):
+    # Wraps a thread target so spans it records go to the caller's trace.
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(target, *args, **kwargs)
+
+
+def process_age_s():
+    # Seconds since this process started (interpreter startup + imports
+    # before the first span); None where /proc isn't available.
+    try:
+        with open("/proc/self/stat") as f:
+            started_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime_s = float(f.read().split()[0])
+        return max(uptime_s - started_ticks / os.sysconf("SC_CLK_TCK"), 0.0)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def record_startup():
+    age = process_age_s()
+    if age is not None:
+        record("startup", time.time() - age, age)
+
+
+def snapshot():
+    # {"stage|status": {"buckets": [...], "sum": s, "count": n}}
+    with _hist_lock:
+        return {
+            f"{name}|{status}": {"buckets": list(hist[0]), "sum": round(hist[1], 6), "count": hist[2]}
+            for (name, status), hist in _histograms.items()
+        }
+
+
+def prometheus_text(histograms=None):
+    histograms = snapshot() if histograms is None else histograms
+    lines = [
+        f"# HELP {METRIC} Time spent per AI pipeline stage.",
+        f"# TYPE {METRIC} histogram",
+    ]
+    for key in sorted(histograms):
+        name, status = key.split("|", 1)
+        hist = histograms[key]
+        labels = f'stage="{name}",status="{status}"'
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ("+Inf",), hist["buckets"]):
+            cumulative += count
+            lines.append(f'{METRIC}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f"{METRIC}_sum{{{labels}}} {hist['sum']}")
+        lines.append(f"{METRIC}_count{{{labels}}} {hist['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def merge(snapshots):
+    merged = {}
+    for histograms in snapshots:
+        for key, hist in histograms.items():
+            into = merged.setdefault(key, {"buckets": [0] * (len(BUCKETS) + 1), "sum": 0.0, "count": 0})
+            into["buckets"] = [a + b for a, b in zip(into["buckets"], hist["buckets"])]
+            into["sum"] = round(into["sum"] + hist["sum"], 6)
+            into["count"] += hist["count"]
+    return merged
+
+
+def export_redis(client=None):
+    import redis_pool
+
+    client = client or redis_pool.get_client()
+    field = f"{socket.gethostname()}:{os.getpid()}"
+    pipe = client.pipeline(transaction=False)
+    pipe.hset(AI_TRACE_REDIS_KEY, field, json.dumps({"updated": time.time(), "histograms": snapshot()}))
+    pipe.expire(AI_TRACE_REDIS_KEY, AI_TRACE_REDIS_TTL)
+    pipe.execute()
+
+
+def load_redis(client=None):
+    # Merged histograms of every process that exported recently.
+    import redis_pool
+
+    client = client or redis_pool.get_client()
+    cutoff = time.time() - AI_TRACE_REDIS_TTL
+    snapshots, stale = [], []
+    for field, raw in client.hgetall(AI_TRACE_REDIS_KEY).items():
+        data = json.loads(raw)
+        if data.get("updated", 0) >= cutoff:
+            snapshots.append(data["histograms"])
+        else:
+            stale.append(field)  # process gone
+    if stale:
+        client.hdel(AI_TRACE_REDIS_KEY, *stale)
+    return merge(snapshots)
+
+
+if __name__ == "__main__":
+    print(prometheus_text(load_redis()), end="")
@@ -0,0 +1,343 @@
+# train_pipeline.py
+# Retraining pipeline for the tree models (irrigation RandomForest from
+# "hardware codescripts/Randomforest.py", and a RandomForest yield model).
+#
+#   1. load   the CSV is read in chunks (only the needed columns, float32), and
+#             the encoded X / y are cached under TRAIN_CACHE_DIR, keyed by the
+#             file's sha1 and the feature spec, so re-runs skip parsing.
+#   2. search every hyperparameter candidate is fitted in a process pool; the
+#             workers memory-map the cached matrices instead of receiving copies.
+#   3. fit    the best candidate is refitted on the training split using all cores.
+#   4. write  a versioned artifact dir, ARTIFACT_DIR/<preset>/vNNN/:
+#               model.pkl, features.pkl   (what yeild/model_service.load_model reads)
+#               stage_encoder.pkl         (presets with a categorical column)
+#               stage_encoder.classes.json (its classes, read by serving)
+#               metrics.json              (params, scores, data digest, timings)
+#   5. --promote swaps the version in over the serving files and the
+#             compiled tree export (tree_engine.py), each renamed into place.
+#
+#   python train_pipeline.py irrigation DATA.csv [--grid '{"max_depth": [8, 12]}'] [--promote]
+#   python train_pipeline.py yield DATA.csv --target Yield [--jobs 4]
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+
+from irrigation_service import classes_path, export_stage_classes
+from tree_engine import compiled_path, export_model, file_digest
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+HARDWARE_DIR = os.path.join(BASE_DIR, "..", "..", "..", "hardware codescripts")
+
+CACHE_DIR = os.getenv("TRAIN_CACHE_DIR", os.path.join(BASE_DIR, ".train_cache"))
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", os.path.join(BASE_DIR, "artifacts"))
+CHUNK_ROWS = int(os.getenv("TRAIN_CHUNK_ROWS", "200000"))
+
+PRESETS = {
+    "irrigation": {
+        "features": ["crop_stage", "temperature", "humidity", "soil_moisture"],
+        "categorical": ["crop_stage"],
+        "target": "recommended_irrigation_minutes",
+        "model_path": os.path.join(HARDWARE_DIR, "irrigation_model.pkl"),
+        "encoder_path": os.path.join(HARDWARE_DIR, "stage_encoder.pkl"),
+        "features_path": None,
+    },
+    "yield": {
+        "features": [
+            "Cumulative_Rainfall", "Average_Temperature", "Average_Soil_Moisture",
+            "Average_Humidity", "Average_Wind_Speed",
+        ],
+        "categorical": [],
+        "target": "Yield",
+        "model_path": os.path.join(BASE_DIR, "yeild", "mp_yield_model.pkl"),
+        "encoder_path": None,
+        "features_path": os.path.join(BASE_DIR, "yeild", "mp_yield_features.pkl"),
+    },
+}
+
+DEFAULT_GRID = {
+    "n_estimators": [100, 200],
+    "max_depth": [8, 12, None],
+    "min_samples_leaf": [1, 5],
+    "max_features": [1.0, 0.6],
+}
+
+
+def _cache_key(csv_path, features, categorical, target):
+    spec = json.dumps([file_digest(csv_path), features, categorical, target])
+    return hashlib.sha1(spec.encode("utf-8")).hexdigest()[:20]
+
+
+def encode_csv(csv_path, features, categorical, target, chunk_rows=CHUNK_ROWS):
+    # Returns X (float32, FEATURES order), y (float32) and {column: sorted classes}.
+    # Categories get provisional codes while streaming and are remapped to
+    # sorted order at the end, matching LabelEncoder.
+    import pandas as pd
+
+    provisional = {column: {} for column in categorical}
+    X_parts, y_parts = [], []
+    dtypes = {column: "float32" for column in features + [target] if column not in categorical}
+    for chunk in pd.read_csv(csv_path, usecols=features + [target], dtype=dtypes, chunksize=chunk_rows):
+        chunk = chunk.dropna()
+        X = np.empty((len(chunk), len(features)), dtype=np.float32)
+        for j, column in enumerate(features):
+            if column in categorical:
+                codes = provisional[column]
+                X[:, j] = [codes.setdefault(str(v), len(codes)) for v in chunk[column]]
+            else:
+                X[:, j] = chunk[column].to_numpy()
+        X_parts.append(X)
+        y_parts.append(chunk[target].to_numpy(dtype=np.float32))
+
+    X = np.concatenate(X_parts) if X_parts else np.empty((0, len(features)), dtype=np.float32)
+    y = np.concatenate(y_parts) if y_parts else np.empty(0, dtype=np.float32)
+
+    classes = {}
+    for column, codes in provisional.items():
+        ordered = sorted(codes)
+        remap = np.empty(len(codes), dtype=np.float32)
+        for name, code in codes.items():
+            remap[code] = ordered.index(name)
+        j = features.index(column)
+        X[:, j] = remap[X[:, j].astype(np.int64)]
+        classes[column] = ordered
+    return X, y, classes
+
+
+def load_dataset(csv_path, preset, target, use_cache=True):
+    # Returns (X_path, y_path, classes, cache_hit); the matrices live in .npy
+    # files so search workers can mmap them.
+    features, categorical = preset["features"], preset["categorical"]
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    key = _cache_key(csv_path, features, categorical, target)
+    X_path = os.path.join(CACHE_DIR, key + ".X.npy")
+    y_path = os.path.join(CACHE_DIR, key + ".y.npy")
+    meta_path = os.path.join(CACHE_DIR, key + ".json")
+
+    if use_cache and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            return X_path, y_path, json.load(f)["classes"], True
+
+    X, y, classes = encode_csv(csv_path, features, categorical, target)
+    np.save(X_path, X)
+    np.save(y_path, y)
+    # Written last: its presence marks a complete cache entry.
+    with open(meta_path, "w") as f:
+        json.dump({"csv": os.path.abspath(csv_path), "rows": int(len(y)), "classes": classes}, f)
+    return X_path, y_path, classes, False
+
+
+def split_indices(n_rows, test_size, seed):
+    order = np.random.default_rng(seed).permutation(n_rows)
+    n_test = int(round(n_rows * test_size))
+    return order[n_test:], order[:n_test]
+
+
+def expand_grid(grid):
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+
+
+def _new_forest(params, n_jobs, seed):
+    from sklearn.ensemble import RandomForestRegressor
+    return RandomForestRegressor(random_state=seed, n_jobs=n_jobs, **params)
+
+
+def _r2(y_true, y_pred):
+    ss_res = float(np.sum((y_true - y_pred) ** 2))
+    ss_tot = float(np.sum((y_true - y_true.mean()) ** 2))
+    return 1.0 - ss_res / ss_tot if ss_tot else 0.0
+
+
+def _evaluate_candidate(task):
+    # Runs in a pool worker: one core per candidate, data read through mmap.
+    params, X_path, y_path, train_idx, val_idx, seed = task
+    X = np.load(X_path, mmap_mode="r")
+    y = np.load(y_path, mmap_mode="r")
+    started = time.perf_counter()
+    model = _new_forest(params, n_jobs=1, seed=seed)
+    model.fit(X[train_idx], y[train_idx])
+    score = _r2(np.asarray(y[val_idx]), model.predict(X[val_idx]))
+    return {"params": params, "val_r2": round(score, 5), "fit_s": round(time.perf_counter() - started, 3)}
+
+
+def search(candidates, X_path, y_path, train_idx, seed, jobs, search_rows):
+    # Candidates are scored on a validation slice of the training split; the
+    # search may use a subsample (search_rows) to keep big grids affordable.
+    rng = np.random.default_rng(seed + 1)
+    idx = train_idx if search_rows <= 0 or len(train_idx) <= search_rows else rng.choice(
+        train_idx, search_rows, replace=False
+    )
+    fit_idx, val_idx = idx[: int(len(idx) * 0.8)], idx[int(len(idx) * 0.8):]
+    tasks = [(params, X_path, y_path, fit_idx, val_idx, seed) for params in candidates]
+    if jobs <= 1 or len(tasks) == 1:
+        return [_evaluate_candidate(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(_evaluate_candidate, tasks))
+
+
+def next_version_dir(preset_name):
+    root = os.path.join(ARTIFACT_DIR, preset_name)
+    os.makedirs(root, exist_ok=True)
+    versions = [int(d[1:]) for d in os.listdir(root) if d.startswith("v") and d[1:].isdigit()]
+    return os.path.join(root, f"v{max(versions, default=0) + 1:03d}")
+
+
+def write_artifacts(out_dir, model, features, classes, metrics):
+    from sklearn.preprocessing import LabelEncoder
+
+    os.makedirs(out_dir)
+    joblib.dump(model, os.path.join(out_dir, "model.pkl"))
+    joblib.dump(list(features), os.path.join(out_dir, "features.pkl"))
+    if classes:
+        # Same LabelEncoder file Randomforest.py writes; presets have one categorical column.
+        (names,) = classes.values()
+        encoder = LabelEncoder()
+        encoder.classes_ = np.asarray(names, dtype=object)
+        joblib.dump(encoder, os.path.join(out_dir, "stage_encoder.pkl"))
+        # Its classes as JSON, which serving reads instead of the pickle.
+        export_stage_classes(os.path.join(out_dir, "stage_encoder.pkl"))
+    with open(os.path.join(out_dir, "metrics.json"), "w") as f:
+        json.dump(metrics, f, indent=2)
+
+
+def _replace_file(src, dst):
+    # Copy next to dst, then rename over it: readers see the old file or the
+    # new one, never a partial copy.
+    tmp = f"{dst}.tmp-{os.getpid()}"
+    shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+def _replace_export(model, features, source_path, model_path):
+    # Build the compiled export aside, then swap the directory in. Readers with
+    # the old arrays memory-mapped keep them; in the moment between the two
+    # renames there is no export and load_model falls back to the pickle.
+    out_dir = compiled_path(model_path)
+    tmp, old = f"{out_dir}.tmp-{os.getpid()}", f"{out_dir}.old-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    export_model(model, tmp, features, source_path=source_path)
+    if os.path.exists(out_dir):
+        os.replace(out_dir, old)
+    os.replace(tmp, out_dir)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def promote(version_dir, preset):
+    # Swap a version in over the serving files. The export goes first and the
+    # model pickle last, each written aside and renamed into place: the worker
+    # reloads on the artifacts' mtime (worker.py _refresh_yield_model,
+    # irrigation_service.load_model), so by
+    # the time the new pickle is visible its compiled export already matches
+    # it, and a reload never reads a half-written file.
+    model_path = preset["model_path"]
+    source_path = os.path.join(version_dir, "model.pkl")
+    model = joblib.load(source_path)
+    features = joblib.load(os.path.join(version_dir, "features.pkl"))
+    _replace_export(model, features, source_path, model_path)
+    if preset["encoder_path"]:
+        _replace_file(
+            os.path.join(version_dir, "stage_encoder.classes.json"), classes_path(preset["encoder_path"])
+        )
+        _replace_file(os.path.join(version_dir, "stage_encoder.pkl"), preset["encoder_path"])
+    if preset["features_path"]:
+        _replace_file(os.path.join(version_dir, "features.pkl"), preset["features_path"])
+    _replace_file(source_path, model_path)
+    return model_path
+
+
+def run(args):
+    preset = PRESETS[args.preset]
+    target = args.target or preset["target"]
+    timings = {}
+
+    started = time.perf_counter()
+    X_path, y_path, classes, cache_hit = load_dataset(args.csv, preset, target, use_cache=not args.no_cache)
+    X = np.load(X_path, mmap_mode="r")
+    y = np.load(y_path, mmap_mode="r")
+    timings["load_s"] = round(time.perf_counter() - started, 3)
+    if not len(y):
+        raise ValueError(f"No usable rows in {args.csv}")
+
+    train_idx, test_idx = split_indices(len(y), args.test_size, args.seed)
+    candidates = expand_grid(json.loads(args.grid) if args.grid else DEFAULT_GRID)
+
+    started = time.perf_counter()
+    results = search(candidates, X_path, y_path, train_idx, args.seed, args.jobs, args.search_rows)
+    timings["search_s"] = round(time.perf_counter() - started, 3)
+    results.sort(key=lambda r: r["val_r2"], reverse=True)
+    best = results[0]["params"]
+
+    started = time.perf_counter()
+    model = _new_forest(best, n_jobs=-1, seed=args.seed)
+    model.fit(X[train_idx], y[train_idx])
+    timings["fit_s"] = round(time.perf_counter() - started, 3)
+    # Serving loads the model with default settings, not with every core.
+    model.n_jobs = None
+
+    test_r2 = _r2(np.asarray(y[test_idx]), model.predict(X[test_idx])) if len(test_idx) else None
+    metrics = {
+        "preset": args.preset,
+        "target": target,
+        "features": preset["features"],
+        "classes": classes,
+        "csv": os.path.abspath(args.csv),
+        "csv_sha1": file_digest(args.csv),
+        "rows": int(len(y)),
+        "train_rows": int(len(train_idx)),
+        "test_rows": int(len(test_idx)),
+        "cache_hit": cache_hit,
+        "best_params": best,
+        "test_r2": round(test_r2, 5) if test_r2 is not None else None,
+        "search": results,
+        "timings": timings,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+    version_dir = next_version_dir(args.preset)
+    write_artifacts(version_dir, model, preset["features"], classes, metrics)
+    summary = {
+        "version_dir": version_dir,
+        "best_params": best,
+        "test_r2": metrics["test_r2"],
+        "rows": metrics["rows"],
+        "cache_hit": cache_hit,
+        "timings": timings,
+    }
+    if args.promote:
+        summary["promoted_to"] = promote(version_dir, preset)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunked, parallel retraining of the tree models")
+    parser.add_argument("preset", choices=sorted(PRESETS))
+    parser.add_argument("csv")
+    parser.add_argument("--target", help="target column (default from the preset)")
+    parser.add_argument("--grid", help="JSON {param: [values]} replacing the default search grid")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="search processes")
+    parser.add_argument("--search-rows", type=int, default=200000, help="rows sampled for the search (0 = all)")
+    parser.add_argument("--test-size", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-cache", action="store_true", help="re-encode the CSV even if cached")
+    parser.add_argument("--promote", action="store_true", help="install as the serving model")
+    args = parser.parse_args()
+
+    try:
+        print(json.dumps(run(args)))
+    except (OSError, ValueError) as e:
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
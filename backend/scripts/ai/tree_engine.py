@@ -0,0 +1,274 @@
+# tree_engine.py
+# Flat-array tree ensemble engine.
+#
+# export: converts a fitted sklearn RandomForestRegressor or XGBRegressor into
+#         plain NumPy arrays (feature, threshold, children, default_left, value,
+#         roots) stored as .npy files next to a meta.json. Leaves point back at
+#         themselves, so every row can take exactly max_depth steps.
+# load:   memory-maps those arrays (np.load(mmap_mode="r")), so startup is an
+#         mmap and the pages are shared by every worker process.
+# predict: walks all trees for the whole batch at once, one tree level per step.
+#
+# Usage:
+#   python tree_engine.py export MODEL.pkl [OUT_DIR] [--features FEATURES.pkl]
+#   python tree_engine.py verify MODEL.pkl [OUT_DIR] [--rows 1000]
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+ARRAYS = ("feature", "threshold", "children", "default_left", "value", "roots")
+LEAF = -1
+CHUNK_ROWS = 256
+
+
+def compiled_path(model_path):
+    root, _ = os.path.splitext(model_path)
+    return root + ".trees"
+
+
+def _sklearn_trees(model):
+    trees = []
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        is_leaf = tree.children_left == LEAF
+        missing_left = getattr(tree, "missing_go_to_left", None)
+        trees.append({
+            "feature": np.where(is_leaf, LEAF, tree.feature),
+            "threshold": tree.threshold,
+            "left": tree.children_left,
+            "right": tree.children_right,
+            "default_left": missing_left if missing_left is not None else np.zeros(tree.node_count),
+            "value": tree.value[:, 0, 0],
+        })
+    meta = {"kind": "sklearn_forest", "aggregate": "mean", "compare": "le", "base_score": 0.0}
+    return trees, meta
+
+
+def _xgboost_trees(model):
+    booster = model.get_booster()
+    dump = json.loads(booster.save_raw("json"))["learner"]
+    if dump["objective"]["name"] != "reg:squarederror":
+        raise ValueError(f"Unsupported XGBoost objective: {dump['objective']['name']}")
+
+    trees = []
+    for tree in dump["gradient_booster"]["model"]["trees"]:
+        left = np.asarray(tree["left_children"])
+        is_leaf = left == LEAF
+        conditions = np.asarray(tree["split_conditions"], dtype=np.float32)
+        trees.append({
+            "feature": np.where(is_leaf, LEAF, np.asarray(tree["split_indices"])),
+            # For leaves XGBoost keeps the (already scaled) leaf weight in split_conditions.
+            "threshold": np.where(is_leaf, 0.0, conditions),
+            "left": left,
+            "right": np.asarray(tree["right_children"]),
+            "default_left": np.asarray(tree["default_left"]),
+            "value": np.where(is_leaf, conditions, 0.0),
+        })
+
+    base_score = float(dump["learner_model_param"]["base_score"].strip("[]"))
+    meta = {"kind": "xgboost", "aggregate": "sum", "compare": "lt", "base_score": base_score}
+    return trees, meta
+
+
+def _tree_depth(left, right):
+    depth = np.zeros(len(left), dtype=np.int64)
+    for node in range(len(left)):
+        for child in (left[node], right[node]):
+            if child != LEAF:
+                depth[child] = depth[node] + 1
+    return int(depth.max())
+
+
+def flatten(model):
+    if hasattr(model, "get_booster"):
+        trees, meta = _xgboost_trees(model)
+    elif hasattr(model, "estimators_") and hasattr(model.estimators_[0], "tree_"):
+        trees, meta = _sklearn_trees(model)
+    else:
+        raise ValueError(f"Unsupported model type: {type(model).__name__}")
+
+    arrays = {name: [] for name in ARRAYS if name != "roots"}
+    roots = []
+    offset = 0
+    max_depth = 0
+    for tree in trees:
+        left = np.asarray(tree["left"], dtype=np.int64)
+        right = np.asarray(tree["right"], dtype=np.int64)
+        is_leaf = left == LEAF
+        nodes = np.arange(len(left)) + offset
+        max_depth = max(max_depth, _tree_depth(left, right))
+        roots.append(offset)
+        # Child indices become global positions in the flat arrays; leaves loop
+        # to themselves on feature 0 so the traversal needs no leaf mask.
+        arrays["children"].append(np.stack([
+            np.where(is_leaf, nodes, left + offset),
+            np.where(is_leaf, nodes, right + offset),
+        ], axis=1))
+        arrays["feature"].append(np.where(is_leaf, 0, tree["feature"]))
+        for name in ("threshold", "default_left", "value"):
+            arrays[name].append(tree[name])
+        offset += len(left)
+
+    flat = {
+        "feature": np.concatenate(arrays["feature"]).astype(np.int32),
+        "threshold": np.concatenate(arrays["threshold"]).astype(np.float64),
+        "children": np.ascontiguousarray(np.concatenate(arrays["children"]), dtype=np.int32),
+        "default_left": np.concatenate(arrays["default_left"]).astype(np.bool_),
+        "value": np.concatenate(arrays["value"]).astype(np.float64),
+        "roots": np.asarray(roots, dtype=np.int32),
+    }
+    meta.update({
+        "n_trees": len(trees),
+        "n_nodes": offset,
+        "max_depth": max_depth,
+        "n_features": int(getattr(model, "n_features_in_", 0)),
+    })
+    return flat, meta
+
+
+def file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def export_model(model, out_dir, feature_names=None, source_path=None):
+    flat, meta = flatten(model)
+    meta["source_sha1"] = file_digest(source_path) if source_path else None
+    if feature_names is None and hasattr(model, "feature_names_in_"):
+        feature_names = list(model.feature_names_in_)
+    meta["feature_names"] = list(feature_names) if feature_names is not None else None
+
+    os.makedirs(out_dir, exist_ok=True)
+    for name, array in flat.items():
+        np.save(os.path.join(out_dir, name + ".npy"), array)
+    # meta.json is written last; its presence marks a complete export.
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+class CompiledForest:
+    def __init__(self, arrays, meta):
+        self.meta = meta
+        self.feature_names = meta.get("feature_names")
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self._le = meta["compare"] == "le"
+        self._mean = meta["aggregate"] == "mean"
+        self._base_score = meta["base_score"]
+        self._max_depth = meta["max_depth"]
+
+    def predict(self, X):
+        # Both sklearn and XGBoost compare float32 feature values.
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        if len(X) <= CHUNK_ROWS:
+            return self._predict_chunk(X)
+        # Chunking keeps the (rows x trees) node matrix cache-sized.
+        return np.concatenate([
+            self._predict_chunk(X[start:start + CHUNK_ROWS])
+            for start in range(0, len(X), CHUNK_ROWS)
+        ])
+
+    def _predict_chunk(self, X):
+        n_rows = X.shape[0]
+        rows = np.arange(n_rows)[:, None]
+        node = np.repeat(self.roots[None, :], n_rows, axis=0)
+
+        has_missing = np.isnan(X).any()
+
+        for _ in range(self._max_depth):
+            x = X[rows, self.feature[node]]
+            threshold = self.threshold[node]
+            go_left = x <= threshold if self._le else x < threshold
+            if has_missing:
+                go_left = np.where(np.isnan(x), self.default_left[node], go_left)
+            node = self.children[node, (~go_left).view(np.int8)]
+
+        leaves = self.value[node]
+        if self._mean:
+            return leaves.mean(axis=1)
+        return leaves.sum(axis=1) + self._base_score
+
+
+def load_compiled(path, mmap=True):
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    mode = "r" if mmap else None
+    arrays = {name: np.load(os.path.join(path, name + ".npy"), mmap_mode=mode) for name in ARRAYS}
+    return CompiledForest(arrays, meta)
+
+
+def is_current(model_path, path=None):
+    # A compiled export is usable only if it was built from this exact pickle.
+    path = path or compiled_path(model_path)
+    meta_path = os.path.join(path, "meta.json")
+    if not os.path.exists(meta_path):
+        return False
+    with open(meta_path) as f:
+        source_sha1 = json.load(f).get("source_sha1")
+    return source_sha1 == file_digest(model_path)
+
+
+def _verify(model, forest, rows, seed=0):
+    rng = np.random.default_rng(seed)
+    n_features = forest.meta["n_features"] or int(forest.feature.max()) + 1
+    X = np.empty((rows, n_features))
+    internal = forest.children[:, 0] != np.arange(len(forest.children))
+    for j in range(n_features):
+        thresholds = forest.threshold[internal & (forest.feature == j)]
+        low, high = (thresholds.min(), thresholds.max()) if len(thresholds) else (0.0, 1.0)
+        span = (high - low) or 1.0
+        X[:, j] = rng.uniform(low - 0.1 * span, high + 0.1 * span, rows)
+
+    expected = model.predict(X)
+    actual = forest.predict(X)
+    max_abs = float(np.max(np.abs(expected - actual)))
+
+    def timed(fn, repeat=200):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn(X[:1])
+        return (time.perf_counter() - start) / repeat * 1000
+
+    return {
+        "rows": rows,
+        "max_abs_diff": max_abs,
+        "single_row_ms_original": round(timed(model.predict), 4),
+        "single_row_ms_compiled": round(timed(forest.predict), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export / verify flat-array tree ensembles")
+    parser.add_argument("command", choices=["export", "verify"])
+    parser.add_argument("model_path")
+    parser.add_argument("out_dir", nargs="?")
+    parser.add_argument("--features", help="joblib file with the feature column list")
+    parser.add_argument("--rows", type=int, default=1000)
+    args = parser.parse_args()
+
+    import joblib
+
+    model = joblib.load(args.model_path)
+    out_dir = args.out_dir or compiled_path(args.model_path)
+
+    if args.command == "export":
+        feature_names = joblib.load(args.features) if args.features else None
+        meta = export_model(model, out_dir, feature_names, source_path=args.model_path)
+        print(json.dumps({"out_dir": out_dir, **meta}))
+    else:
+        print(json.dumps(_verify(model, load_compiled(out_dir), args.rows)))
+
+
+if __name__ == "__main__":
+    main()
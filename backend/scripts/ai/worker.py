@@ -0,0 +1,321 @@
+# worker.py
+# Long-lived AI worker. Loads the models once and serves the analytics scripts
+# over a JSON-lines protocol, either on stdin/stdout (default, used by AiService)
+# or on a unix socket (--socket PATH).
+#
+# Request:  {"id": 1, "op": "dryness_prediction", "data": {...}}
+# Response: {"id": 1, "ok": true, "result": {...}}
+#           {"id": 1, "ok": false, "error": "..."}
+# A request with "stream": true to an op in STREAMING_OPS also gets
+#           {"id": 1, "delta": "..."}
+# lines with partial output before its response.
+
+import argparse
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import redis
+
+import dryness_prediction
+import health_index
+import irrigation_service
+import model_memo
+import yield_prediction
+import yield_scenarios
+import advisory_adapter
+import chatbot_adapter
+import tracing
+import redis_pool
+import sensor_stats
+import history_store
+import season_features
+from model_service import artifacts_mtime, load_model, model_version, predict_yield_batch
+
+MAX_THREADS = int(os.getenv("AI_WORKER_THREADS", "8"))
+# Publish stage histograms to Redis this often (0 = never); see tracing.py.
+TRACE_EXPORT_S = float(os.getenv("AI_TRACE_EXPORT_S", "15"))
+# How often the yield model's artifacts are checked for a retrained model.
+MODEL_RELOAD_CHECK_S = float(os.getenv("MODEL_RELOAD_CHECK_S", "30"))
+
+# Ops that take an on_delta callback for partial output.
+STREAMING_OPS = {"chatbot_adapter"}
+
+
+class Worker:
+    def __init__(self):
+        self.started_at = time.time()
+        self.handled = 0
+        self.failed = 0
+        self.model = None
+        self.feature_columns = None
+        self.model_error = None
+        self.scenarios = None
+        self.model_mtime = None
+        self.model_checked_at = time.time()
+        self.memo = model_memo.get_memo()
+        self.season = season_features.get_aggregator()
+        self._count_lock = threading.Lock()
+        self._model_lock = threading.Lock()
+
+        try:
+            self._load_yield_model()
+        except Exception as e:
+            # Keep serving the other analytics; yield requests report the error.
+            self.model_error = str(e)
+
+        try:
+            irrigation_service.load_model()
+        except Exception:
+            pass  # reported per request
+
+        self.ops = {
+            "healthcheck": self.healthcheck,
+            "dryness_prediction": self.dryness,
+            "health_index": self.health_index,
+            "sensor_stats": self.sensor_check,
+            "yield_prediction": self.yield_prediction,
+            "yield_batch": self.yield_batch,
+            "yield_scenarios": self.yield_scenarios,
+            "health_index_batch": self.health_index_batch,
+            "dryness_batch": self.dryness_batch,
+            "dryness_windowed": self.dryness_windowed,
+            "history_store": self.history,
+            "irrigation_service": self.irrigation,
+            "irrigation_batch": self.irrigation_batch,
+            "advisory_adapter": self.advisory,
+            "chatbot_adapter": self.chatbot,
+            "metrics": self.metrics,
+        }
+
+    def _load_yield_model(self):
+        mtime = artifacts_mtime()
+        model, feature_columns = load_model()
+        self.model, self.feature_columns = model, feature_columns
+        self.scenarios = yield_scenarios.ScenarioRunner(model, feature_columns)
+        # Memoized predictions of the previous model are dropped with its version.
+        self.memo.set_version("yield_prediction", model_version())
+        self.model_mtime = mtime
+        self.model_error = None
+
+    def _refresh_yield_model(self):
+        # Reload after a retrain (see train_pipeline.py), checked every MODEL_RELOAD_CHECK_S.
+        if time.time() - self.model_checked_at < MODEL_RELOAD_CHECK_S:
+            return
+        with self._model_lock:
+            if time.time() - self.model_checked_at < MODEL_RELOAD_CHECK_S:
+                return
+            self.model_checked_at = time.time()
+            try:
+                if artifacts_mtime() != self.model_mtime:
+                    self._load_yield_model()
+            except Exception as e:
+                if self.model is None:
+                    self.model_error = str(e)
+
+    def healthcheck(self, data):
+        return {
+            "status": "ok",
+            "pid": os.getpid(),
+            "uptime_s": round(time.time() - self.started_at, 3),
+            "handled": self.handled,
+            "failed": self.failed,
+            "yield_model_loaded": self.model is not None,
+            "yield_model_error": self.model_error,
+            "memo": self.memo.stats(),
+        }
+
+    def metrics(self, data):
+        # Stage latency histograms of this process, as Prometheus text.
+        return {"prometheus": tracing.prometheus_text()}
+
+    def sensor_check(self, data):
+        # Pre-filter: the reading against its farm's running statistics.
+        return sensor_stats.get_stats().check(data)
+
+    def dryness(self, data):
+        return {"prediction": self.memo.get_or_compute("dryness_prediction", data, dryness_prediction.days_remaining)}
+
+    def health_index(self, data):
+        return {"index": self.memo.get_or_compute("health_index", data, health_index.score)}
+
+    def health_index_batch(self, data):
+        # data: {"records": [sensor_payload, ...]}
+        return {"index": health_index.score_records(data.get("records") or []).tolist()}
+
+    def dryness_batch(self, data):
+        moisture = [r.get("moisture", 50) for r in data.get("records") or []]
+        return {"prediction": dryness_prediction.days_remaining_batch(moisture).tolist()}
+
+    def dryness_windowed(self, data):
+        # data: {"moisture": [[...], ...] per farm, "times_days": [...], "window": n}
+        days, rate = dryness_prediction.days_remaining_windowed(
+            data["moisture"], data["times_days"], data.get("window", dryness_prediction.WINDOW)
+        )
+        return {"prediction": days.tolist(), "evap_rate": rate.tolist()}
+
+    def history(self, data):
+        # data: a history query (see history_store.query); reads memory-mapped segments
+        try:
+            return history_store.query(data)
+        except ValueError as e:
+            return {"error": str(e)}
+
+    def _predict_yields(self, records):
+        model, feature_columns = self.model, self.feature_columns
+        return predict_yield_batch(model, feature_columns, [yield_prediction.to_farm_data(r) for r in records])
+
+    def yield_prediction(self, data):
+        self._refresh_yield_model()
+        if self.model is None:
+            return {"prediction": 0, "error": self.model_error}
+        records = self.season.with_season([data])  # season-to-date inputs, where the farm has them
+        predicted_yield = self.memo.get_or_compute_batch("yield_prediction", records, self._predict_yields)[0]
+        return {"prediction": predicted_yield if predicted_yield is not None else 0}
+
+    def yield_batch(self, data):
+        # data: {"records": [sensor_payload, ...]}; the misses are scored with one model.predict call
+        self._refresh_yield_model()
+        records = data.get("records") or []
+        if self.model is None:
+            return {"predictions": [0] * len(records), "error": self.model_error}
+        records = self.season.with_season(records)
+        predictions = self.memo.get_or_compute_batch("yield_prediction", records, self._predict_yields)
+        return {"predictions": [p if p is not None else 0 for p in predictions]}
+
+    def yield_scenarios(self, data):
+        # data: a scenario request (see yield_scenarios.py), scored in one batch
+        if self.scenarios is None:
+            return {"error": f"Yield model not loaded: {self.model_error}"}
+        try:
+            return self.scenarios.run(data)
+        except ValueError as e:
+            return {"error": str(e)}  # bad request; spawning the script wouldn't help
+
+    def irrigation(self, data):
+        return irrigation_service.plan(data)
+
+    def irrigation_batch(self, data):
+        # data: {"farms": {farm_id: state}} scored with one model.predict call per tick
+        return {"farms": irrigation_service.score_fleet(data.get("farms") or {})}
+
+    def advisory(self, data):
+        return advisory_adapter.build_advisory(data)
+
+    def chatbot(self, data, on_delta=None):
+        # Runs in the worker so the pooled LLM connections are reused across questions.
+        return chatbot_adapter.answer(data, on_delta=on_delta)
+
+    def handle(self, request, emit=None):
+        # emit(message) writes a line to the caller; used for "delta" lines.
+        request_id = request.get("id")
+        name = request.get("op")
+        op = self.ops.get(name)
+        try:
+            if op is None:
+                raise ValueError(f"Unknown op: {name}")
+            kwargs = {}
+            if request.get("stream") and emit is not None and name in STREAMING_OPS:
+                kwargs["on_delta"] = lambda delta: emit({"id": request_id, "delta": delta})
+            with tracing.span(f"worker.{name}"):
+                result = op(request.get("data") or {}, **kwargs)
+            response = {"id": request_id, "ok": True, "result": result}
+        except Exception as e:
+            response = {"id": request_id, "ok": False, "error": str(e)}
+
+        with self._count_lock:
+            self.handled += 1
+            if not response["ok"]:
+                self.failed += 1
+        return response
+
+    def handle_line(self, line, emit=None):
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            return {"id": None, "ok": False, "error": f"Invalid request: {e}"}
+        return self.handle(request, emit)
+
+
+def export_metrics_forever(interval_s):
+    while True:
+        time.sleep(interval_s)
+        if not redis_pool.available():
+            continue
+        try:
+            tracing.export_redis()
+        except redis.RedisError:
+            redis_pool.mark_down()
+
+
+def serve_stdio(worker, executor, out):
+    write_lock = threading.Lock()
+
+    def emit(message):
+        with write_lock:
+            out.write(json.dumps(message) + "\n")
+            out.flush()
+
+    def respond(line):
+        emit(worker.handle_line(line, emit))
+
+    for line in sys.stdin:
+        if line.strip():
+            executor.submit(respond, line)
+
+
+def serve_socket(worker, executor, path):
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            write_lock = threading.Lock()
+
+            def emit(message):
+                with write_lock:
+                    self.wfile.write((json.dumps(message) + "\n").encode())
+                    self.wfile.flush()
+
+            def respond(line):
+                emit(worker.handle_line(line, emit))
+
+            futures = []
+            for raw in self.rfile:
+                line = raw.decode().strip()
+                if line:
+                    futures.append(executor.submit(respond, line))
+            # Let in-flight answers go out before the connection closes.
+            for future in futures:
+                future.exception()
+
+    if os.path.exists(path):
+        os.unlink(path)
+    with socketserver.ThreadingUnixStreamServer(path, Handler) as server:
+        server.daemon_threads = True
+        server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Persistent AI analytics worker")
+    parser.add_argument("--socket", help="Serve on a unix socket instead of stdin/stdout")
+    parser.add_argument("--threads", type=int, default=MAX_THREADS)
+    args = parser.parse_args()
+
+    # The protocol owns stdout; anything the models print goes to stderr.
+    out = sys.stdout
+    sys.stdout = sys.stderr
+
+    worker = Worker()
+    if TRACE_EXPORT_S > 0 and tracing.enabled():
+        threading.Thread(target=export_metrics_forever, args=(TRACE_EXPORT_S,), daemon=True).start()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        if args.socket:
+            serve_socket(worker, executor, args.socket)
+        else:
+            serve_stdio(worker, executor, out)
+
+
+if __name__ == "__main__":
+    main()
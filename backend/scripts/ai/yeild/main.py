@@ -1,7 +1,35 @@
 # main.py
+# Usage:
+#   python main.py                 -> latest_farm_data -> latest_yield_prediction
+#   python main.py FARM_ID [...]   -> farm_data:<id>   -> yield_prediction:<id> (one batch)
 
-from model_service import load_model, predict_yield, format_prediction
-from redis_service import connect, get_farm_data, save_prediction
+import sys
+
+from model_service import load_model, predict_yield, predict_yield_batch, format_prediction
+from redis_service import (
+    connect, get_farm_data, save_prediction, get_farm_data_batch, save_predictions
+)
+
+
+def run_batch(redis_conn, model, feature_columns, farm_ids):
+    farm_data = get_farm_data_batch(redis_conn, farm_ids)
+    missing = [farm_id for farm_id in farm_ids if farm_id not in farm_data]
+    if missing:
+        print("No farm data found in Redis for:", ", ".join(missing))
+    if not farm_data:
+        return
+
+    ids = list(farm_data)
+    predicted_values = predict_yield_batch(model, feature_columns, [farm_data[i] for i in ids])
+
+    results = {
+        farm_id: format_prediction(value)
+        for farm_id, value in zip(ids, predicted_values)
+        if value is not None
+    }
+    save_predictions(redis_conn, results)
+
+    print(f"Saved {len(results)}/{len(farm_ids)} yield predictions to Redis")
 
 
 def main():
@@ -14,6 +42,11 @@ def main():
     model, feature_columns = load_model()
     print("Model Loaded Successfully")
 
+    farm_ids = sys.argv[1:]
+    if farm_ids:
+        run_batch(redis_conn, model, feature_columns, farm_ids)
+        return
+
     # Fetch farm data
     farm_data = get_farm_data(redis_conn)
 
@@ -39,4 +72,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,33 +1,82 @@
 # model_service.py
 
 import joblib
-import pandas as pd
+import numpy as np
 from datetime import datetime
+import hashlib
 import os
+import sys
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MODEL_PATH = os.path.join(BASE_DIR, "mp_yield_model.pkl")
 FEATURE_PATH = os.path.join(BASE_DIR, "mp_yield_features.pkl")
 
+# Flat-array export of the model (see ../tree_engine.py); used when it matches MODEL_PATH.
+USE_COMPILED = os.getenv("YIELD_COMPILED_MODEL", "true").lower() not in ("false", "0", "no")
+
+sys.path.append(os.path.dirname(BASE_DIR))
+from tree_engine import compiled_path, file_digest, is_current, load_compiled
+import tracing
+
+ARTIFACTS = (MODEL_PATH, FEATURE_PATH)
+
 def load_model():
-    model = joblib.load(MODEL_PATH)
-    features = joblib.load(FEATURE_PATH)
-    return model, features
+    with tracing.span("yield.load_model"):
+        features = joblib.load(FEATURE_PATH)
+        if USE_COMPILED and is_current(MODEL_PATH):
+            return load_compiled(compiled_path(MODEL_PATH)), features
+        model = joblib.load(MODEL_PATH)
+        return model, features
 
 
-def predict_yield(model, feature_columns, input_data):
+def model_version():
+    # Changes whenever the model is retrained; cached results are keyed on it.
+    digest = hashlib.sha1()
+    for path in ARTIFACTS:
+        digest.update(file_digest(path).encode("ascii"))
+    return digest.hexdigest()[:16]
+
+
+def artifacts_mtime():
+    return max(os.path.getmtime(path) for path in ARTIFACTS)
+
+
+def to_feature_matrix(feature_columns, records):
+    # One contiguous row per record in model column order; missing or
+    # non-numeric features become NaN so the row can be rejected.
+    matrix = np.full((len(records), len(feature_columns)), np.nan, dtype=np.float64)
+    for i, record in enumerate(records):
+        for j, column in enumerate(feature_columns):
+            try:
+                matrix[i, j] = float(record[column])
+            except (KeyError, TypeError, ValueError):
+                pass
+    return matrix
+
+
+def predict_yield_batch(model, feature_columns, records):
+    if not records:
+        return []
     try:
-        df = pd.DataFrame([input_data])
-        df = df[feature_columns]  # maintain correct order
-        prediction = model.predict(df)
-        return round(float(prediction[0]), 2)
+        matrix = to_feature_matrix(feature_columns, records)
+        valid = ~np.isnan(matrix).any(axis=1)
+        results = [None] * len(records)
+        if valid.any():
+            predictions = model.predict(matrix[valid])
+            for i, value in zip(np.flatnonzero(valid), predictions):
+                results[i] = round(float(value), 2)
+        return results
     except Exception as e:
         print("Prediction Error:", e)
-        return None
+        return [None] * len(records)
+
+
+def predict_yield(model, feature_columns, input_data):
+    return predict_yield_batch(model, feature_columns, [input_data])[0]
 
 
 def format_prediction(predicted_value):
     return {
         "predicted_yield_ton_per_hectare": predicted_value,
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    }
\ No newline at end of file
+    }
@@ -1,31 +1,40 @@
 # redis_service.py
 
-import redis
-import json
+import os
+import sys
 
-REDIS_HOST = "localhost"
-REDIS_PORT = 6379
-REDIS_DB = 0
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import redis_pool  # noqa: E402
 
 INPUT_KEY = "latest_farm_data"
 OUTPUT_KEY = "latest_yield_prediction"
 
+# Per-farm / per-request keys, e.g. farm_data:<id> -> yield_prediction:<id>
+INPUT_PREFIX = "farm_data:"
+OUTPUT_PREFIX = "yield_prediction:"
+RESULT_TTL = int(os.getenv("YIELD_RESULT_TTL", "3600"))
+
+# AiService JSON.parses the results, so they stay JSON whatever REDIS_CODEC says.
+RESULT_CODEC = redis_pool.JsonCodec()
+
 
 def connect():
-    return redis.Redis(
-        host=REDIS_HOST,
-        port=REDIS_PORT,
-        db=REDIS_DB,
-        decode_responses=True
-    )
+    # Binary client on the shared pool; values go through redis_pool's codecs.
+    return redis_pool.get_client(decode_responses=False)
 
 
 def get_farm_data(redis_conn):
-    data_json = redis_conn.get(INPUT_KEY)
-    if data_json:
-        return json.loads(data_json)
-    return None
+    return redis_pool.get_value(INPUT_KEY, client=redis_conn)
 
 
 def save_prediction(redis_conn, prediction_dict):
-    redis_conn.set(OUTPUT_KEY, json.dumps(prediction_dict))
\ No newline at end of file
+    redis_pool.set_value(OUTPUT_KEY, prediction_dict, codec=RESULT_CODEC, client=redis_conn)
+
+
+def get_farm_data_batch(redis_conn, farm_ids):
+    return redis_pool.get_farms(INPUT_PREFIX, farm_ids, client=redis_conn)
+
+
+def save_predictions(redis_conn, predictions):
+    # predictions: {farm_id: prediction_dict}, written in one pipelined round trip
+    redis_pool.set_farms(OUTPUT_PREFIX, predictions, ttl=RESULT_TTL, codec=RESULT_CODEC, client=redis_conn)
@@ -9,21 +9,31 @@ sys.path.append(os.path.join(BASE_DIR, 'yeild'))
 
 from model_service import load_model, predict_yield
 
+
+def to_farm_data(input_data):
+    moisture = input_data.get('moisture', 50.0)
+    temp = input_data.get('temperature', 25.0)
+    humidity = input_data.get('humidity', 50.0)
+
+    # Mapping to required features:
+    return {
+        'Cumulative_Rainfall': input_data.get('rainfall', 100.0), # Default mock if missing
+        'Average_Temperature': temp,
+        'Average_Soil_Moisture': moisture,
+        'Average_Humidity': humidity,
+        'Average_Wind_Speed': input_data.get('wind_speed', 10.0) # Default mock if missing
+    }
+
+
 def predict():
     try:
         input_data = json.loads(sys.argv[1])
-        moisture = input_data.get('moisture', 50.0)
-        temp = input_data.get('temperature', 25.0)
-        humidity = input_data.get('humidity', 50.0)
-        
-        # Mapping to required features:
-        farm_data = {
-            'Cumulative_Rainfall': input_data.get('rainfall', 100.0), # Default mock if missing
-            'Average_Temperature': temp,
-            'Average_Soil_Moisture': moisture,
-            'Average_Humidity': humidity,
-            'Average_Wind_Speed': input_data.get('wind_speed', 10.0) # Default mock if missing
-        }
+        try:
+            from season_features import get_aggregator
+            input_data = get_aggregator().with_season([input_data])[0]
+        except Exception:
+            pass  # no season aggregates; use the reading as is
+        farm_data = to_farm_data(input_data)
         
         model, feature_columns = load_model()
         predicted_yield = predict_yield(model, feature_columns, farm_data)
@@ -0,0 +1,322 @@
+# yield_scenarios.py
+# What-if sweeps for the yield model: how the predicted yield responds across
+# ranges of rainfall, temperature, soil moisture, humidity and wind speed.
+#
+# A request names a base reading and the variables to vary, either as a grid
+#
+#   {"base": {"moisture": 40, "temperature": 28, "humidity": 60},
+#    "grid": {"rainfall": {"min": 50, "max": 500, "steps": 10},
+#             "temperature": [22, 26, 30, 34]}}
+#
+# or as a Monte Carlo sample (uniform between min/max, or normal from
+# mean/std clipped to min/max)
+#
+#   {"base": {...}, "samples": 2000, "seed": 1,
+#    "vary": {"rainfall": {"mean": 250, "std": 60, "min": 0},
+#             "moisture": {"min": 20, "max": 70}}}
+#
+# All scenarios are expanded into one feature matrix and scored with a single
+# model.predict call. For the compiled tree model, rows that fall between the
+# same split thresholds on every feature get identical predictions, so only
+# one row per threshold bin is scored. Results are cached (LRU) per request
+# and model version.
+#
+# The response has yield statistics, the best and worst scenario, and a
+# sensitivity entry per varied variable: the mean yield at each grid value
+# (grid) or the correlation with yield (Monte Carlo), the yield change per
+# unit ("slope") and the spread it causes ("range"). "include_points": true
+# also returns every prediction.
+#
+#   python yield_scenarios.py '<json>'
+#   python yield_scenarios.py --bench [--points 1000]
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, 'yeild'))
+
+from model_service import load_model, model_version
+from yield_prediction import to_farm_data
+
+SCENARIO_MAX_POINTS = int(os.getenv("SCENARIO_MAX_POINTS", "50000"))
+SCENARIO_CACHE_SIZE = int(os.getenv("SCENARIO_CACHE_SIZE", "64"))
+
+# Request name -> model feature column (the keys of to_farm_data()).
+VARIABLES = {
+    "rainfall": "Cumulative_Rainfall",
+    "temperature": "Average_Temperature",
+    "moisture": "Average_Soil_Moisture",
+    "humidity": "Average_Humidity",
+    "wind_speed": "Average_Wind_Speed",
+}
+_ALIASES = dict(VARIABLES, **{column: column for column in VARIABLES.values()})
+PERCENTILES = (10, 50, 90)
+
+
+def _column(name):
+    column = _ALIASES.get(name)
+    if column is None:
+        raise ValueError(f"Unknown scenario variable: {name} (expected one of {', '.join(VARIABLES)})")
+    return column
+
+
+def _grid_values(name, spec):
+    if isinstance(spec, list):
+        values = np.asarray(spec, dtype=np.float64)
+    else:
+        steps = int(spec.get("steps", 10))
+        if steps < 1:
+            raise ValueError(f"{name}: steps must be at least 1")
+        values = np.linspace(float(spec["min"]), float(spec["max"]), steps)
+    if not len(values) or not np.isfinite(values).all():
+        raise ValueError(f"{name}: grid values must be finite numbers")
+    return values
+
+
+def _sample_values(name, spec, samples, rng):
+    low, high = spec.get("min"), spec.get("max")
+    if "mean" in spec:
+        values = rng.normal(float(spec["mean"]), float(spec.get("std", 0.0)), samples)
+        if low is not None or high is not None:
+            values = np.clip(values, low, high)
+    elif low is not None and high is not None:
+        values = rng.uniform(float(low), float(high), samples)
+    else:
+        raise ValueError(f"{name}: give min and max, or mean (and std)")
+    return values
+
+
+def expand(request, feature_columns):
+    # -> (matrix in feature_columns order, {column: per-row values},
+    #     {column: grid axis values} or None for Monte Carlo)
+    base = to_farm_data(request.get("base") or {})
+    grid = request.get("grid") or {}
+    vary = request.get("vary") or {}
+    if bool(grid) == bool(vary):
+        raise ValueError("Give either grid or vary")
+
+    axes = None
+    if grid:
+        axes = {_column(name): _grid_values(name, spec) for name, spec in grid.items()}
+        points = int(np.prod([len(values) for values in axes.values()]))
+    else:
+        points = int(request.get("samples", 1000))
+    if not 0 < points <= SCENARIO_MAX_POINTS:
+        raise ValueError(f"Scenario count must be between 1 and {SCENARIO_MAX_POINTS}, got {points}")
+
+    if grid:
+        mesh = np.meshgrid(*axes.values(), indexing="ij")
+        varied = {column: values.reshape(-1) for column, values in zip(axes, mesh)}
+    else:
+        rng = np.random.default_rng(request.get("seed"))
+        varied = {_column(name): _sample_values(name, spec, points, rng) for name, spec in vary.items()}
+
+    matrix = np.empty((points, len(feature_columns)), dtype=np.float64)
+    for j, column in enumerate(feature_columns):
+        if column in varied:
+            matrix[:, j] = varied[column]
+        else:
+            matrix[:, j] = float(base[column])
+    if not np.isfinite(matrix).all():
+        raise ValueError("Scenario inputs must be finite numbers")
+    return matrix, varied, axes
+
+
+def _threshold_bins(model, matrix):
+    # Per-row bin codes against the compiled model's split thresholds, or
+    # None when the model's thresholds aren't available.
+    feature = getattr(model, "feature", None)
+    if feature is None or matrix.shape[1] != model.meta.get("n_features"):
+        return None
+    internal = model.children[:, 0] != np.arange(len(model.children))
+    # The model compares float32 values, so bin them the same way.
+    values = matrix.astype(np.float32)
+    side = "left" if model.meta["compare"] == "le" else "right"
+    codes = np.empty(matrix.shape, dtype=np.int32)
+    for j in range(matrix.shape[1]):
+        thresholds = np.unique(model.threshold[internal & (feature == j)].astype(np.float32))
+        codes[:, j] = np.searchsorted(thresholds, values[:, j], side=side)
+    return codes
+
+
+def score(model, matrix):
+    # One predict call over the distinct rows, scattered back to every row.
+    codes = _threshold_bins(model, matrix)
+    keys = codes if codes is not None else matrix
+    _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    predictions = np.asarray(model.predict(matrix[first]), dtype=np.float64)
+    return predictions[inverse.reshape(-1)], len(first)
+
+
+def _stats(values):
+    stats = {
+        "mean": float(values.mean()),
+        "std": float(values.std()),
+        "min": float(values.min()),
+        "max": float(values.max()),
+    }
+    for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        stats[f"p{p}"] = float(value)
+    return {k: round(v, 3) for k, v in stats.items()}
+
+
+def _slope(x, y):
+    spread = x - x.mean()
+    denominator = float(spread @ spread)
+    return float(spread @ (y - y.mean()) / denominator) if denominator else 0.0
+
+
+def sensitivity(varied, predictions, axes):
+    result = {}
+    if axes is not None:
+        # Mean yield at each value of one axis, averaged over all the others.
+        cube = predictions.reshape([len(values) for values in axes.values()])
+        for axis, (column, axis_values) in enumerate(axes.items()):
+            others = tuple(i for i in range(cube.ndim) if i != axis)
+            marginal = cube.mean(axis=others) if others else cube
+            result[column] = {
+                "values": [round(float(v), 3) for v in axis_values],
+                "mean_yield": [round(float(v), 3) for v in marginal],
+                "slope": round(_slope(axis_values, marginal), 4),
+                "range": round(float(marginal.max() - marginal.min()), 3),
+            }
+    else:
+        centered = predictions - predictions.mean()
+        for column, values in varied.items():
+            std = values.std()
+            correlation = float(((values - values.mean()) @ centered) / (len(values) * std * predictions.std())) \
+                if std and predictions.std() else 0.0
+            slope = _slope(values, predictions)
+            low, high = np.percentile(values, (10, 90))
+            result[column] = {
+                "correlation": round(correlation, 4),
+                "slope": round(slope, 4),
+                # Yield change across the middle 80% of the sampled values.
+                "range": round(abs(slope) * float(high - low), 3),
+            }
+    return result
+
+
+def _scenario(feature_columns, row, prediction):
+    inputs = {column: round(float(value), 3) for column, value in zip(feature_columns, row)}
+    return {"inputs": inputs, "prediction": round(float(prediction), 2)}
+
+
+class ScenarioRunner:
+    def __init__(self, model=None, feature_columns=None, cache_size=SCENARIO_CACHE_SIZE):
+        if model is None:
+            model, feature_columns = load_model()
+        self.model = model
+        self.feature_columns = list(feature_columns)
+        self.version = model_version()
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, request):
+        raw = json.dumps([self.version, request], sort_keys=True, separators=(",", ":"))
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def run(self, request):
+        started = time.perf_counter()
+        cacheable = request.get("vary") is None or request.get("seed") is not None
+        key = self._key(request) if cacheable else None
+        if key is not None:
+            with self._lock:
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    return dict(cached, cached=True, elapsed_ms=round((time.perf_counter() - started) * 1000, 3))
+
+        matrix, varied, axes = expand(request, self.feature_columns)
+        predictions, scored = score(self.model, matrix)
+        best, worst = int(predictions.argmax()), int(predictions.argmin())
+        result = {
+            "mode": "grid" if axes is not None else "monte_carlo",
+            "points": len(predictions),
+            "scored": scored,
+            "varied": list(varied),
+            "shape": [len(values) for values in axes.values()] if axes is not None else None,
+            "summary": _stats(predictions),
+            "best": _scenario(self.feature_columns, matrix[best], predictions[best]),
+            "worst": _scenario(self.feature_columns, matrix[worst], predictions[worst]),
+            "sensitivity": sensitivity(varied, predictions, axes),
+        }
+        if request.get("include_points"):
+            result["predictions"] = np.round(predictions, 2).tolist()
+            if axes is None:
+                result["samples"] = {column: np.round(values, 3).tolist() for column, values in varied.items()}
+
+        if key is not None:
+            with self._lock:
+                self._cache[key] = result
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return dict(result, cached=False, elapsed_ms=round((time.perf_counter() - started) * 1000, 3))
+
+
+def bench(points):
+    from model_service import predict_yield
+
+    runner = ScenarioRunner()
+    side = max(1, round(points ** (1 / 3)))
+    request = {
+        "base": {"humidity": 60, "wind_speed": 8},
+        "grid": {
+            "rainfall": {"min": 50, "max": 600, "steps": side},
+            "temperature": {"min": 15, "max": 40, "steps": side},
+            "moisture": {"min": 20, "max": 80, "steps": side},
+        },
+    }
+    cold = runner.run(request)
+    warm = runner.run(request)
+    mc = runner.run({"base": request["base"], "samples": points, "seed": 1,
+                     "vary": {name: {"min": spec["min"], "max": spec["max"]} for name, spec in request["grid"].items()}})
+
+    matrix, _, _ = expand(request, runner.feature_columns)
+    rows = [dict(zip(runner.feature_columns, row)) for row in matrix]
+    started = time.perf_counter()
+    for row in rows:
+        predict_yield(runner.model, runner.feature_columns, row)
+    per_point_ms = (time.perf_counter() - started) * 1000
+
+    print(json.dumps({
+        "grid_points": cold["points"],
+        "grid_scored": cold["scored"],
+        "grid_ms": cold["elapsed_ms"],
+        "grid_cached_ms": warm["elapsed_ms"],
+        "monte_carlo_points": mc["points"],
+        "monte_carlo_ms": mc["elapsed_ms"],
+        "per_point_calls_ms": round(per_point_ms, 3),
+    }, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Yield what-if scenario sweeps")
+    parser.add_argument("request", nargs="?")
+    parser.add_argument("--bench", action="store_true", help="time a grid sweep against per-point predictions")
+    parser.add_argument("--points", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.bench:
+        bench(args.points)
+        return
+    try:
+        request = json.loads(args.request if args.request is not None else sys.stdin.read())
+        print(json.dumps(ScenarioRunner().run(request)))
+    except Exception as e:
+        # Same contract as the other scripts: always a JSON reply on stdout.
+        print(json.dumps({"error": str(e)}))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,20 +2,60 @@ const { spawn } = require('child_process');
 const path = require('path');
 const logger = require('../utils/logger.util');
 const redis = require('../config/redis.config');
+const { v4: uuidv4 } = require('uuid');
+const AiWorker = require('./ai.worker');
+
+const YIELD_KEY_TTL_SECONDS = 300;
+
+// Scripts the persistent worker can serve in-process (scripts/ai/worker.py)
+const WORKER_SCRIPTS = new Set([
+    'dryness_prediction.py',
+    'health_index.py',
+    'sensor_stats.py',
+    'irrigation_service.py',
+    'yield_prediction.py',
+    'yield_scenarios.py',
+    'history_store.py',
+    'advisory_adapter.py',
+    'chatbot_adapter.py'
+]);
 
 /**
  * Service to execute AI models via Python child processes.
  */
 class AiService {
-    static _yieldQueue = Promise.resolve();
+    /**
+     * Run an AI model script, through the persistent worker where it can serve it.
+     * Falls back to spawning the script only when the worker itself fails (timeout,
+     * exit, write error); errors raised by the script are returned as they are.
+     * @param {string} scriptName - Name of the script in scripts/ai/
+     * @param {object} inputData - JSON input data for the model
+     * @param {object} [options]
+     * @param {function} [options.onDelta] - Receives partial output of streaming scripts
+     *   (chatbot_adapter.py) as it is generated; only the worker streams, a spawned
+     *   script returns the whole result at once
+     * @returns {Promise<object>} - Parsed JSON result from stdout
+     */
+    static async runModel(scriptName, inputData, { onDelta = null } = {}) {
+        if (AiWorker.isEnabled() && WORKER_SCRIPTS.has(scriptName)) {
+            try {
+                return await AiWorker.request(scriptName.replace(/\.py$/, ''), inputData, { onDelta });
+            } catch (err) {
+                // The script itself failed; spawning it would fail the same way
+                if (err instanceof AiWorker.OpError) throw err;
+                logger.warn(`[AI Service] Worker failed for ${scriptName}, spawning script instead: ${err.message}`);
+            }
+        }
+        return this.spawnModel(scriptName, inputData);
+    }
 
     /**
-     * Run an AI model script
+     * Run an AI model script in a fresh Python process
      * @param {string} scriptName - Name of the script in scripts/ai/
      * @param {object} inputData - JSON input data for the model
      * @returns {Promise<object>} - Parsed JSON result from stdout
      */
-    static async runModel(scriptName, inputData) {
+    static spawnModel(scriptName, inputData) {
         return new Promise((resolve, reject) => {
             const scriptPath = path.join(__dirname, '../../scripts/ai', scriptName);
             const pythonProcess = spawn('python', [scriptPath, JSON.stringify(inputData)]);
@@ -49,27 +89,34 @@ class AiService {
     }
 
     /**
-     * Run current yield model (scripts/ai/yeild/main.py) without changing its core code.
+     * Run current yield model (scripts/ai/yeild/main.py) on a per-request Redis key.
      * Flow:
-     * 1) Write required input snapshot to Redis key: latest_farm_data
-     * 2) Spawn yeild/main.py (it reads latest_farm_data and writes latest_yield_prediction)
-     * 3) Read latest_yield_prediction from Redis and return normalized shape
+     * 1) Write required input snapshot to Redis key: farm_data:<requestId>
+     *    (season-to-date aggregates of the farm where known, else the reading)
+     * 2) Spawn yeild/main.py <requestId> (it writes yield_prediction:<requestId>)
+     * 3) Read yield_prediction:<requestId> from Redis and return normalized shape
+     * Keys are unique per run, so concurrent yield runs do not need to be serialized.
      */
     static async runYieldModelFromRedis(inputData) {
-        const run = async () => {
-            const farmData = {
-                Cumulative_Rainfall: Number(inputData.rainfall ?? 100.0),
-                Average_Temperature: Number(inputData.temperature ?? 25.0),
-                Average_Soil_Moisture: Number(inputData.moisture ?? 50.0),
-                Average_Humidity: Number(inputData.humidity ?? 50.0),
-                Average_Wind_Speed: Number(inputData.wind_speed ?? 10.0)
-            };
+        const requestId = uuidv4();
+        const inputKey = `farm_data:${requestId}`;
+        const outputKey = `yield_prediction:${requestId}`;
+
+        const inputs = { ...inputData, ...(await this.getSeasonInputs(inputData)) };
+        const farmData = {
+            Cumulative_Rainfall: Number(inputs.rainfall ?? 100.0),
+            Average_Temperature: Number(inputs.temperature ?? 25.0),
+            Average_Soil_Moisture: Number(inputs.moisture ?? 50.0),
+            Average_Humidity: Number(inputs.humidity ?? 50.0),
+            Average_Wind_Speed: Number(inputs.wind_speed ?? 10.0)
+        };
 
-            await redis.set('latest_farm_data', JSON.stringify(farmData));
+        await redis.set(inputKey, JSON.stringify(farmData), 'EX', YIELD_KEY_TTL_SECONDS);
 
+        try {
             await new Promise((resolve, reject) => {
                 const scriptPath = path.join(__dirname, '../../scripts/ai/yeild/main.py');
-                const pythonProcess = spawn('python', [scriptPath]);
+                const pythonProcess = spawn('python', [scriptPath, requestId]);
 
                 let stderrData = '';
                 let stdoutData = '';
@@ -95,20 +142,96 @@ class AiService {
                 });
             });
 
-            const predictionRaw = await redis.get('latest_yield_prediction');
+            const predictionRaw = await redis.get(outputKey);
             if (!predictionRaw) {
-                throw new Error('Yield model did not write latest_yield_prediction');
+                throw new Error(`Yield model did not write ${outputKey}`);
             }
 
             const parsed = JSON.parse(predictionRaw);
             return {
                 prediction: parsed.predicted_yield_ton_per_hectare ?? 0
             };
-        };
+        } finally {
+            await redis.del(inputKey, outputKey);
+        }
+    }
+
+    /**
+     * Season-to-date yield inputs of the reading's farm (scripts/ai/season_features.py)
+     * @returns {Promise<object>} - { rainfall, temperature, moisture, humidity, wind_speed } where known, else {}
+     */
+    static async getSeasonInputs(data) {
+        const farmId = data.farm_id || data.farmId || data.userId || 'mqtt-global';
+        try {
+            const [[, own], [, defaultDate]] = await redis.pipeline()
+                .hmget(`season:${farmId}`, 'sowing_date', 'features')
+                .hget('season:mqtt-global', 'sowing_date')
+                .exec();
+            const [sowingDate, raw] = own;
+            const features = raw ? JSON.parse(raw) : null;
+            // Aggregates of an earlier season are ignored
+            if (!features || features.sowing_date !== (sowingDate || defaultDate)) {
+                return {};
+            }
+            const inputs = {};
+            for (const field of ['rainfall', 'temperature', 'moisture', 'humidity', 'wind_speed']) {
+                if (features[field] !== undefined) {
+                    inputs[field] = features[field];
+                }
+            }
+            return inputs;
+        } catch (err) {
+            logger.warn(`[AI Service] Season features unavailable, using the reading: ${err.message}`);
+            return {};
+        }
+    }
+
+    /**
+     * Run the yield model through the persistent worker, falling back to the Redis/main.py flow.
+     */
+    static async runYieldModel(inputData) {
+        if (AiWorker.isEnabled()) {
+            try {
+                return await AiWorker.request('yield_prediction', inputData);
+            } catch (err) {
+                if (err instanceof AiWorker.OpError) throw err;
+                logger.warn(`[AI Service] Worker failed for yield model, using yeild/main.py: ${err.message}`);
+            }
+        }
+        return this.runYieldModelFromRedis(inputData);
+    }
+
+    /**
+     * Score irrigation minutes for many farms in one model call (one tick of the pump scheduler)
+     * @param {object} farms - { farmId: { crop_stage | sowing_date, temperature, humidity, moisture } }
+     * @returns {Promise<object>} - { farmId: { minutes, crop_stage } }
+     */
+    static async scoreIrrigationFleet(farms) {
+        if (AiWorker.isEnabled()) {
+            try {
+                const result = await AiWorker.request('irrigation_batch', { farms });
+                return result.farms;
+            } catch (err) {
+                if (err instanceof AiWorker.OpError) throw err;
+                logger.warn(`[AI Service] Worker failed for irrigation batch, spawning script instead: ${err.message}`);
+            }
+        }
+        const result = await this.spawnModel('irrigation_service.py', { farms });
+        return result.farms;
+    }
 
-        // Serialize yield runs to avoid race conditions on shared Redis keys.
-        this._yieldQueue = this._yieldQueue.then(run, run);
-        return this._yieldQueue;
+    /**
+     * Check a reading against its farm's running statistics (scripts/ai/sensor_stats.py)
+     * @returns {Promise<object>} - { ok, flags: { field: [flag] }, baseline: { field: ewma } }
+     */
+    static async checkSensorData(data) {
+        try {
+            return await this.runModel('sensor_stats.py', data);
+        } catch (err) {
+            // The pre-filter must never block scoring
+            logger.warn(`[AI Service] Sensor check failed, scoring anyway: ${err.message}`);
+            return { ok: true, flags: {}, baseline: {} };
+        }
     }
 
     /**
@@ -118,10 +241,35 @@ class AiService {
         try {
             logger.info('[AI Service] Processing sensor data');
 
+            const sensorCheck = await this.checkSensorData(data);
+            if (!sensorCheck.ok) {
+                // Reading rejected per SENSOR_REJECT (out of range by default; flatline is only reported): skip the models and the LLM
+                const flagged = Object.keys(sensorCheck.flags);
+                const baseline = {};
+                for (const field of flagged) {
+                    if (sensorCheck.baseline[field] !== undefined) {
+                        baseline[field] = sensorCheck.baseline[field];
+                    }
+                }
+                logger.warn(`[AI Service] Rejected sensor reading: ${JSON.stringify(sensorCheck.flags)}`);
+                const health = await this.runModel('health_index.py', { ...data, ...baseline });
+                return {
+                    drynessPrediction: 'N/A',
+                    yieldPrediction: 'N/A',
+                    fieldHealthIndex: health.index,
+                    advisory: {
+                        recommendation: 'Sensor reading looks faulty; advisory skipped until readings recover.',
+                        reasons: flagged.map((field) => `${field}: ${sensorCheck.flags[field].join(', ')}`),
+                        source: 'sensor_stats'
+                    },
+                    sensorCheck
+                };
+            }
+
             // Run models in parallel (or sequential if dependencies exist)
             const [dryness, yieldPred, health, advisory] = await Promise.all([
                 this.runModel('dryness_prediction.py', data),
-                this.runYieldModelFromRedis(data),
+                this.runYieldModel(data),
                 this.runModel('health_index.py', data),
                 this.runModel('advisory_adapter.py', data)
             ]);
@@ -130,7 +278,8 @@ class AiService {
                 drynessPrediction: dryness.prediction,
                 yieldPrediction: yieldPred.prediction,
                 fieldHealthIndex: health.index,
-                advisory: advisory
+                advisory: advisory,
+                sensorCheck
             };
         } catch (err) {
             logger.error(`[AI Service] Sensor processing failed: ${err.message}`);
@@ -0,0 +1,145 @@
+const { spawn } = require('child_process');
+const path = require('path');
+const readline = require('readline');
+const logger = require('../utils/logger.util');
+
+const WORKER_SCRIPT = path.join(__dirname, '../../scripts/ai/worker.py');
+const REQUEST_TIMEOUT_MS = Number(process.env.AI_WORKER_TIMEOUT_MS || 30000);
+const RESTART_DELAY_MS = 1000;
+
+/**
+ * The worker ran the op and it failed (an {ok: false} response). Retrying the
+ * same input elsewhere would fail the same way, unlike a timeout or a dead worker.
+ */
+class AiWorkerOpError extends Error {
+    constructor(message) {
+        super(message);
+        this.name = 'AiWorkerOpError';
+    }
+}
+
+/**
+ * Client for the persistent Python AI worker (scripts/ai/worker.py).
+ * Requests are written as JSON lines tagged with an id; responses can arrive out of order.
+ * Streaming ops send {id, delta} lines before their response.
+ */
+class AiWorker {
+    static _process = null;
+    static _pending = new Map();
+    static _nextId = 1;
+    static _stopping = false;
+
+    static isEnabled() {
+        return !['false', '0', 'no'].includes(String(process.env.AI_WORKER || '').toLowerCase());
+    }
+
+    static start() {
+        if (this._process) return this._process;
+
+        this._stopping = false;
+        const pythonProcess = spawn('python', [WORKER_SCRIPT], {
+            cwd: path.dirname(WORKER_SCRIPT)
+        });
+
+        readline.createInterface({ input: pythonProcess.stdout }).on('line', (line) => {
+            this._onResponse(line);
+        });
+
+        pythonProcess.stderr.on('data', (data) => {
+            logger.warn(`[AI Worker] ${data.toString().trim()}`);
+        });
+
+        pythonProcess.on('error', (err) => {
+            logger.error(`[AI Worker] Failed to start: ${err.message}`);
+        });
+
+        pythonProcess.on('close', (code) => {
+            logger.error(`[AI Worker] Exited with code ${code}`);
+            this._process = null;
+            this._rejectAll(new Error('AI worker exited'));
+            if (!this._stopping) {
+                setTimeout(() => this.start(), RESTART_DELAY_MS);
+            }
+        });
+
+        this._process = pythonProcess;
+        logger.info(`[AI Worker] Started pid=${pythonProcess.pid}`);
+        return pythonProcess;
+    }
+
+    static stop() {
+        this._stopping = true;
+        if (this._process) {
+            this._process.stdin.end();
+            this._process = null;
+        }
+    }
+
+    /**
+     * Send one request to the worker
+     * @param {string} op - Worker operation (script name without .py, or 'healthcheck')
+     * @param {object} data - JSON input data for the model
+     * @param {object} [options]
+     * @param {number} [options.timeoutMs] - Reject if no response arrives in time
+     * @param {function} [options.onDelta] - Receives partial output of streaming ops
+     * @returns {Promise<object>} - Result object from the worker
+     */
+    static request(op, data, { timeoutMs = REQUEST_TIMEOUT_MS, onDelta = null } = {}) {
+        const pythonProcess = this.start();
+        const id = this._nextId++;
+
+        return new Promise((resolve, reject) => {
+            const timer = setTimeout(() => {
+                this._pending.delete(id);
+                reject(new Error(`AI worker timed out on ${op}`));
+            }, timeoutMs);
+
+            this._pending.set(id, { resolve, reject, timer, onDelta });
+            const request = onDelta ? { id, op, data, stream: true } : { id, op, data };
+            pythonProcess.stdin.write(`${JSON.stringify(request)}\n`, (err) => {
+                if (!err || !this._pending.has(id)) return;
+                this._pending.delete(id);
+                clearTimeout(timer);
+                reject(new Error(`AI worker write failed on ${op}: ${err.message}`));
+            });
+        });
+    }
+
+    static _onResponse(line) {
+        let response;
+        try {
+            response = JSON.parse(line);
+        } catch (err) {
+            logger.error(`[AI Worker] Invalid response line: ${line}`);
+            return;
+        }
+
+        const pending = this._pending.get(response.id);
+        if (!pending) return;
+
+        if (response.delta !== undefined) {
+            if (pending.onDelta) pending.onDelta(response.delta);
+            return;
+        }
+
+        this._pending.delete(response.id);
+        clearTimeout(pending.timer);
+        if (response.ok) {
+            pending.resolve(response.result);
+        } else {
+            pending.reject(new AiWorkerOpError(response.error || 'AI worker request failed'));
+        }
+    }
+
+    static _rejectAll(err) {
+        for (const { reject, timer } of this._pending.values()) {
+            clearTimeout(timer);
+            reject(err);
+        }
+        this._pending.clear();
+    }
+}
+
+AiWorker.OpError = AiWorkerOpError;
+
+module.exports = AiWorker;
@@ -40,6 +40,10 @@ const config = {
     },
     storage: {
         imageDir: process.env.IMAGE_STORAGE_DIR || './storage/anomalies'
+    },
+    chat: {
+        // Signs chatbot session tokens; without it tokens only last until restart
+        sessionSecret: process.env.CHAT_SESSION_SECRET || null
     }
 };
 
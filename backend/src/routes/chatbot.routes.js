@@ -2,10 +2,18 @@ const express = require('express');
 const router = express.Router();
 const schemas = require('../validation/schemas.validation');
 const AiService = require('../ai/ai.service');
+const SessionService = require('../services/session.service');
+const logger = require('../utils/logger.util');
+
+function sendEvent(res, event, data) {
+    res.write(`event: ${event}\ndata: ${JSON.stringify(data)}\n\n`);
+}
 
 /**
  * @route POST /chatbot/query
- * @desc General-purpose agriculture chatbot (no DB dependency)
+ * @desc General-purpose agriculture chatbot (no DB dependency).
+ *       With stream: true the reply is server-sent events: "delta" ({text}) as the
+ *       answer is generated, then "done" with the usual body, or "error".
  */
 router.post('/query', async (req, res, next) => {
     try {
@@ -15,17 +23,49 @@ router.post('/query', async (req, res, next) => {
         }
 
         const sensor = value.sensor || {};
-
-        const result = await AiService.runModel('chatbot_adapter.py', {
+        // Conversation memory (scripts/ai/conversation_store.py) is keyed by a
+        // server-issued session, never by an id the client picks
+        const session = SessionService.resolve(value.sessionToken);
+        const input = {
             question: value.question,
-            sensor
-        });
-
-        res.json({
+            sensor,
+            user_id: session.sessionId
+        };
+        const body = (result) => ({
             status: 'success',
             answer: result.answer || 'No response generated',
-            source: result.source || 'chatbot_adapter.py'
+            source: result.source || 'chatbot_adapter.py',
+            sessionToken: session.token
         });
+
+        if (!value.stream) {
+            const result = await AiService.runModel('chatbot_adapter.py', input);
+            return res.json(body(result));
+        }
+
+        res.writeHead(200, {
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            Connection: 'keep-alive',
+            'X-Accel-Buffering': 'no'
+        });
+        let closed = false;
+        res.on('close', () => {
+            closed = true;
+        });
+
+        try {
+            const result = await AiService.runModel('chatbot_adapter.py', input, {
+                onDelta: (text) => {
+                    if (!closed) sendEvent(res, 'delta', { text });
+                }
+            });
+            if (!closed) sendEvent(res, 'done', body(result));
+        } catch (err) {
+            logger.error(`[Chatbot] Streaming answer failed: ${err.message}`);
+            if (!closed) sendEvent(res, 'error', { status: 'error', message: 'Chatbot response unavailable' });
+        }
+        res.end();
     } catch (err) {
         next(err);
     }
@@ -0,0 +1,38 @@
+const express = require('express');
+const router = express.Router();
+const schemas = require('../validation/schemas.validation');
+const AiService = require('../ai/ai.service');
+
+/**
+ * @route GET /history/:farmId?from=&to=&bucket=&metrics=&dryness=
+ * @desc Sensor history of a farm from the columnar store: raw rows, or
+ *       per-bucket mean/min/max when bucket (seconds) is given
+ */
+router.get('/:farmId', async (req, res, next) => {
+    try {
+        const { error, value } = schemas.sensorHistory.validate(req.query);
+        if (error) {
+            return res.status(400).json({ status: 'error', message: error.message });
+        }
+
+        // Joi converts ISO strings to Dates; the store takes epoch ms.
+        const toMs = (t) => (t instanceof Date ? t.getTime() : t);
+        const result = await AiService.runModel('history_store.py', {
+            farm_id: req.params.farmId,
+            start: toMs(value.from),
+            end: toMs(value.to),
+            bucket_s: value.bucket,
+            metrics: value.metrics ? value.metrics.split(',') : undefined,
+            dryness: Boolean(value.dryness)
+        });
+        if (result.error) {
+            return res.status(400).json({ status: 'error', message: result.error });
+        }
+
+        res.json({ status: 'success', ...result });
+    } catch (err) {
+        next(err);
+    }
+});
+
+module.exports = router;
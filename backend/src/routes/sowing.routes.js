@@ -17,7 +17,7 @@ router.post('/publish', async (req, res, next) => {
         }
 
         console.log(`[SOWING][API] publishing cropType=${value.cropType} sowingDate=${value.sowingDate}`);
-        const payload = await SowingService.publishSowingDate(value.cropType, value.sowingDate);
+        const payload = await SowingService.publishSowingDate(value.cropType, value.sowingDate, value.farmId);
         console.log(`[SOWING][API][DONE] published payload=${JSON.stringify(payload)}`);
         res.json({
             status: 'success',
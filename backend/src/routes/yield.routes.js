@@ -0,0 +1,32 @@
+const express = require('express');
+const router = express.Router();
+const schemas = require('../validation/schemas.validation');
+const AiService = require('../ai/ai.service');
+
+/**
+ * @route POST /yield/scenarios
+ * @desc What-if yield sweep: scores a grid or Monte Carlo sample of inputs in one batch
+ */
+router.post('/scenarios', async (req, res, next) => {
+    try {
+        const { error, value } = schemas.yieldScenario.validate(req.body);
+        if (error) {
+            return res.status(400).json({ status: 'error', message: error.message });
+        }
+
+        const { includePoints, ...scenario } = value;
+        const result = await AiService.runModel('yield_scenarios.py', {
+            ...scenario,
+            include_points: Boolean(includePoints)
+        });
+        if (result.error) {
+            return res.status(400).json({ status: 'error', message: result.error });
+        }
+
+        res.json({ status: 'success', ...result });
+    } catch (err) {
+        next(err);
+    }
+});
+
+module.exports = router;
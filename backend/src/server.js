@@ -19,6 +19,8 @@ const PumpService = require('./services/pump.service');
 const pumpRoutes = require('./routes/pump.routes');
 const sowingRoutes = require('./routes/sowing.routes');
 const chatbotRoutes = require('./routes/chatbot.routes');
+const yieldRoutes = require('./routes/yield.routes');
+const historyRoutes = require('./routes/history.routes');
 
 async function bootstrap() {
     const app = express();
@@ -61,6 +63,8 @@ async function bootstrap() {
     app.use('/api/pump', pumpRoutes);
     app.use('/api/sowing', sowingRoutes);
     app.use('/api/chatbot', chatbotRoutes);
+    app.use('/api/yield', yieldRoutes);
+    app.use('/api/history', historyRoutes);
 
     // Health check
     app.get('/health', (req, res) => res.json({ status: 'ok', uptime: process.uptime() }));
@@ -0,0 +1,50 @@
+const crypto = require('crypto');
+const config = require('../config/env.config');
+const logger = require('../utils/logger.util');
+
+// Chatbot sessions are issued by the server: a random id plus an HMAC of it.
+// The client only echoes the token back, so it cannot pick, guess or forge
+// another farmer's session and read or extend their conversation memory.
+const TOKEN_PATTERN = /^[A-Za-z0-9_-]{22}\.[A-Za-z0-9_-]{43}$/;
+
+let secret = config.chat.sessionSecret;
+if (!secret) {
+    secret = crypto.randomBytes(32).toString('hex');
+    logger.warn('[Session] CHAT_SESSION_SECRET not set; chatbot sessions reset on restart');
+}
+
+class SessionService {
+    static sign(id) {
+        return crypto.createHmac('sha256', secret).update(id).digest('base64url');
+    }
+
+    static issue() {
+        const id = crypto.randomBytes(16).toString('base64url');
+        return { token: `${id}.${this.sign(id)}`, sessionId: id };
+    }
+
+    /**
+     * Session id of a valid token, or null.
+     */
+    static verify(token) {
+        if (typeof token !== 'string' || !TOKEN_PATTERN.test(token)) {
+            return null;
+        }
+        const [id, signature] = token.split('.');
+        const expected = Buffer.from(this.sign(id));
+        const given = Buffer.from(signature);
+        return given.length === expected.length && crypto.timingSafeEqual(given, expected) ? id : null;
+    }
+
+    /**
+     * The caller's session, or a new one when the token is missing or invalid.
+     */
+    static resolve(token) {
+        const sessionId = this.verify(token);
+        return sessionId ? { token, sessionId } : this.issue();
+    }
+}
+
+SessionService.TOKEN_PATTERN = TOKEN_PATTERN;
+
+module.exports = SessionService;
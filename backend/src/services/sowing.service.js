@@ -1,9 +1,15 @@
 const MqttCore = require('../core/mqtt.core');
 const config = require('../config/env.config');
 const logger = require('../utils/logger.util');
+const redis = require('../config/redis.config');
+const { isCalendarDate } = require('../utils/date.util');
+
+// Season aggregates per farm (scripts/ai/season_features.py) start at this date
+const SEASON_PREFIX = 'season:';
+const DEFAULT_FARM = 'mqtt-global';
 
 class SowingService {
-    static async publishSowingDate(cropType, sowingDate) {
+    static async publishSowingDate(cropType, sowingDate, farmId = DEFAULT_FARM) {
         const topic = config.mqtt.topics.sowingDate;
         const mqttPayload = {
             sowing_date: sowingDate
@@ -15,8 +21,37 @@ class SowingService {
         await MqttCore.publishAsync(topic, mqttPayload, { qos: 1, retain: true });
         logger.info(`[MQTT][SOWING][ACK] topic=${topic} payload=${JSON.stringify(mqttPayload)}`);
         console.log(`[MQTT][SOWING][ACK] topic=${topic} payload=${JSON.stringify(mqttPayload)}`);
+        await this.startSeason(farmId, cropType, sowingDate);
         return mqttPayload;
     }
+
+    /**
+     * Record the farm's sowing date for the season-to-date yield features.
+     * Re-publishing the same date keeps the running aggregates; a new date starts a new season.
+     */
+    static async startSeason(farmId, cropType, sowingDate) {
+        // The season aggregator can't place readings against a date that doesn't exist
+        if (!isCalendarDate(sowingDate)) {
+            logger.error(`[Sowing Service] Not starting a season for farm=${farmId}: invalid date ${sowingDate}`);
+            return;
+        }
+        const key = `${SEASON_PREFIX}${farmId}`;
+        try {
+            const current = await redis.hget(key, 'sowing_date');
+            if (current === sowingDate) {
+                await redis.hset(key, 'crop_type', cropType);
+                return;
+            }
+            await redis.multi()
+                .del(key)
+                .hset(key, 'sowing_date', sowingDate, 'crop_type', cropType)
+                .exec();
+            logger.info(`[Sowing Service] New season for farm=${farmId} from ${sowingDate}`);
+        } catch (err) {
+            // The MQTT publish already succeeded; yield falls back to instantaneous inputs
+            logger.error(`[Sowing Service] Could not record season start: ${err.message}`);
+        }
+    }
 }
 
 module.exports = SowingService;
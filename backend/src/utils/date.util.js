@@ -0,0 +1,13 @@
+/**
+ * Whether value is a "YYYY-MM-DD" string naming a real day ("2026-02-30" and
+ * "2026-13-45" match the shape but are not).
+ * @param {string} value
+ * @returns {boolean}
+ */
+const isCalendarDate = (value) => {
+    if (typeof value !== 'string' || !/^\d{4}-\d{2}-\d{2}$/.test(value)) return false;
+    const date = new Date(`${value}T00:00:00Z`);
+    return !Number.isNaN(date.getTime()) && date.toISOString().slice(0, 10) === value;
+};
+
+module.exports = { isCalendarDate };
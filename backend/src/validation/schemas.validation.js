@@ -1,4 +1,5 @@
 const Joi = require('joi');
+const { isCalendarDate } = require('../utils/date.util');
 
 const schemas = {
     // Sensor data from MQTT
@@ -34,15 +35,64 @@ const schemas = {
     sowingDatePublish: Joi.object({
         cropType: Joi.string().valid('Wheat', 'Moong').required(),
         sowingDate: Joi.string().pattern(/^\d{4}-\d{2}-\d{2}$/).required()
+            .custom((value, helpers) => (isCalendarDate(value) ? value : helpers.message('"sowingDate" must be a real calendar date'))),
+        farmId: Joi.string().max(128).optional()
     }),
 
     chatbotQuery: Joi.object({
         question: Joi.string().min(2).max(1000).required(),
+        // Issued by the server in an earlier reply (services/session.service.js)
+        sessionToken: Joi.string().max(128).optional(),
+        // Reply as server-sent events: "delta" events, then "done" (or "error")
+        stream: Joi.boolean().optional(),
         sensor: Joi.object({
             moisture: Joi.number().optional(),
             temperature: Joi.number().optional(),
             humidity: Joi.number().optional()
         }).optional()
+    }),
+
+    // What-if yield sweep (scripts/ai/yield_scenarios.py): a grid or a Monte Carlo sample
+    yieldScenario: Joi.object({
+        base: Joi.object({
+            rainfall: Joi.number().optional(),
+            temperature: Joi.number().optional(),
+            moisture: Joi.number().optional(),
+            humidity: Joi.number().optional(),
+            wind_speed: Joi.number().optional()
+        }).optional(),
+        grid: Joi.object().pattern(
+            Joi.string().valid('rainfall', 'temperature', 'moisture', 'humidity', 'wind_speed'),
+            Joi.alternatives().try(
+                Joi.array().items(Joi.number()).min(1).max(1000),
+                Joi.object({
+                    min: Joi.number().required(),
+                    max: Joi.number().required(),
+                    steps: Joi.number().integer().min(1).max(1000).optional()
+                })
+            )
+        ).min(1).optional(),
+        vary: Joi.object().pattern(
+            Joi.string().valid('rainfall', 'temperature', 'moisture', 'humidity', 'wind_speed'),
+            Joi.object({
+                min: Joi.number().optional(),
+                max: Joi.number().optional(),
+                mean: Joi.number().optional(),
+                std: Joi.number().min(0).optional()
+            }).or('mean', 'max')
+        ).min(1).optional(),
+        samples: Joi.number().integer().min(1).max(50000).optional(),
+        seed: Joi.number().integer().min(0).optional(),
+        includePoints: Joi.boolean().optional()
+    }).xor('grid', 'vary'),
+
+    // Sensor history query (scripts/ai/history_store.py); from/to are ISO dates or epoch ms
+    sensorHistory: Joi.object({
+        from: Joi.alternatives().try(Joi.date().iso(), Joi.number()).optional(),
+        to: Joi.alternatives().try(Joi.date().iso(), Joi.number()).optional(),
+        bucket: Joi.number().integer().min(1).optional(),
+        metrics: Joi.string().pattern(/^(moisture|temperature|humidity|tds)(,(moisture|temperature|humidity|tds))*$/).optional(),
+        dryness: Joi.boolean().optional()
     })
 };
 
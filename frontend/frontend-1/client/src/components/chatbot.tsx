@@ -8,6 +8,30 @@ interface Message {
     content: string;
 }
 
+// Reads a server-sent event stream, calling onEvent(event, data) per event.
+async function readEvents(body: ReadableStream<Uint8Array>, onEvent: (event: string, data: any) => void) {
+    const reader = body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let end: number;
+        while ((end = buffer.indexOf("\n\n")) !== -1) {
+            const block = buffer.slice(0, end);
+            buffer = buffer.slice(end + 2);
+            let event = "message";
+            let data = "";
+            for (const line of block.split("\n")) {
+                if (line.startsWith("event:")) event = line.slice(6).trim();
+                else if (line.startsWith("data:")) data += line.slice(5).trim();
+            }
+            if (data) onEvent(event, JSON.parse(data));
+        }
+    }
+}
+
 export function Chatbot() {
     const { sensors } = useCropContext();
     const [isOpen, setIsOpen] = useState(false);
@@ -16,6 +40,8 @@ export function Chatbot() {
     ]);
     const [input, setInput] = useState("");
     const [isLoading, setIsLoading] = useState(false);
+    // Issued by the backend with the first answer; keeps this chat's memory
+    const sessionToken = useRef<string | null>(null);
     const scrollRef = useRef<HTMLDivElement>(null);
 
     useEffect(() => {
@@ -31,12 +57,21 @@ export function Chatbot() {
         setMessages((prev) => [...prev, { role: "user", content: userMsg }]);
         setInput("");
         setIsLoading(true);
+        // The answer is shown as it streams in, in one bot message
+        let shown = false;
+        const showBot = (content: string) => {
+            const replace = shown;
+            shown = true;
+            setMessages((prev) => [...(replace ? prev.slice(0, -1) : prev), { role: "bot", content }]);
+        };
         try {
             const res = await fetch("http://localhost:5001/api/chatbot/query", {
                 method: "POST",
                 headers: { "Content-Type": "application/json" },
                 body: JSON.stringify({
                     question: userMsg,
+                    sessionToken: sessionToken.current ?? undefined,
+                    stream: true,
                     sensor: sensors
                         ? {
                             moisture: sensors.moisture,
@@ -46,17 +81,28 @@ export function Chatbot() {
                         : undefined
                 })
             });
-            const data = await res.json();
+            let data: any = null;
+            if (res.body && res.headers.get("Content-Type")?.startsWith("text/event-stream")) {
+                let partial = "";
+                await readEvents(res.body, (event, payload) => {
+                    if (event === "delta") {
+                        partial += payload.text;
+                        showBot(partial);
+                    } else {
+                        data = payload;
+                    }
+                });
+            } else {
+                data = await res.json();
+            }
+            if (data?.sessionToken) sessionToken.current = data.sessionToken;
             const botResponse =
                 data?.status === "success" && data?.answer
                     ? data.answer
                     : "Chatbot response unavailable right now. Please try again.";
-            setMessages((prev) => [...prev, { role: "bot", content: botResponse }]);
+            showBot(botResponse);
         } catch {
-            setMessages((prev) => [
-                ...prev,
-                { role: "bot", content: "Backend unreachable. Start backend server and try again." }
-            ]);
+            showBot("Backend unreachable. Start backend server and try again.");
         } finally {
             setIsLoading(false);
         }
@@ -37,4 +37,11 @@ print("Model R2 Score:", score)
 joblib.dump(model, "irrigation_model.pkl")
 joblib.dump(le, "stage_encoder.pkl")
 
-print("Model saved successfully!")
\ No newline at end of file
+print("Model saved successfully!")
+
+# Flat-array export for the backend (memory-mapped, no sklearn needed at inference):
+#   python backend/scripts/ai/tree_engine.py export "hardware codescripts/irrigation_model.pkl"
+# and the encoder's classes as JSON (read by irrigation_service.py instead of the pickle):
+#   python backend/scripts/ai/irrigation_service.py --export-classes
+# Large / growing datasets: backend/scripts/ai/train_pipeline.py irrigation DATA.csv --promote
+# (chunked loading, parallel search, versioned artifacts).